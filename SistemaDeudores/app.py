@@ -1,9 +1,18 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, Menu
+from tkinter import ttk, messagebox, simpledialog, Menu
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta, date
+from collections import OrderedDict
+from contextlib import contextmanager
+import functools
+import json
+import time
+import random
 import os 
 import sys 
+from respaldo import GestorRespaldos, ruta_archivo
+from cierre_caja import rango_caja
+from replicacion import instalar_captura, pausar_captura, anotar_cambios
 
 # ==========================================
 # CONFIGURACIÓN DE COLORES Y ESTILOS
@@ -31,14 +40,122 @@ FONTS = {
     'small': ('Segoe UI', 8)
 }
 
+# Columnas de 'deudas' en orden, para copiar filas entre la base y el archivo
+COLUMNAS_DEUDAS = "id, cliente_id, monto_total, monto_pagado, descripcion, estado, fecha_creacion, fecha_pago, metodo_pago"
+
+# Método de pago sin el comentario entre paréntesis: "Debito (jee)" -> "Debito"
+METODO_LIMPIO_SQL = "TRIM(CASE WHEN instr(metodo, ' (') > 0 THEN substr(metodo, 1, instr(metodo, ' (') - 1) ELSE metodo END)"
+
+# ==========================================
+# CACHÉ DE CONSULTAS
+# ==========================================
+# Las lecturas se guardan con clave (método, argumentos, generación, día).
+# Cada método de escritura sube la 'generacion', así nunca se sirve
+# un resultado anterior a una escritura. Los cambios de otros procesos
+# invalidan la caché cuando obtener_data_version detecta que cambió la base.
+MAX_FILAS_EN_CACHE = 5000  # Resultados más grandes no se guardan (memoria acotada)
+
+
+def consulta_en_cache(metodo):
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        # Dentro de una transacción se lee siempre de la base: un método de escritura
+        # no puede decidir con lo que quedó en cache si otro proceso cambió algo
+        if not self.tamanio_cache or self.nivel_transaccion:
+            return metodo(self, *args, **kwargs)
+        # El día va en la clave porque hay consultas relativas a "este mes"
+        clave = (metodo.__name__, args, tuple(sorted(kwargs.items())), self.generacion, date.today())
+        try:
+            resultado = self.cache[clave]
+        except KeyError:
+            self.cache_fallos += 1
+        except TypeError:
+            # Argumentos no "hasheables" (ej: listas): consulta directa
+            return metodo(self, *args, **kwargs)
+        else:
+            self.cache_aciertos += 1
+            self.cache.move_to_end(clave)
+            return list(resultado) if isinstance(resultado, list) else resultado
+
+        resultado = metodo(self, *args, **kwargs)
+        if not isinstance(resultado, list) or len(resultado) <= MAX_FILAS_EN_CACHE:
+            # Guardamos una copia: la interfaz ordena las listas en el lugar
+            self.cache[clave] = list(resultado) if isinstance(resultado, list) else resultado
+            if len(self.cache) > self.tamanio_cache:
+                self.cache.popitem(last=False)  # Sale la menos usada
+        return resultado
+    return envoltura
+
+
+# ==========================================
+# CONTENCIÓN (VARIOS PROCESOS SOBRE LA MISMA BASE)
+# ==========================================
+# Si otra ventana, un respaldo o la otra PC está escribiendo, SQLite espera
+# hasta ESPERA_BLOQUEO segundos a que se libere la base (busy timeout). Si aun así
+# responde "database is locked", la escritura entera se reintenta con esperas
+# crecientes (backoff con algo de azar, para que dos procesos no choquen de nuevo).
+ESPERA_BLOQUEO = 5.0            # Segundos que SQLite espera el lock en cada intento
+REINTENTOS_ESCRITURA = 3
+ESPERA_INICIAL_REINTENTO = 0.05  # Se duplica en cada reintento
+
+
+def es_bloqueo(error):
+    """True si el error es porque otra conexión tiene la base tomada (no un error de datos)."""
+    codigo = getattr(error, 'sqlite_errorcode', None)
+    if codigo is not None:
+        return codigo & 0xFF in (5, 6)  # SQLITE_BUSY, SQLITE_LOCKED
+    # Errores que llegan como texto (ej: desde el servidor)
+    texto = str(error).lower()
+    return "database is locked" in texto or "database is busy" in texto or "database table is locked" in texto
+
+
+def reintenta_si_bloqueada(metodo):
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        return self.con_reintentos(metodo, self, *args, **kwargs)
+    return envoltura
+
+
+def invalida_cache(metodo):
+    @functools.wraps(metodo)
+    def envoltura(self, *args, **kwargs):
+        try:
+            return metodo(self, *args, **kwargs)
+        finally:
+            self.invalidar_cache()
+    return envoltura
+
+
 # ==========================================
 # PARTE 1: LA BASE DE DATOS (COMPLETA)
 # ==========================================
 class BaseDeDatos:
-    def __init__(self, db_name="taller_repuestos_final.db"):
-        self.conn = sqlite3.connect(db_name)
+    def __init__(self, db_name="taller_repuestos_final.db", tamanio_cache=256,
+                 reintentos=REINTENTOS_ESCRITURA, espera_reintento=ESPERA_INICIAL_REINTENTO, **opciones_conexion):
+        self.db_name = db_name
+        # Caché de lecturas (tamanio_cache=0 la desactiva)
+        self.tamanio_cache = tamanio_cache
+        self.cache = OrderedDict()
+        self.generacion = 0
+        self.cache_aciertos = 0
+        self.cache_fallos = 0
+        self.ultima_data_version = None
+        # Nivel de anidamiento de transaccion() (0 = fuera de una transacción)
+        self.nivel_transaccion = 0
+        # Manejo de bloqueos y métricas de contención
+        self.reintentos = reintentos
+        self.espera_reintento = espera_reintento
+        self.reintentando = False  # True mientras con_reintentos repite una operación completa
+        self.contencion = {'transacciones': 0, 'espera_lock': 0.0, 'espera_lock_max': 0.0,
+                           'bloqueos': 0, 'reintentos': 0, 'espera_reintentos': 0.0, 'fallidas': 0}
+        opciones_conexion.setdefault('timeout', ESPERA_BLOQUEO)
+        # sqlite3 reutiliza las sentencias ya preparadas mientras el texto SQL sea
+        # el mismo; por eso las listas de ids van como JSON (json_each) y no con "?, ?, ?"
+        opciones_conexion.setdefault('cached_statements', 256)
+        self.conn = sqlite3.connect(db_name, **opciones_conexion)
         self.cursor = self.conn.cursor()
         self.crear_tablas()
+        self.adjuntar_archivo()
 
     def crear_tablas(self):
         # Tabla Clientes
@@ -77,19 +194,421 @@ class BaseDeDatos:
                 FOREIGN KEY(deuda_id) REFERENCES deudas(id)
             )
         """)
+        # Auditoría de recargos aplicados (uno por deuda y por corrida)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS recargos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                deuda_id INTEGER,
+                lote TEXT,
+                porcentaje REAL,
+                base REAL,
+                monto REAL,
+                fecha TEXT,
+                FOREIGN KEY(deuda_id) REFERENCES deudas(id)
+            )
+        """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_recargos_lote ON recargos(lote, deuda_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_recargos_deuda_fecha ON recargos(deuda_id, fecha)")
+        # Índices para los cruces deuda -> pagos y cliente -> deudas
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_pagos_deuda ON pagos_detalle(deuda_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_deudas_cliente ON deudas(cliente_id)")
+        # Pagos de una deuda ya ordenados por fecha (línea de tiempo paginada del cliente)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_pagos_deuda_fecha ON pagos_detalle(deuda_id, fecha)")
+        # Pagos por rango de fechas (cierre de caja, cobro del mes). Con método y monto
+        # en el índice, los totales se calculan sin leer la tabla.
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_pagos_fecha ON pagos_detalle(fecha, metodo, monto)")
+        self.conn.commit()
+        # Captura de cambios para sincronizar con la otra PC (ver replicacion.py)
+        instalar_captura(self.conn)
+        self.instalar_vigilancia()
+        self.instalar_resumen_clientes()
+        self.crear_tabla_mantenimiento()
+
+    # Deudas saldadas y saldadas dentro del plazo (misma regla para las vivas y las archivadas)
+    SQL_SALDADAS = """
+        COUNT(CASE WHEN d.monto_total - d.monto_pagado <= 0.009 AND d.fecha_pago IS NOT NULL THEN 1 END)
+            AS deudas_saldadas,
+        COUNT(CASE WHEN d.monto_total - d.monto_pagado <= 0.009 AND d.fecha_pago IS NOT NULL
+                    AND julianday(substr(d.fecha_pago, 1, 10)) - julianday(substr(d.fecha_creacion, 1, 10))
+                        <= {plazo} THEN 1 END) AS saldadas_a_tiempo
+    """
+
+    # Recalcula la fila de resumen de un cliente (solo sus deudas y pagos, por índice).
+    # La historia de pago de sus deudas archivadas se suma desde perfil_archivado.
+    # Si el cliente ya no existe no inserta nada. {prioridad} es SQL_PRIORIDAD_COBRANZA.
+    SQL_RESUMEN_CLIENTE = """
+        INSERT OR REPLACE INTO resumen_clientes (cliente_id, saldo, saldo_favor, deudas_abiertas, deuda_mas_vieja,
+                                                 monto_abierto, ultimo_pago, deudas_saldadas, saldadas_a_tiempo, prioridad)
+        SELECT cliente_id, saldo, saldo_favor, deudas_abiertas, deuda_mas_vieja,
+               monto_abierto, ultimo_pago, deudas_saldadas, saldadas_a_tiempo, {prioridad}
+        FROM (
+            SELECT v.cliente_id, v.saldo, v.saldo_favor, v.deudas_abiertas, v.deuda_mas_vieja, v.monto_abierto,
+                   NULLIF(MAX(COALESCE(v.ultimo_pago, ''), COALESCE(a.ultimo_pago, '')), '') AS ultimo_pago,
+                   v.deudas_saldadas + COALESCE(a.deudas_saldadas, 0) AS deudas_saldadas,
+                   v.saldadas_a_tiempo + COALESCE(a.saldadas_a_tiempo, 0) AS saldadas_a_tiempo
+            FROM (
+                SELECT c.id AS cliente_id,
+                       COALESCE(SUM(d.monto_total - d.monto_pagado), 0) AS saldo,
+                       COALESCE(SUM(MAX(d.monto_pagado - d.monto_total, 0)), 0) AS saldo_favor,
+                       COUNT(CASE WHEN d.monto_total - d.monto_pagado > 0.009 THEN 1 END) AS deudas_abiertas,
+                       MIN(CASE WHEN d.monto_total - d.monto_pagado > 0.009 THEN d.fecha_creacion END) AS deuda_mas_vieja,
+                       COALESCE(SUM(MAX(d.monto_total - d.monto_pagado, 0)), 0) AS monto_abierto,
+                       (SELECT MAX(p.fecha) FROM deudas dp JOIN pagos_detalle p ON p.deuda_id = dp.id
+                        WHERE dp.cliente_id = c.id AND p.metodo != 'SALDO A FAVOR') AS ultimo_pago,
+                       {saldadas}
+                FROM clientes c LEFT JOIN deudas d ON d.cliente_id = c.id
+                WHERE c.id = {cliente}
+                GROUP BY c.id
+            ) v LEFT JOIN perfil_archivado a ON a.cliente_id = v.cliente_id
+        )
+    """
+
+    # Prioridad de cobranza (más alta = llamar antes), solo para quien debe algo:
+    #   + hasta PESO_MONTO * TOPE_MONTO puntos según lo adeudado
+    #   + PESO_IMPUNTUAL * (proporción de deudas saldadas fuera de plazo; sin historia cuenta 0.5)
+    #   + PESO_ATRASO por cada mes de la deuda abierta más vieja
+    #   + PESO_SILENCIO por cada mes sin pagar (desde el último pago o, si nunca pagó, desde esa deuda)
+    # Los meses son lineales en las fechas, así que "hoy" suma lo mismo a todos: se guarda la
+    # prioridad sin ese término y el orden del índice sirve para siempre, sin recalcular a diario.
+    PLAZO_PAGO_DIAS = 30
+    PESO_MONTO, MONTO_REFERENCIA, TOPE_MONTO = 2.0, 50000, 3
+    PESO_IMPUNTUAL = 3.0
+    PESO_ATRASO = 1.0
+    PESO_SILENCIO = 1.0
+    SQL_PRIORIDAD_COBRANZA = f"""
+        CASE WHEN monto_abierto > 0.009 THEN
+              {PESO_MONTO} * MIN(monto_abierto / {MONTO_REFERENCIA}.0, {TOPE_MONTO})
+            + {PESO_IMPUNTUAL} * (1 - COALESCE(1.0 * saldadas_a_tiempo / NULLIF(deudas_saldadas, 0), 0.5))
+            - {PESO_ATRASO} * julianday(substr(deuda_mas_vieja, 1, 10)) / 30
+            - {PESO_SILENCIO} * julianday(substr(COALESCE(ultimo_pago, deuda_mas_vieja), 1, 10)) / 30
+        END
+    """
+
+    def instalar_resumen_clientes(self):
+        """
+        Saldo, atraso y perfil de pago por cliente, ya calculados. Los mantienen
+        triggers sobre 'clientes', 'deudas' y 'pagos_detalle' (recalculan solo el
+        cliente tocado), así la lista de clientes y la lista de cobranza ordenan y
+        filtran con índices en lugar de agrupar todas las deudas.
+        Las deudas archivadas suman 0 al saldo, pero su historia de pago (último pago,
+        saldadas y a tiempo) sigue contando: la guarda perfil_archivado, porque los
+        triggers no pueden leer la base de archivo.
+        """
+        self.cursor.execute("PRAGMA table_info(resumen_clientes)")
+        columnas = {fila[1] for fila in self.cursor.fetchall()}
+        existia = 'prioridad' in columnas
+        disparadores = self._disparadores_resumen()
+        if columnas and not existia:
+            # Resumen de una versión anterior: se rearma con las columnas nuevas
+            for nombre in disparadores:
+                self.cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+            self.cursor.execute("DROP TABLE resumen_clientes")
+
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS resumen_clientes (
+                cliente_id INTEGER PRIMARY KEY,
+                saldo REAL NOT NULL DEFAULT 0,
+                saldo_favor REAL NOT NULL DEFAULT 0,
+                deudas_abiertas INTEGER NOT NULL DEFAULT 0,
+                deuda_mas_vieja TEXT,
+                monto_abierto REAL NOT NULL DEFAULT 0,
+                ultimo_pago TEXT,
+                deudas_saldadas INTEGER NOT NULL DEFAULT 0,
+                saldadas_a_tiempo INTEGER NOT NULL DEFAULT 0,
+                prioridad REAL
+            )
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS perfil_archivado (
+                cliente_id INTEGER PRIMARY KEY,
+                ultimo_pago TEXT,
+                deudas_saldadas INTEGER NOT NULL DEFAULT 0,
+                saldadas_a_tiempo INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_resumen_saldo ON resumen_clientes(saldo)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_resumen_mas_vieja ON resumen_clientes(deuda_mas_vieja)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_resumen_favor ON resumen_clientes(saldo_favor) WHERE saldo_favor > 0.009")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_resumen_prioridad ON resumen_clientes(prioridad) WHERE prioridad IS NOT NULL")
+        # Orden de la lista por DNI / localidad (mismas expresiones que ORDENES_CLIENTES)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes(nombre)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_dni_orden ON clientes(IFNULL(dni, ''))")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_localidad_orden ON clientes(IFNULL(localidad, ''))")
+
+        reemplazados = False
+        for nombre, (evento, sentencias) in disparadores.items():
+            cuerpo = ";\n".join(sentencias)
+            reemplazados |= self._instalar_disparador(
+                nombre, f"CREATE TRIGGER IF NOT EXISTS {nombre} {evento} BEGIN {cuerpo}; END")
+        if not existia or reemplazados:
+            # Base nueva o cálculo de una versión anterior
+            self.reconstruir_resumen_clientes()
         self.conn.commit()
 
+    def _sql_resumen(self, cliente):
+        return self.SQL_RESUMEN_CLIENTE.format(cliente=cliente, prioridad=self.SQL_PRIORIDAD_COBRANZA,
+                                               saldadas=self.SQL_SALDADAS.format(plazo=self.PLAZO_PAGO_DIAS))
+
+    def _disparadores_resumen(self):
+        recalcular = self._sql_resumen
+        cliente_del_pago = "(SELECT cliente_id FROM deudas WHERE id = {fila}.deuda_id)"
+        return {
+            "trg_resumen_deudas_insert": ("AFTER INSERT ON deudas", [recalcular("NEW.cliente_id")]),
+            "trg_resumen_deudas_update": ("AFTER UPDATE OF cliente_id, monto_total, monto_pagado, fecha_creacion, fecha_pago ON deudas",
+                                          [recalcular("NEW.cliente_id"),
+                                           # Si la deuda cambió de cliente (fusión), también el anterior
+                                           recalcular("(CASE WHEN OLD.cliente_id IS NOT NEW.cliente_id THEN OLD.cliente_id END)")]),
+            "trg_resumen_deudas_delete": ("AFTER DELETE ON deudas", [recalcular("OLD.cliente_id")]),
+            # El último pago cambia con cada cobro (registrar_pago toca la deuda antes de insertar el pago)
+            "trg_resumen_pagos_insert": ("AFTER INSERT ON pagos_detalle", [recalcular(cliente_del_pago.format(fila="NEW"))]),
+            "trg_resumen_pagos_delete": ("AFTER DELETE ON pagos_detalle", [recalcular(cliente_del_pago.format(fila="OLD"))]),
+            # Corregir fecha, monto o método de un pago también mueve el último pago
+            "trg_resumen_pagos_update": ("AFTER UPDATE OF deuda_id, monto, fecha, metodo ON pagos_detalle",
+                                         [recalcular(cliente_del_pago.format(fila="NEW")),
+                                          recalcular("(CASE WHEN OLD.deuda_id IS NOT NEW.deuda_id THEN "
+                                                     f"{cliente_del_pago.format(fila='OLD')} END)")]),
+            "trg_resumen_clientes_insert": ("AFTER INSERT ON clientes", [recalcular("NEW.id")]),
+            "trg_resumen_clientes_delete": ("AFTER DELETE ON clientes",
+                                            ["DELETE FROM resumen_clientes WHERE cliente_id = OLD.id"]),
+        }
+
+    def reconstruir_resumen_clientes(self):
+        """Recalcula el resumen de todos los clientes de una vez (base nueva o reparación)."""
+        self.cursor.execute("DELETE FROM resumen_clientes")
+        self.cursor.execute(self._sql_resumen("c.id"))
+
+    def recalcular_perfil_archivado(self, cliente_ids=None):
+        """
+        Rearma perfil_archivado (historia de pago de las deudas del archivo) para los
+        clientes indicados, o para todos, y recalcula su resumen. Los triggers no ven
+        la base de archivo: lo llaman los métodos que la modifican.
+        """
+        if cliente_ids is None:
+            filtro, params = "", ()
+            self.cursor.execute("DELETE FROM perfil_archivado")
+        else:
+            filtro = "AND d.cliente_id IN (SELECT value FROM json_each(?))"
+            params = (json.dumps(sorted({int(i) for i in cliente_ids if i is not None})),)
+            self.cursor.execute("DELETE FROM perfil_archivado WHERE cliente_id IN (SELECT value FROM json_each(?))",
+                                params)
+        self.cursor.execute(f"""
+            INSERT INTO perfil_archivado (cliente_id, ultimo_pago, deudas_saldadas, saldadas_a_tiempo)
+            SELECT d.cliente_id,
+                   MAX((SELECT MAX(p.fecha) FROM archivo.pagos_detalle p
+                        WHERE p.deuda_id = d.id AND p.metodo != 'SALDO A FAVOR')),
+                   {self.SQL_SALDADAS.format(plazo=self.PLAZO_PAGO_DIAS)}
+            FROM archivo.deudas d
+            WHERE d.cliente_id IS NOT NULL {filtro}
+            GROUP BY d.cliente_id
+        """, params)
+        if cliente_ids is None:
+            self.reconstruir_resumen_clientes()
+        else:
+            for cliente_id in json.loads(params[0]):
+                self.cursor.execute(self._sql_resumen("?"), (cliente_id,))
+
+    def instalar_vigilancia(self):
+        """
+        Contadores de modificación por tabla y registro de clientes tocados.
+        Los mantienen triggers, así también se enteran de lo que escribe
+        otro proceso (otra ventana, el servidor o una importación).
+        """
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS versiones_tabla (tabla TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS clientes_modificados (
+                cliente_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_clientes_modificados_version ON clientes_modificados(version)")
+        # '*' es el contador global: sube con cualquier cambio
+        self.cursor.executemany("INSERT OR IGNORE INTO versiones_tabla (tabla, version) VALUES (?, 0)",
+                                [('*',), ('clientes',), ('deudas',), ('pagos_detalle',)])
+
+        cliente_de = {
+            'clientes': "{fila}.id",
+            'deudas': "{fila}.cliente_id",
+            'pagos_detalle': "(SELECT cliente_id FROM deudas WHERE id = {fila}.deuda_id)",
+        }
+        for tabla, expr_cliente in cliente_de.items():
+            for evento, fila in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+                cliente = expr_cliente.format(fila=fila)
+                # Sin cliente (deuda huérfana) no hay nada que marcar: un NULL en la
+                # INTEGER PRIMARY KEY inventaría un id nuevo
+                self._instalar_disparador(f"trg_vig_{tabla}_{evento.lower()}", f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_vig_{tabla}_{evento.lower()} AFTER {evento} ON {tabla}
+                    BEGIN
+                        UPDATE versiones_tabla SET version = version + 1 WHERE tabla IN ('*', '{tabla}');
+                        INSERT OR REPLACE INTO clientes_modificados (cliente_id, version)
+                            SELECT {cliente}, version FROM versiones_tabla
+                            WHERE tabla = '*' AND {cliente} IS NOT NULL;
+                    END
+                """)
+        self.conn.commit()
+
+    def _instalar_disparador(self, nombre, sql):
+        """
+        Crea el trigger, o lo reemplaza si el que está guardado en la base
+        es de una versión anterior. 'sql' es un CREATE TRIGGER IF NOT EXISTS.
+        Retorna True si lo creó o reemplazó.
+        """
+        # SQLite guarda el texto tal cual, sin el IF NOT EXISTS
+        esperado = sql.strip().replace("CREATE TRIGGER IF NOT EXISTS", "CREATE TRIGGER", 1)
+        self.cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (nombre,))
+        fila = self.cursor.fetchone()
+        if fila and fila[0] == esperado:
+            return False
+        self.cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+        self.cursor.execute(sql)
+        return True
+
+    # --- TRANSACCIONES (UNIDAD DE TRABAJO) ---
+    @contextmanager
+    def transaccion(self):
+        """
+        Agrupa varias escrituras en un solo commit:
+            with db.transaccion():
+                db.agregar_interes_deuda(...)
+                db.registrar_pago(...)
+        Los métodos de escritura usan esto mismo, así que dentro de una transacción
+        abierta no confirman por su cuenta. Cada nivel anidado es un SAVEPOINT:
+        si falla, se deshace solo ese nivel y el error sigue hacia afuera.
+        Si otro proceso tiene la base, tomar el lock al empezar se reintenta con
+        esperas crecientes (todavía no se ejecutó nada del bloque).
+        """
+        nivel = self.nivel_transaccion
+        if nivel == 0:
+            if self.conn.in_transaction:
+                # Quedó algo abierto por fuera (ej: DDL): lo confirmamos antes
+                self.conn.commit()
+            # IMMEDIATE toma el lock de escritura al empezar, no a mitad de camino.
+            # Lo que tarda es justamente la espera por otros procesos.
+            inicio = time.perf_counter()
+            # Si ya corre dentro de con_reintentos, no se reintenta de nuevo acá
+            self.con_reintentos(self.cursor.execute, "BEGIN IMMEDIATE")
+            espera = time.perf_counter() - inicio
+            self.contencion['transacciones'] += 1
+            self.contencion['espera_lock'] += espera
+            self.contencion['espera_lock_max'] = max(self.contencion['espera_lock_max'], espera)
+        else:
+            self.cursor.execute(f"SAVEPOINT nivel_{nivel}")
+        self.nivel_transaccion = nivel + 1
+        try:
+            yield self
+        except BaseException:
+            self.nivel_transaccion = nivel
+            if nivel == 0:
+                self.conn.rollback()
+            else:
+                self.cursor.execute(f"ROLLBACK TO nivel_{nivel}")
+                self.cursor.execute(f"RELEASE nivel_{nivel}")
+            # Lo leído dentro de la transacción deshecha no sirve más
+            self.invalidar_cache()
+            raise
+        self.nivel_transaccion = nivel
+        if nivel == 0:
+            try:
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                self.invalidar_cache()
+                raise
+        else:
+            self.cursor.execute(f"RELEASE nivel_{nivel}")
+
+    def con_reintentos(self, funcion, *args, **kwargs):
+        """
+        Ejecuta 'funcion' (que abre su propia transacción) y, si la base está
+        bloqueada por otro proceso, la repite con esperas crecientes.
+        Dentro de una transacción ya abierta, o de otro con_reintentos, no reintenta:
+        lo decide el de afuera (así las esperas no se multiplican).
+        """
+        if self.nivel_transaccion or self.reintentando:
+            return funcion(*args, **kwargs)
+        espera = self.espera_reintento
+        for intento in range(self.reintentos + 1):
+            self.reintentando = True
+            try:
+                return funcion(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not es_bloqueo(e):
+                    raise
+                self.contencion['bloqueos'] += 1
+                if intento == self.reintentos:
+                    self.contencion['fallidas'] += 1
+                    raise
+            finally:
+                self.reintentando = False
+            # La transacción fallida ya se deshizo: repetirla es seguro
+            pausa = espera * random.uniform(0.5, 1.5)
+            time.sleep(pausa)
+            espera *= 2
+            self.contencion['reintentos'] += 1
+            self.contencion['espera_reintentos'] += pausa
+
+    def estadisticas_contencion(self):
+        datos = dict(self.contencion)
+        datos['espera_lock_media'] = datos['espera_lock'] / datos['transacciones'] if datos['transacciones'] else 0.0
+        return datos
+
+    # --- DETECCIÓN DE CAMBIOS DE OTROS PROCESOS ---
+    def obtener_data_version(self):
+        """Cambia solo cuando otra conexión confirma algo. Es la consulta más barata posible."""
+        self.cursor.execute("PRAGMA data_version")
+        version = self.cursor.fetchone()[0]
+        if version != self.ultima_data_version:
+            # Otro proceso escribió: lo que está en caché puede estar viejo
+            self.ultima_data_version = version
+            self.invalidar_cache()
+        return version
+
+    # --- CACHÉ ---
+    def invalidar_cache(self):
+        self.generacion += 1
+        self.cache.clear()
+
+    def estadisticas_cache(self):
+        return {'aciertos': self.cache_aciertos, 'fallos': self.cache_fallos,
+                'entradas': len(self.cache), 'generacion': self.generacion}
+
+    def obtener_versiones_tabla(self):
+        self.cursor.execute("SELECT tabla, version FROM versiones_tabla")
+        return dict(self.cursor.fetchall())
+
+    def obtener_clientes_modificados(self, desde_version):
+        self.cursor.execute("SELECT cliente_id FROM clientes_modificados WHERE version > ?", (desde_version,))
+        return [r[0] for r in self.cursor.fetchall()]
+
+    def obtener_saldos_clientes(self, ids):
+        """
+        Mismo formato que obtener_clientes_con_saldo, pero solo para los ids indicados.
+        El saldo sale de resumen_clientes, igual que en obtener_clientes_pagina.
+        """
+        if not ids:
+            return []
+        query = """
+            SELECT c.id, c.dni, c.nombre, c.localidad, r.saldo
+            FROM clientes c JOIN resumen_clientes r ON r.cliente_id = c.id
+            WHERE c.id IN (SELECT value FROM json_each(?))
+        """
+        self.cursor.execute(query, (json.dumps([int(i) for i in ids]),))
+        return self.cursor.fetchall()
+
     # --- MÉTODOS DE CLIENTES ---
+    @consulta_en_cache
     def existe_cliente(self, dni):
         self.cursor.execute("SELECT id FROM clientes WHERE dni = ?", (dni,))
         row = self.cursor.fetchone()
         return row is not None
 
+    @invalida_cache
+    @reintenta_si_bloqueada
     def agregar_cliente(self, dni, nombre, localidad):
-        self.cursor.execute("INSERT INTO clientes (dni, nombre, telefono, localidad) VALUES (?, ?, ?, ?)", 
-                            (dni, nombre, "", localidad))
-        self.conn.commit()
+        with self.transaccion():
+            self.cursor.execute("INSERT INTO clientes (dni, nombre, telefono, localidad) VALUES (?, ?, ?, ?)", 
+                                (dni, nombre, "", localidad))
 
+    @consulta_en_cache
     def obtener_clientes_con_saldo(self, filtro=""):
         query = """
             SELECT c.id, c.dni, c.nombre, c.localidad, 
@@ -104,31 +623,153 @@ class BaseDeDatos:
         self.cursor.execute(query, (filtro_sql, filtro_sql, filtro_sql))
         return self.cursor.fetchall()
 
+    # Columnas por las que se puede ordenar la lista: (expresión SQL, desempate, posición en la fila).
+    # El desempate es el id de la misma tabla que el índice, así el índice da el orden completo.
+    ORDENES_CLIENTES = {
+        'dni': ("IFNULL(c.dni, '')", "c.id", 1),
+        'nombre': ("c.nombre", "c.id", 2),
+        'localidad': ("IFNULL(c.localidad, '')", "c.id", 3),
+        'saldo': ("r.saldo", "r.cliente_id", 4),
+    }
+
+    @consulta_en_cache
+    def obtener_clientes_pagina(self, filtro="", orden='nombre', descendente=False, saldo_min=None, saldo_max=None,
+                                con_saldo_a_favor=False, localidad=None, atraso_dias=None, despues_de=None, limite=200):
+        """
+        Lista de clientes ordenada y filtrada en SQL (saldos de resumen_clientes), por páginas.
+        Mismo formato que obtener_clientes_con_saldo: [(id, dni, nombre, localidad, saldo), ...]
+          atraso_dias: solo clientes con alguna deuda abierta de al menos esos días
+          despues_de: clave_pagina() de la última fila recibida. Paginación por clave:
+                      el id desempata, así el orden es estable y no hay OFFSET.
+        """
+        expr, desempate, _ = self.ORDENES_CLIENTES[orden]
+        condiciones, params = [], []
+        if filtro:
+            condiciones.append("(c.nombre LIKE ? OR c.dni LIKE ? OR c.localidad LIKE ?)")
+            params += ['%' + filtro + '%'] * 3
+        if saldo_min is not None:
+            condiciones.append("r.saldo >= ?")
+            params.append(saldo_min)
+        if saldo_max is not None:
+            condiciones.append("r.saldo <= ?")
+            params.append(saldo_max)
+        if con_saldo_a_favor:
+            condiciones.append("r.saldo_favor > 0.009")
+        if localidad:
+            condiciones.append("IFNULL(c.localidad, '') = ?")
+            params.append(localidad)
+        if atraso_dias is not None:
+            condiciones.append("r.deuda_mas_vieja <= ?")
+            params.append(f"{(date.today() - timedelta(days=atraso_dias)).isoformat()} 23:59")
+        if despues_de is not None:
+            condiciones.append(f"({expr}, {desempate}) {'<' if descendente else '>'} (?, ?)")
+            params += list(despues_de)
+
+        sentido = "DESC" if descendente else "ASC"
+        where = ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+        self.cursor.execute(f"""
+            SELECT c.id, c.dni, c.nombre, c.localidad, r.saldo
+            FROM clientes c JOIN resumen_clientes r ON r.cliente_id = c.id
+            {where}
+            ORDER BY {expr} {sentido}, {desempate} {sentido}
+            LIMIT ?
+        """, params + [limite])
+        return self.cursor.fetchall()
+
+    @classmethod
+    def clave_pagina(cls, orden, fila):
+        """Clave de la fila para pedir la página siguiente en obtener_clientes_pagina."""
+        valor = fila[cls.ORDENES_CLIENTES[orden][2]]
+        return (valor if orden == 'saldo' else (valor or ""), fila[0])
+
+    @consulta_en_cache
+    def obtener_localidades(self):
+        self.cursor.execute("SELECT DISTINCT IFNULL(localidad, '') FROM clientes WHERE IFNULL(localidad, '') != '' ORDER BY 1")
+        return [r[0] for r in self.cursor.fetchall()]
+
+    @invalida_cache
+    @reintenta_si_bloqueada
+    def fusionar_clientes(self, cliente_id, duplicados_ids):
+        """
+        Pasa todas las deudas (también las archivadas) de los duplicados al
+        cliente que se conserva, completa sus datos vacíos con los de ellos
+        y borra los duplicados. Todo en una transacción.
+        Retorna la cantidad de deudas movidas.
+        """
+        ids = [int(i) for i in duplicados_ids if int(i) != int(cliente_id)]
+        if not ids:
+            return 0
+        lista = json.dumps(ids)
+        with self.transaccion():
+            self.cursor.execute("UPDATE deudas SET cliente_id = ? WHERE cliente_id IN (SELECT value FROM json_each(?))",
+                                (cliente_id, lista))
+            movidas = self.cursor.rowcount
+            if self.archivo_hasta:
+                # Los triggers de replicación no ven el archivo: anotamos el cambio a mano
+                self.cursor.execute("SELECT uuid FROM archivo.deudas WHERE cliente_id IN (SELECT value FROM json_each(?))",
+                                    (lista,))
+                anotar_cambios(self.cursor, 'deudas', [r[0] for r in self.cursor.fetchall()])
+                self.cursor.execute("UPDATE archivo.deudas SET cliente_id = ? "
+                                    "WHERE cliente_id IN (SELECT value FROM json_each(?))", (cliente_id, lista))
+                movidas += self.cursor.rowcount
+                self.recalcular_perfil_archivado([cliente_id] + ids)
+            # DNI, teléfono o localidad vacíos se completan con el primero que los tenga
+            campos = ", ".join(
+                f"{c} = COALESCE(NULLIF({c}, ''), (SELECT {c} FROM clientes WHERE id IN (SELECT value FROM json_each(:ids)) "
+                f"AND COALESCE({c}, '') != '' ORDER BY id LIMIT 1))"
+                for c in ('dni', 'telefono', 'localidad'))
+            self.cursor.execute(f"UPDATE clientes SET {campos} WHERE id = :id", {'ids': lista, 'id': cliente_id})
+            self.cursor.execute("DELETE FROM clientes WHERE id IN (SELECT value FROM json_each(?))", (lista,))
+        return movidas
+
     # --- MÉTODOS DE DEUDAS ---
+    @invalida_cache
+    @reintenta_si_bloqueada
     def agregar_deuda(self, cliente_id, monto, descripcion, fecha_manual=None):
         if fecha_manual:
             fecha_final = fecha_manual
         else:
             fecha_final = datetime.now().strftime("%Y-%m-%d %H:%M")
             
-        self.cursor.execute("""
-            INSERT INTO deudas (cliente_id, monto_total, monto_pagado, descripcion, estado, fecha_creacion) 
-            VALUES (?, ?, 0, ?, 'PENDIENTE', ?)
-        """, (cliente_id, monto, descripcion, fecha_final))
-        self.conn.commit()
-
-    def obtener_historial_cliente(self, cliente_id):
-        # Indices: 0:id, 1:desc, 2:total, 3:pagado, 4:resta, 5:fecha_creacion, 6:fecha_pago, 7:estado, 8:metodo
-        query = """
+        with self.transaccion():
+            self.cursor.execute("""
+                INSERT INTO deudas (cliente_id, monto_total, monto_pagado, descripcion, estado, fecha_creacion) 
+                VALUES (?, ?, 0, ?, 'PENDIENTE', ?)
+            """, (cliente_id, monto, descripcion, fecha_final))
+
+    @invalida_cache
+    @reintenta_si_bloqueada
+    def agregar_deudas_lote(self, cliente_id, lineas):
+        """
+        Inserta varias deudas del mismo cliente en una sola transacción.
+        lineas: [(monto, descripcion, fecha_final), ...] ya validadas.
+        """
+        with self.transaccion():
+            self.cursor.executemany("""
+                INSERT INTO deudas (cliente_id, monto_total, monto_pagado, descripcion, estado, fecha_creacion) 
+                VALUES (?, ?, 0, ?, 'PENDIENTE', ?)
+            """, [(cliente_id, monto, desc, fecha) for monto, desc, fecha in lineas])
+        return len(lineas)
+
+    @consulta_en_cache
+    def obtener_historial_cliente(self, cliente_id, incluir_archivadas=False):
+        # Indices: 0:id, 1:desc, 2:total, 3:pagado, 4:resta, 5:fecha_creacion, 6:fecha_pago, 7:estado, 8:metodo,
+        #          9:archivada (1 si está en el archivo: no admite pagos)
+        tabla = f"(SELECT {COLUMNAS_DEUDAS}, 0 AS archivada FROM deudas)"
+        if incluir_archivadas and self.archivo_hasta:
+            tabla = (f"(SELECT {COLUMNAS_DEUDAS}, 0 AS archivada FROM deudas "
+                     f"UNION ALL SELECT {COLUMNAS_DEUDAS}, 1 FROM archivo.deudas)")
+        query = f"""
             SELECT id, descripcion, monto_total, monto_pagado, 
                    (monto_total - monto_pagado) as resta, 
-                   fecha_creacion, fecha_pago, estado, metodo_pago
-            FROM deudas 
+                   fecha_creacion, fecha_pago, estado, metodo_pago, archivada
+            FROM {tabla} 
             WHERE cliente_id = ?
         """
         self.cursor.execute(query, (cliente_id,))
         return self.cursor.fetchall()
 
+    @consulta_en_cache
     def obtener_total_individual(self, cliente_id):
         query = """
             SELECT COALESCE(SUM(monto_total - monto_pagado), 0) 
@@ -138,57 +779,175 @@ class BaseDeDatos:
         resultado = self.cursor.fetchone()
         return resultado[0] if resultado else 0
 
+    @invalida_cache
     def borrar_deuda_permanentemente(self, deuda_id):
-        # Primero borramos el historial de pagos de esa deuda
-        self.cursor.execute("DELETE FROM pagos_detalle WHERE deuda_id = ?", (deuda_id,))
-        # Luego borramos la deuda
-        self.cursor.execute("DELETE FROM deudas WHERE id = ?", (deuda_id,))
-        self.conn.commit()
+        self.borrar_deudas_permanentemente([deuda_id])
 
+    @invalida_cache
+    @reintenta_si_bloqueada
+    def borrar_deudas_permanentemente(self, deuda_ids):
+        """Borra varias deudas (y sus pagos) con un DELETE por tabla y un solo commit."""
+        if not deuda_ids:
+            return
+        ids = (json.dumps([int(i) for i in deuda_ids]),)
+        with self.transaccion():
+            # Primero borramos el historial de pagos de esas deudas
+            self.cursor.execute("DELETE FROM pagos_detalle WHERE deuda_id IN (SELECT value FROM json_each(?))", ids)
+            # Luego borramos las deudas
+            self.cursor.execute("DELETE FROM deudas WHERE id IN (SELECT value FROM json_each(?))", ids)
+            if self.archivo_hasta:
+                # Si alguna estaba archivada, la borramos del archivo
+                self.cursor.execute("SELECT DISTINCT cliente_id FROM archivo.deudas WHERE id IN (SELECT value FROM json_each(?))", ids)
+                clientes = [r[0] for r in self.cursor.fetchall()]
+                # Las bajas del archivo también se replican (los triggers no las ven)
+                self.cursor.execute("SELECT uuid FROM archivo.pagos_detalle WHERE deuda_id IN (SELECT value FROM json_each(?))", ids)
+                anotar_cambios(self.cursor, 'pagos_detalle', [r[0] for r in self.cursor.fetchall()], 'D')
+                self.cursor.execute("SELECT uuid FROM archivo.deudas WHERE id IN (SELECT value FROM json_each(?))", ids)
+                anotar_cambios(self.cursor, 'deudas', [r[0] for r in self.cursor.fetchall()], 'D')
+                self.cursor.execute("DELETE FROM archivo.pagos_detalle WHERE deuda_id IN (SELECT value FROM json_each(?))", ids)
+                self.cursor.execute("DELETE FROM archivo.deudas WHERE id IN (SELECT value FROM json_each(?))", ids)
+                if clientes:
+                    self.recalcular_perfil_archivado(clientes)
+
+    @invalida_cache
+    @reintenta_si_bloqueada
     def agregar_interes_deuda(self, deuda_id, interes):
         """
         Suma el monto de interés al total de la deuda para que no quede como saldo a favor.
         """
-        self.cursor.execute("UPDATE deudas SET monto_total = monto_total + ? WHERE id = ?", (interes, deuda_id))
-        self.conn.commit()
+        with self.transaccion():
+            self.cursor.execute("UPDATE deudas SET monto_total = monto_total + ? WHERE id = ?", (interes, deuda_id))
+            if self.cursor.rowcount == 0:
+                self._rechazar_archivadas([deuda_id])
+
+    def _rechazar_archivadas(self, deuda_ids):
+        """Las deudas del archivo están saldadas y solo se consultan: no se les carga nada."""
+        if not self.archivo_hasta:
+            return
+        self.cursor.execute("SELECT id FROM archivo.deudas WHERE id IN (SELECT value FROM json_each(?))",
+                            (json.dumps([int(i) for i in deuda_ids]),))
+        archivadas = [r[0] for r in self.cursor.fetchall()]
+        if archivadas:
+            raise ValueError(f"Deudas archivadas (ya saldadas), no admiten pagos ni recargos: {archivadas}")
 
     # --- MÉTODOS DE PAGOS (LÓGICA MANUAL Y DETALLADA) ---
+    @invalida_cache
+    @reintenta_si_bloqueada
     def registrar_pago(self, deuda_id, nuevo_pago, metodo):
         """
         Registra un pago en una deuda específica y guarda el movimiento en el historial.
         """
-        # 1. Obtener datos actuales de la deuda
-        self.cursor.execute("SELECT monto_total, monto_pagado FROM deudas WHERE id = ?", (deuda_id,))
-        res = self.cursor.fetchone()
-        if not res: return
-        
-        total, pagado_actual = res
-        pagado_nuevo = pagado_actual + nuevo_pago
-        
-        # 2. Determinar estado
-        estado = "PENDIENTE"
-        # Usamos round para evitar problemas de decimales
-        if round(pagado_nuevo, 2) >= round(total, 2):
-            estado = "PAGADA"
-        elif pagado_nuevo > 0:
-            estado = "PARCIAL"
-            
-        ahora = datetime.now().strftime("%Y-%m-%d %H:%M")
+        # La lectura va dentro de la transacción: nadie puede pagar la misma deuda en el medio
+        with self.transaccion():
+            # 1. Obtener datos actuales de la deuda
+            self.cursor.execute("SELECT monto_total, monto_pagado FROM deudas WHERE id = ?", (deuda_id,))
+            res = self.cursor.fetchone()
+            if not res:
+                self._rechazar_archivadas([deuda_id])
+                return
         
-        # 3. Actualizar la deuda general
-        self.cursor.execute("""
-            UPDATE deudas SET monto_pagado = ?, metodo_pago = ?, fecha_pago = ?, estado = ?
-            WHERE id = ?
-        """, (pagado_nuevo, metodo, ahora, estado, deuda_id))
-
-        # 4. GUARDAR EN EL HISTORIAL DETALLADO
-        self.cursor.execute("""
-            INSERT INTO pagos_detalle (deuda_id, monto, fecha, metodo)
-            VALUES (?, ?, ?, ?)
-        """, (deuda_id, nuevo_pago, ahora, metodo))
-
-        self.conn.commit()
-
+            total, pagado_actual = res
+            pagado_nuevo = pagado_actual + nuevo_pago
+        
+            # 2. Determinar estado
+            estado = "PENDIENTE"
+            # Usamos round para evitar problemas de decimales
+            if round(pagado_nuevo, 2) >= round(total, 2):
+                estado = "PAGADA"
+            elif pagado_nuevo > 0:
+                estado = "PARCIAL"
+            
+            ahora = datetime.now().strftime("%Y-%m-%d %H:%M")
+        
+            # 3. Actualizar la deuda general
+            self.cursor.execute("""
+                UPDATE deudas SET monto_pagado = ?, metodo_pago = ?, fecha_pago = ?, estado = ?
+                WHERE id = ?
+            """, (pagado_nuevo, metodo, ahora, estado, deuda_id))
+
+            # 4. GUARDAR EN EL HISTORIAL DETALLADO
+            self.cursor.execute("""
+                INSERT INTO pagos_detalle (deuda_id, monto, fecha, metodo)
+                VALUES (?, ?, ?, ?)
+            """, (deuda_id, nuevo_pago, ahora, metodo))
+
+    @invalida_cache
+    @reintenta_si_bloqueada
+    def registrar_pago_con_interes(self, deuda_id, interes, nuevo_pago, metodo):
+        """
+        Lo que confirma la ventana de pago: suma el interés (si hay) y registra el pago,
+        los dos juntos o ninguno. Es un solo método para que también sea atómico
+        cuando la interfaz trabaja contra el servidor.
+        """
+        with self.transaccion():
+            if interes > 0:
+                self.agregar_interes_deuda(deuda_id, interes)
+            self.registrar_pago(deuda_id, nuevo_pago, metodo)
+
+    # Orden en que se reparte un pago entre varias deudas
+    ORDENES_REPARTO = {
+        'Más antiguas primero': "fecha_creacion ASC, id ASC",
+        'Más recientes primero': "fecha_creacion DESC, id DESC",
+        'Menor saldo primero': "(monto_total - monto_pagado) ASC, id ASC",
+        'Mayor saldo primero': "(monto_total - monto_pagado) DESC, id ASC",
+    }
+
+    @invalida_cache
+    @reintenta_si_bloqueada
+    def registrar_pago_multiple(self, deuda_ids, monto, metodo, orden='Más antiguas primero'):
+        """
+        Reparte un pago entre varias deudas en el orden elegido: cada una recibe
+        lo que le falta hasta que se acaba el dinero. Si sobra, queda como saldo
+        a favor en la última. Todo en una sola transacción.
+        Retorna [(deuda_id, monto_aplicado), ...].
+        """
+        if not deuda_ids or monto <= 0:
+            return []
+        # Lectura y escritura juntas: los saldos leídos no pueden cambiar antes de repartir
+        with self.transaccion():
+            self.cursor.execute(f"""
+                SELECT id, monto_total, monto_pagado FROM deudas
+                WHERE id IN (SELECT value FROM json_each(?))
+                ORDER BY {self.ORDENES_REPARTO[orden]}
+            """, (json.dumps([int(i) for i in deuda_ids]),))
+            deudas = self.cursor.fetchall()
+            if len(deudas) < len(deuda_ids):
+                self._rechazar_archivadas(deuda_ids)
+            if not deudas:
+                return []
+
+            ahora = datetime.now().strftime("%Y-%m-%d %H:%M")
+            resto = monto
+            actualizaciones = []
+            pagos = []
+            for i, (d_id, total, pagado) in enumerate(deudas):
+                if resto <= 0: break
+                falta = max(total - pagado, 0)
+                aplicado = resto if i == len(deudas) - 1 else min(resto, falta)
+                if aplicado <= 0: continue
+                resto -= aplicado
+
+                pagado_nuevo = pagado + aplicado
+                # Misma regla de estado que registrar_pago
+                estado = "PENDIENTE"
+                if round(pagado_nuevo, 2) >= round(total, 2):
+                    estado = "PAGADA"
+                elif pagado_nuevo > 0:
+                    estado = "PARCIAL"
+                actualizaciones.append((pagado_nuevo, metodo, ahora, estado, d_id))
+                pagos.append((d_id, aplicado, ahora, metodo))
+
+            self.cursor.executemany("""
+                UPDATE deudas SET monto_pagado = ?, metodo_pago = ?, fecha_pago = ?, estado = ?
+                WHERE id = ?
+            """, actualizaciones)
+            self.cursor.executemany("""
+                INSERT INTO pagos_detalle (deuda_id, monto, fecha, metodo)
+                VALUES (?, ?, ?, ?)
+            """, pagos)
+            return [(p[0], p[1]) for p in pagos]
+
+    @consulta_en_cache
     def obtener_detalles_pagos(self, deuda_id):
         """Recupera la lista de pagos individuales para el click derecho"""
         self.cursor.execute("""
@@ -197,9 +956,57 @@ class BaseDeDatos:
             WHERE deuda_id = ? 
             ORDER BY id DESC
         """, (deuda_id,))
+        pagos = self.cursor.fetchall()
+        if not pagos and self.archivo_hasta:
+            # Puede ser una deuda archivada: la buscamos en el archivo
+            self.cursor.execute("""
+                SELECT fecha, monto, metodo 
+                FROM archivo.pagos_detalle 
+                WHERE deuda_id = ? 
+                ORDER BY id DESC
+            """, (deuda_id,))
+            pagos = self.cursor.fetchall()
+        return pagos
+
+    @consulta_en_cache
+    def obtener_pagos_cliente(self, cliente_id, fecha_desde=None, id_desde=None, limite=200):
+        """
+        Todos los pagos del cliente (de todas sus deudas, incluidas las archivadas
+        y los traspasos de SALDO A FAVOR), del más nuevo al más viejo.
+        Paginación por clave: para la página siguiente se pasan la fecha y el id
+        del último pago recibido (no hay OFFSET). Cada fuente se corta con su propio
+        LIMIT antes de unirlas, así la unión ordena a lo sumo 2 * limite filas; dentro
+        de cada fuente SQLite ordena los pagos del cliente que quedan después del corte
+        quedándose solo con los primeros 'limite'.
+        Formato: [(fecha, pago_id, monto, metodo, deuda_id, descripcion, archivada), ...]
+        """
+        if fecha_desde is None:
+            corte, params = "", []
+        else:
+            corte, params = "AND (p.fecha, p.id) < (?, ?)", [fecha_desde, id_desde]
+
+        fuentes = [("", 0)]
+        if self.archivo_hasta:
+            fuentes.append(("archivo.", 1))
+        partes, parametros = [], []
+        for esquema, archivada in fuentes:
+            # El LIMIT dentro de cada rama necesita la subconsulta (SQLite no lo admite en un UNION)
+            partes.append(f"""
+                SELECT * FROM (
+                    SELECT p.fecha, p.id, p.monto, p.metodo, d.id, d.descripcion, {archivada}
+                    FROM {esquema}deudas d JOIN {esquema}pagos_detalle p ON p.deuda_id = d.id
+                    WHERE d.cliente_id = ? {corte}
+                    ORDER BY p.fecha DESC, p.id DESC LIMIT ?
+                )
+            """)
+            parametros += [cliente_id] + params + [limite]
+
+        sql = " UNION ALL ".join(partes) + " ORDER BY 1 DESC, 2 DESC LIMIT ?"
+        self.cursor.execute(sql, parametros + [limite])
         return self.cursor.fetchall()
 
     # --- LÓGICA DE SALDOS A FAVOR (MANUAL) ---
+    @consulta_en_cache
     def obtener_saldo_a_favor_disponible(self, cliente_id):
         """
         Suma todo el dinero que sobra de las boletas pagadas en exceso.
@@ -213,76 +1020,107 @@ class BaseDeDatos:
         res = self.cursor.fetchone()
         return res[0] if res and res[0] else 0.0
 
+    @invalida_cache
+    @reintenta_si_bloqueada
     def usar_saldo_manual(self, cliente_id, deuda_destino_id):
         """
         Lógica compleja: Saca dinero de las boletas donde sobra y lo pone en la deuda_destino_id.
         Registra los movimientos en el historial como 'SALDO A FAVOR'.
         """
-        # 1. Calcular cuánto saldo a favor hay disponible
-        saldo_disponible = self.obtener_saldo_a_favor_disponible(cliente_id)
-        if saldo_disponible <= 0:
-            return False, "No hay saldo a favor disponible."
+        # Todo en una transacción: el pago en la destino y el descuento en las de origen
+        with self.transaccion():
+            # 1. Calcular cuánto saldo a favor hay disponible (dentro de la transacción no usa la cache)
+            saldo_disponible = self.obtener_saldo_a_favor_disponible(cliente_id)
+            if saldo_disponible <= 0:
+                return False, "No hay saldo a favor disponible."
 
-        # 2. Verificar cuánto falta pagar en la deuda destino
-        self.cursor.execute("SELECT monto_total, monto_pagado FROM deudas WHERE id = ?", (deuda_destino_id,))
-        res = self.cursor.fetchone()
-        if not res: return False, "Deuda no encontrada."
+            # 2. Verificar cuánto falta pagar en la deuda destino
+            self.cursor.execute("SELECT monto_total, monto_pagado FROM deudas WHERE id = ?", (deuda_destino_id,))
+            res = self.cursor.fetchone()
+            if not res: return False, "Deuda no encontrada."
         
-        total_destino, pagado_destino = res
-        falta_pagar = total_destino - pagado_destino
+            total_destino, pagado_destino = res
+            falta_pagar = total_destino - pagado_destino
         
-        if falta_pagar <= 0:
-            return False, "La deuda destino ya está pagada."
+            if falta_pagar <= 0:
+                return False, "La deuda destino ya está pagada."
 
-        # 3. Determinar cuánto vamos a usar
-        monto_a_usar = min(saldo_disponible, falta_pagar)
+            # 3. Determinar cuánto vamos a usar
+            monto_a_usar = min(saldo_disponible, falta_pagar)
         
-        # 4. Registrar el pago en la deuda destino
-        self.registrar_pago(deuda_destino_id, monto_a_usar, "SALDO A FAVOR")
+            # 4. Registrar el pago en la deuda destino
+            self.registrar_pago(deuda_destino_id, monto_a_usar, "SALDO A FAVOR")
 
-        # 5. Descontar ese dinero de las deudas que tenían saldo a favor
-        #    Reducimos su 'monto_pagado' hasta cubrir 'monto_a_usar'.
-        resto = monto_a_usar
+            # 5. Descontar ese dinero de las deudas que tenían saldo a favor
+            #    Reducimos su 'monto_pagado' hasta cubrir 'monto_a_usar'.
+            resto = monto_a_usar
         
-        self.cursor.execute("SELECT id, monto_total, monto_pagado FROM deudas WHERE cliente_id = ? AND monto_pagado > monto_total", (cliente_id,))
-        superavitarias = self.cursor.fetchall()
+            self.cursor.execute("SELECT id, monto_total, monto_pagado FROM deudas WHERE cliente_id = ? AND monto_pagado > monto_total", (cliente_id,))
+            superavitarias = self.cursor.fetchall()
         
-        for d_id, d_total, d_pagado in superavitarias:
-            if resto <= 0: break
+            for d_id, d_total, d_pagado in superavitarias:
+                if resto <= 0: break
             
-            excedente = d_pagado - d_total
-            descuento = min(resto, excedente)
+                excedente = d_pagado - d_total
+                descuento = min(resto, excedente)
             
-            # Restamos al pagado de esa deuda
-            nuevo_pagado = d_pagado - descuento
-            self.cursor.execute("UPDATE deudas SET monto_pagado = ? WHERE id = ?", (nuevo_pagado, d_id))
+                # Restamos al pagado de esa deuda
+                nuevo_pagado = d_pagado - descuento
+                self.cursor.execute("UPDATE deudas SET monto_pagado = ? WHERE id = ?", (nuevo_pagado, d_id))
             
-            resto -= descuento
-
-        self.conn.commit()
-        return True, f"Se utilizaron ${monto_a_usar:,.2f} de saldo a favor."
+                resto -= descuento
+            return True, f"Se utilizaron ${monto_a_usar:,.2f} de saldo a favor."
 
     # ==========================================
     # NUEVOS METODOS PARA ESTADISTICAS
     # ==========================================
     
+    @consulta_en_cache
     def obtener_top_deudores(self, limit=5):
         """
         Retorna la lista de los clientes con mayor deuda acumulada.
         Formato: [(Nombre, DeudaTotal), ...]
         """
+        # Saldo ya calculado en resumen_clientes: se lee el índice de mayor a menor
         sql = """
-            SELECT c.nombre, SUM(d.monto_total - d.monto_pagado) as deuda_acumulada
-            FROM deudas d
-            JOIN clientes c ON d.cliente_id = c.id
-            GROUP BY d.cliente_id
-            HAVING deuda_acumulada > 1
-            ORDER BY deuda_acumulada DESC
+            SELECT c.nombre, r.saldo
+            FROM resumen_clientes r
+            JOIN clientes c ON c.id = r.cliente_id
+            WHERE r.saldo > 1
+            ORDER BY r.saldo DESC
             LIMIT ?
         """
         self.cursor.execute(sql, (limit,))
         return self.cursor.fetchall()
 
+    @consulta_en_cache
+    def obtener_lista_cobranza(self, despues_de=None, limite=100):
+        """
+        Clientes a cobrar, del más urgente al menos (ver SQL_PRIORIDAD_COBRANZA).
+        Formato: [(cliente_id, nombre, telefono, localidad, monto_abierto, dias_deuda_mas_vieja,
+                   dias_sin_pagar, proporcion_a_tiempo, puntaje, clave), ...]
+          dias_sin_pagar / proporcion_a_tiempo: None si nunca pagó / no saldó ninguna deuda
+          clave: para la página siguiente se pasa despues_de=(clave, cliente_id) de la última fila
+        """
+        hoy = date.today().isoformat()
+        corte, params = "", []
+        if despues_de is not None:
+            corte, params = "AND (r.prioridad, r.cliente_id) < (?, ?)", list(despues_de)
+        self.cursor.execute(f"""
+            SELECT r.cliente_id, c.nombre, c.telefono, c.localidad, r.monto_abierto,
+                   CAST(julianday(?) - julianday(substr(r.deuda_mas_vieja, 1, 10)) AS INTEGER),
+                   CAST(julianday(?) - julianday(substr(r.ultimo_pago, 1, 10)) AS INTEGER),
+                   1.0 * r.saldadas_a_tiempo / NULLIF(r.deudas_saldadas, 0),
+                   -- Se suma el término de "hoy", que no se guarda (es igual para todos)
+                   r.prioridad + ? * julianday(?) / 30, r.prioridad
+            FROM resumen_clientes r JOIN clientes c ON c.id = r.cliente_id
+            WHERE r.prioridad IS NOT NULL {corte}
+            ORDER BY r.prioridad DESC, r.cliente_id DESC
+            LIMIT ?
+        """, [hoy, hoy, self.PESO_ATRASO + self.PESO_SILENCIO, hoy] + params + [limite])
+        return self.cursor.fetchall()
+
+    @consulta_en_cache
     def obtener_deuda_total(self):
         """
         Retorna la suma total de todas las deudas pendientes en el sistema.
@@ -292,71 +1130,780 @@ class BaseDeDatos:
         res = self.cursor.fetchone()
         return res[0] if res and res[0] else 0.0
 
+    @consulta_en_cache
     def obtener_cobro_mes(self):
         """
         Retorna la suma de pagos realizados en el mes actual.
         Basado en la fecha del pago (tabla pagos_detalle).
         """
-        mes_actual = datetime.now().strftime("%Y-%m")
-        patron = f"{mes_actual}%"
+        desde, hasta = self._rango_mes_actual()
         
-        sql = "SELECT SUM(monto) FROM pagos_detalle WHERE fecha LIKE ? AND metodo != 'SALDO A FAVOR'"
-        self.cursor.execute(sql, (patron,))
+        sql = f"SELECT SUM(monto) FROM {self._fuente_pagos(desde)} WHERE fecha >= ? AND fecha < ? AND metodo != 'SALDO A FAVOR'"
+        self.cursor.execute(sql, (desde, hasta))
         res = self.cursor.fetchone()
         return res[0] if res and res[0] else 0.0
 
+    @consulta_en_cache
     def obtener_desglose_pagos_mes(self):
         """
         Retorna una lista de tuplas (metodo, monto) con lo recaudado este mes,
         agrupado por método de pago (ignorando comentarios entre paréntesis).
         """
-        mes_actual = datetime.now().strftime("%Y-%m")
-        patron = f"{mes_actual}%"
-        
-        # Obtenemos TODOS los pagos del mes con su método y monto (Excluyendo Saldo a favor)
-        sql = "SELECT metodo, monto FROM pagos_detalle WHERE fecha LIKE ? AND metodo != 'SALDO A FAVOR'"
-        self.cursor.execute(sql, (patron,))
-        filas = self.cursor.fetchall()
-        
-        # Agrupamos manual en Python para limpiar "Metodo (Comentario)" -> "Metodo"
-        agrupado = {}
-        for metodo_raw, monto in filas:
-            # Si dice "Debito (jee)" -> tomamos solo "Debito"
-            metodo_limpio = metodo_raw.split(" (")[0].strip()
-            
-            if metodo_limpio not in agrupado:
-                agrupado[metodo_limpio] = 0.0
-            agrupado[metodo_limpio] += monto
-            
-        # Convertimos a lista y ordenamos por monto descendente
-        resultado = list(agrupado.items())
-        resultado.sort(key=lambda x: x[1], reverse=True)
-        
-        return resultado
+        desde, hasta = self._rango_mes_actual()
+        return [(metodo, total) for metodo, _, total in self.obtener_cierre_caja(desde, hasta)]
+
+    @staticmethod
+    def _rango_mes_actual():
+        """('2026-10-01', '2026-11-01'): el mes como rango, así se usa el índice por fecha (LIKE no lo usa)."""
+        inicio = date.today().replace(day=1)
+        siguiente = (inicio + timedelta(days=32)).replace(day=1)
+        return inicio.isoformat(), siguiente.isoformat()
+
+    # --- CIERRE DE CAJA ---
+    @consulta_en_cache
+    def obtener_cierre_caja(self, desde, hasta):
+        """
+        Cobros con fecha en [desde, hasta) ('YYYY-MM-DD HH:MM') agrupados por método
+        (sin el comentario entre paréntesis). No incluye SALDO A FAVOR: no es dinero que entra.
+        Retorna [(metodo, cantidad, total), ...] de mayor a menor total.
+        """
+        sql = f"""
+            SELECT {METODO_LIMPIO_SQL} AS metodo, COUNT(*), SUM(monto)
+            FROM {self._fuente_pagos(desde)}
+            WHERE fecha >= ? AND fecha < ? AND metodo != 'SALDO A FAVOR'
+            GROUP BY 1
+            ORDER BY 3 DESC
+        """
+        self.cursor.execute(sql, (desde, hasta))
+        return self.cursor.fetchall()
+
+    @consulta_en_cache
+    def obtener_movimientos_caja(self, desde, hasta):
+        """
+        Cada cobro de [desde, hasta), en orden de hora (mismo criterio que obtener_cierre_caja).
+        Formato: [(fecha, pago_id, monto, metodo, cliente, descripcion), ...]
+        """
+        partes = ["""
+            SELECT p.fecha, p.id, p.monto, p.metodo, c.nombre, d.descripcion
+            FROM pagos_detalle p
+            LEFT JOIN deudas d ON d.id = p.deuda_id
+            LEFT JOIN clientes c ON c.id = d.cliente_id
+            WHERE p.fecha >= ? AND p.fecha < ? AND p.metodo != 'SALDO A FAVOR'
+        """]
+        parametros = [desde, hasta]
+        if self.archivo_hasta and desde <= self.archivo_hasta:
+            partes.append("""
+                SELECT p.fecha, p.id, p.monto, p.metodo, c.nombre, d.descripcion
+                FROM archivo.pagos_detalle p
+                LEFT JOIN archivo.deudas d ON d.id = p.deuda_id
+                LEFT JOIN clientes c ON c.id = d.cliente_id
+                WHERE p.fecha >= ? AND p.fecha < ? AND p.metodo != 'SALDO A FAVOR'
+            """)
+            parametros += [desde, hasta]
+        self.cursor.execute(" UNION ALL ".join(partes) + " ORDER BY 1, 2", parametros)
+        return self.cursor.fetchall()
 
-    def obtener_recaudacion_historica(self):
+    @consulta_en_cache
+    def obtener_recaudacion_historica(self, desde=None):
         """
         Retorna la recaudación agrupada por mes (Año-Mes).
         Devuelve lista de tuplas: (mes_str, total)
         Ordenado del más reciente al más antiguo.
+        Si se indica 'desde' (YYYY-MM), solo incluye los meses a partir de esa fecha.
         """
-        sql = """
+        sql = f"""
             SELECT substr(fecha, 1, 7) as mes, SUM(monto)
-            FROM pagos_detalle
-            WHERE metodo != 'SALDO A FAVOR'
+            FROM {self._fuente_pagos(desde)}
+            WHERE metodo != 'SALDO A FAVOR' AND fecha >= ?
             GROUP BY substr(fecha, 1, 7)
             ORDER BY mes DESC
         """
-        self.cursor.execute(sql)
+        self.cursor.execute(sql, (desde or "",))
+        return self.cursor.fetchall()
+
+    @consulta_en_cache
+    def obtener_tendencia_mensual(self, desde=None):
+        """
+        Recaudación por mes con su tendencia, en una sola consulta (funciones de ventana).
+        Devuelve filas (mes, total, variacion, media_3, media_12, metodo, monto) ordenadas
+        por mes y, dentro del mes, por monto. Hay una fila por cada método del mes;
+        los meses sin cobros aparecen una vez con metodo None.
+          variacion: cambio respecto del mes anterior (0.05 = +5%), None si no hay base
+          media_3 / media_12: promedio móvil de los últimos 3 / 12 meses (los primeros
+                              meses promedian los que haya)
+        Si se indica 'desde' (YYYY-MM), solo devuelve los meses a partir de ese; se leen
+        además los 11 anteriores para que los promedios y la variación no cambien.
+        """
+        lectura = None
+        if desde:
+            anio, mes = map(int, desde.split("-"))
+            anio, mes = divmod(anio * 12 + mes - 1 - 11, 12)
+            lectura = f"{anio:04d}-{mes + 1:02d}-01"
+        sql = f"""
+            WITH por_metodo AS (
+                SELECT substr(fecha, 1, 7) AS mes, {METODO_LIMPIO_SQL} AS metodo, SUM(monto) AS monto
+                FROM {self._fuente_pagos(lectura)}
+                WHERE metodo != 'SALDO A FAVOR' AND fecha >= ?
+                GROUP BY 1, 2
+            ),
+            limites AS (SELECT MIN(mes) AS primero, MAX(mes) AS ultimo FROM por_metodo),
+            -- Todos los meses entre el primero y el último, aunque no haya cobros
+            calendario(mes) AS (
+                SELECT primero FROM limites WHERE primero IS NOT NULL
+                UNION ALL
+                SELECT strftime('%Y-%m', mes || '-01', '+1 month') FROM calendario, limites WHERE mes < ultimo
+            ),
+            meses AS (
+                SELECT c.mes, COALESCE(SUM(p.monto), 0) AS total
+                FROM calendario c LEFT JOIN por_metodo p ON p.mes = c.mes
+                GROUP BY c.mes
+            ),
+            tendencia AS (
+                SELECT mes, total,
+                       (total - LAG(total) OVER orden) / NULLIF(LAG(total) OVER orden, 0) AS variacion,
+                       AVG(total) OVER (orden ROWS 2 PRECEDING) AS media_3,
+                       AVG(total) OVER (orden ROWS 11 PRECEDING) AS media_12
+                FROM meses
+                WINDOW orden AS (ORDER BY mes)
+            )
+            SELECT t.mes, t.total, t.variacion, t.media_3, t.media_12, p.metodo, p.monto
+            FROM tendencia t LEFT JOIN por_metodo p ON p.mes = t.mes
+            WHERE t.mes >= ?
+            ORDER BY t.mes, p.monto DESC
+        """
+        # '' deja pasar todo (y excluye fechas NULL, como antes)
+        self.cursor.execute(sql, (lectura or "", desde or ""))
+        return self.cursor.fetchall()
+
+    def obtener_datos_pronostico(self):
+        """
+        Lectura en bloque para pronostico.py (sin caché: son todas las filas).
+        Retorna (pagos, deudas):
+          pagos:  [(cliente_id, antiguedad_dias, monto), ...] cobros reales, sin traspasos de saldo
+          deudas: [(deuda_id, cliente_id, antiguedad_dias, saldo), ...] solo las que deben algo
+        'antiguedad_dias' son los días transcurridos hasta hoy.
+        """
+        # La fecha de hoy va como parámetro: 'now' con 'localtime' se recalcularía en cada fila
+        hoy = date.today().isoformat()
+        dias = "CAST(julianday(:hoy) - julianday(substr({col}, 1, 10)) AS INTEGER)"
+        partes = ["""
+            SELECT d.cliente_id, {dias}, p.monto
+            FROM pagos_detalle p JOIN deudas d ON d.id = p.deuda_id
+            WHERE p.metodo != 'SALDO A FAVOR' AND p.monto > 0 AND p.fecha IS NOT NULL
+        """]
+        if self.archivo_hasta:
+            partes.append("""
+                SELECT d.cliente_id, {dias}, p.monto
+                FROM archivo.pagos_detalle p JOIN archivo.deudas d ON d.id = p.deuda_id
+                WHERE p.metodo != 'SALDO A FAVOR' AND p.monto > 0 AND p.fecha IS NOT NULL
+            """)
+        sql = " UNION ALL ".join(partes).format(dias=dias.format(col="p.fecha"))
+        self.cursor.execute(sql, {'hoy': hoy})
+        pagos = self.cursor.fetchall()
+
+        self.cursor.execute(f"""
+            SELECT id, cliente_id, COALESCE({dias.format(col="fecha_creacion")}, 0), monto_total - monto_pagado
+            FROM deudas
+            WHERE monto_total - monto_pagado > 0.009
+        """, {'hoy': hoy})
+        deudas = self.cursor.fetchall()
+        return pagos, deudas
+
+    def obtener_datos_instantanea(self):
+        """
+        Lectura en bloque para instantanea.py (sin caché). Clientes, deudas y pagos,
+        con lo archivado, en el orden de columnas de instantanea.TABLAS.
+        Las fechas vienen en minutos desde 1970 (None si faltan o no son válidas).
+        Todo se lee en una misma transacción: las tablas son de la misma foto.
+        Retorna (version, {tabla: filas}); 'version' es el contador global de cambios.
+        """
+        minutos = "CAST(ROUND((julianday({col}) - 2440587.5) * 1440) AS INTEGER)"
+        deudas = (f"SELECT id, cliente_id, monto_total, monto_pagado, descripcion, estado, "
+                  f"{minutos.format(col='fecha_creacion')}, {minutos.format(col='fecha_pago')}, metodo_pago, "
+                  "{archivada} FROM {esquema}deudas")
+        pagos = (f"SELECT p.id, p.deuda_id, d.cliente_id, p.monto, {minutos.format(col='p.fecha')}, p.metodo, "
+                 "{archivada} FROM {esquema}pagos_detalle p LEFT JOIN {esquema}deudas d ON d.id = p.deuda_id")
+        esquemas = [("", 0)] + ([("archivo.", 1)] if self.archivo_hasta else [])
+        consultas = {
+            'clientes': "SELECT id, dni, nombre, telefono, localidad FROM clientes ORDER BY id",
+            'deudas': " UNION ALL ".join(deudas.format(esquema=e, archivada=a) for e, a in esquemas) + " ORDER BY 1",
+            'pagos_detalle': " UNION ALL ".join(pagos.format(esquema=e, archivada=a) for e, a in esquemas) + " ORDER BY 1",
+        }
+
+        propia = self.nivel_transaccion == 0 and not self.conn.in_transaction
+        if propia:
+            # Transacción de solo lectura: en modo WAL no frena a nadie; sin WAL,
+            # las escrituras de otros procesos esperan lo que dura la lectura.
+            self.cursor.execute("BEGIN")
+        try:
+            self.cursor.execute("SELECT version FROM versiones_tabla WHERE tabla = '*'")
+            version = self.cursor.fetchone()[0]
+            datos = {}
+            for tabla, sql in consultas.items():
+                self.cursor.execute(sql)
+                datos[tabla] = self.cursor.fetchall()
+        finally:
+            if propia:
+                self.conn.rollback()
+        return version, datos
+
+    # ==========================================
+    # ARCHIVO HISTÓRICO (DEUDAS SALDADAS)
+    # ==========================================
+    def adjuntar_archivo(self):
+        """
+        Adjunta la base de archivo (mismo esquema que deudas / pagos_detalle).
+        Ahí se mueven las deudas viejas ya saldadas para que las tablas
+        principales se mantengan chicas.
+        """
+        self.archivo_name = ruta_archivo(self.db_name)
+        self.cursor.execute("ATTACH DATABASE ? AS archivo", (self.archivo_name,))
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS archivo.deudas (
+                id INTEGER PRIMARY KEY,
+                cliente_id INTEGER,
+                monto_total REAL NOT NULL,
+                monto_pagado REAL DEFAULT 0,
+                descripcion TEXT,
+                estado TEXT,
+                fecha_creacion TEXT,
+                fecha_pago TEXT,
+                metodo_pago TEXT,
+                uuid TEXT
+            )
+        """)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS archivo.pagos_detalle (
+                id INTEGER PRIMARY KEY,
+                deuda_id INTEGER,
+                monto REAL,
+                fecha TEXT,
+                metodo TEXT,
+                uuid TEXT
+            )
+        """)
+        # El uuid de replicación viaja al archivo: así un cambio de la otra PC
+        # encuentra la fila archivada en vez de darla de alta otra vez.
+        # Las filas archivadas por una versión anterior quedan sin uuid.
+        for tabla in ('deudas', 'pagos_detalle'):
+            self.cursor.execute(f"PRAGMA archivo.table_info({tabla})")
+            if 'uuid' not in [c[1] for c in self.cursor.fetchall()]:
+                self.cursor.execute(f"ALTER TABLE archivo.{tabla} ADD COLUMN uuid TEXT")
+            self.cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS archivo.idx_arch_{tabla}_uuid ON {tabla}(uuid)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS archivo.idx_arch_deudas_cliente ON deudas(cliente_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS archivo.idx_arch_pagos_deuda ON pagos_detalle(deuda_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS archivo.idx_arch_pagos_deuda_fecha ON pagos_detalle(deuda_id, fecha)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS archivo.idx_arch_pagos_fecha ON pagos_detalle(fecha, metodo, monto)")
+        # Guardamos la fecha más nueva archivada: si una consulta no llega
+        # hasta esa fecha, no hace falta tocar el archivo.
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS archivo.meta (clave TEXT PRIMARY KEY, valor TEXT)")
+        self.conn.commit()
+
+        self.cursor.execute("SELECT valor FROM archivo.meta WHERE clave = 'archivo_hasta'")
+        row = self.cursor.fetchone()
+        self.archivo_hasta = row[0] if row else None
+
+        # Archivo de una versión sin perfil_archivado: se arma una vez
+        self.cursor.execute("""
+            SELECT EXISTS (SELECT 1 FROM archivo.deudas WHERE cliente_id IS NOT NULL)
+               AND NOT EXISTS (SELECT 1 FROM perfil_archivado)
+        """)
+        if self.cursor.fetchone()[0]:
+            self.recalcular_perfil_archivado()
+            self.conn.commit()
+
+    def _fuente_pagos(self, desde=None):
+        """
+        Retorna la tabla (o subconsulta) de pagos a usar en un FROM.
+        Solo une el archivo si la consulta pide fechas que pueden estar archivadas.
+        """
+        if self.archivo_hasta and (desde is None or desde <= self.archivo_hasta):
+            return ("(SELECT id, deuda_id, monto, fecha, metodo FROM pagos_detalle "
+                    "UNION ALL SELECT id, deuda_id, monto, fecha, metodo FROM archivo.pagos_detalle)")
+        return "pagos_detalle"
+
+    @invalida_cache
+    @reintenta_si_bloqueada
+    def archivar_deudas_saldadas(self, dias_antiguedad=365):
+        """
+        Mueve al archivo las deudas PAGADAS sin saldo a favor (pagado == total)
+        cuya última actividad sea más vieja que 'dias_antiguedad', junto con sus pagos.
+        Como esas deudas suman 0 al saldo, los totales de cada cliente no cambian.
+        Retorna la cantidad de deudas archivadas.
+        """
+        limite = (datetime.now() - timedelta(days=dias_antiguedad)).strftime("%Y-%m-%d %H:%M")
+        with self.transaccion():
+            # Archivar no es un borrado real: no debe replicarse a la otra PC
+            pausar_captura(self.cursor)
+            self.cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS a_archivar (id INTEGER PRIMARY KEY)
+            """)
+            self.cursor.execute("DELETE FROM a_archivar")
+            self.cursor.execute("""
+                INSERT INTO a_archivar (id)
+                SELECT id FROM deudas
+                WHERE estado = 'PAGADA'
+                  AND round(monto_pagado, 2) = round(monto_total, 2)
+                  AND COALESCE(fecha_pago, fecha_creacion) < ?
+                  AND fecha_creacion < ?
+            """, (limite, limite))
+
+            self.cursor.execute(f"""
+                INSERT INTO archivo.deudas ({COLUMNAS_DEUDAS}, uuid)
+                SELECT {COLUMNAS_DEUDAS}, uuid FROM deudas WHERE id IN (SELECT id FROM a_archivar)
+            """)
+            cantidad = self.cursor.rowcount
+            self.cursor.execute("SELECT DISTINCT cliente_id FROM deudas WHERE id IN (SELECT id FROM a_archivar)")
+            clientes = [r[0] for r in self.cursor.fetchall()]
+            self.cursor.execute("""
+                INSERT INTO archivo.pagos_detalle (id, deuda_id, monto, fecha, metodo, uuid)
+                SELECT id, deuda_id, monto, fecha, metodo, uuid FROM pagos_detalle
+                WHERE deuda_id IN (SELECT id FROM a_archivar)
+            """)
+            self.cursor.execute("DELETE FROM pagos_detalle WHERE deuda_id IN (SELECT id FROM a_archivar)")
+            self.cursor.execute("DELETE FROM deudas WHERE id IN (SELECT id FROM a_archivar)")
+            # Su historia de pago sigue contando en el resumen del cliente
+            self.recalcular_perfil_archivado(clientes)
+
+            self.cursor.execute("""
+                SELECT MAX(f) FROM (
+                    SELECT MAX(fecha) AS f FROM archivo.pagos_detalle
+                    UNION ALL SELECT MAX(COALESCE(fecha_pago, fecha_creacion)) FROM archivo.deudas
+                )
+            """)
+            hasta = self.cursor.fetchone()[0]
+            if hasta:
+                self.cursor.execute("INSERT OR REPLACE INTO archivo.meta (clave, valor) VALUES ('archivo_hasta', ?)", (hasta,))
+            pausar_captura(self.cursor, False)
+
+        self.archivo_hasta = hasta
+        return cantidad
+
+    # ==========================================
+    # RECARGO MENSUAL MASIVO (DEUDAS ATRASADAS)
+    # ==========================================
+    SQL_RECARGO = """
+        SELECT d.id, c.nombre, d.descripcion, d.fecha_creacion,
+               CAST(julianday(?) - julianday(d.fecha_creacion) AS INTEGER) AS dias,
+               (d.monto_total - d.monto_pagado) AS resta,
+               round(MIN((d.monto_total - d.monto_pagado) * ? / 100.0, ?), 2) AS recargo
+        FROM deudas d
+        JOIN clientes c ON c.id = d.cliente_id
+        WHERE (d.monto_total - d.monto_pagado) > 0.01
+          AND julianday(?) - julianday(d.fecha_creacion) >= ?
+          -- Una vez por mes: lo ya recargado en el mes en curso no se vuelve a recargar
+          AND NOT EXISTS (SELECT 1 FROM recargos r WHERE r.deuda_id = d.id AND r.fecha >= ?)
+    """
+
+    def _params_recargo(self, porcentaje, dias_minimos, tope):
+        ahora = datetime.now().strftime("%Y-%m-%d %H:%M")
+        inicio_mes = ahora[:8] + "01"
+        # Sin tope usamos un número enorme para no duplicar la consulta (tope 0 es un tope)
+        return (ahora, porcentaje, tope if tope is not None else 1e18, ahora, dias_minimos, inicio_mes)
+
+    def previsualizar_recargo(self, porcentaje, dias_minimos=30, tope=None):
+        """
+        Retorna (filas, cantidad, total) sin modificar nada.
+        filas: [(deuda_id, cliente, descripcion, fecha_creacion, dias, resta, recargo), ...]
+        El total y la cantidad salen de la misma consulta (funciones de ventana).
+        """
+        sql = f"""
+            SELECT *, COUNT(*) OVER (), SUM(recargo) OVER ()
+            FROM ({self.SQL_RECARGO})
+            WHERE recargo > 0
+            ORDER BY dias DESC
+        """
+        self.cursor.execute(sql, self._params_recargo(porcentaje, dias_minimos, tope))
+        filas = self.cursor.fetchall()
+        if not filas:
+            return [], 0, 0.0
+        return [f[:7] for f in filas], filas[0][7], filas[0][8]
+
+    @invalida_cache
+    @reintenta_si_bloqueada
+    def aplicar_recargo_masivo(self, porcentaje, dias_minimos=30, tope=None):
+        """
+        Aplica el recargo a todas las deudas atrasadas en una sola transacción.
+        Deja un registro por deuda en 'recargos' (mismo 'lote' para toda la corrida).
+        Retorna (cantidad, total).
+        """
+        lote = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        ahora = datetime.now().strftime("%Y-%m-%d %H:%M")
+        with self.transaccion():
+            self.cursor.execute(f"""
+                INSERT INTO recargos (deuda_id, lote, porcentaje, base, monto, fecha)
+                SELECT id, ?, ?, resta, recargo, ? FROM ({self.SQL_RECARGO}) WHERE recargo > 0
+            """, (lote, porcentaje, ahora) + self._params_recargo(porcentaje, dias_minimos, tope))
+
+            self.cursor.execute("""
+                UPDATE deudas
+                SET monto_total = monto_total + (SELECT r.monto FROM recargos r WHERE r.lote = ? AND r.deuda_id = deudas.id)
+                WHERE id IN (SELECT deuda_id FROM recargos WHERE lote = ?)
+            """, (lote, lote))
+
+            self.cursor.execute("SELECT COUNT(*), COALESCE(SUM(monto), 0) FROM recargos WHERE lote = ?", (lote,))
+            cantidad, total = self.cursor.fetchone()
+        return cantidad, total
+
+    # ==========================================
+    # VERIFICACIÓN Y REPARACIÓN DEL LIBRO
+    # ==========================================
+    # Estado que debería tener cada deuda según lo pagado (misma regla que registrar_pago).
+    # {t} es el prefijo de la tabla: "d." en las consultas con alias, "" en los UPDATE.
+    SQL_ESTADO_ESPERADO = """
+        CASE WHEN round({t}monto_pagado, 2) >= round({t}monto_total, 2) THEN 'PAGADA'
+             WHEN {t}monto_pagado > 0 THEN 'PARCIAL'
+             ELSE 'PENDIENTE' END
+    """
+    # Pagos agrupados por deuda y por cliente. 'SALDO A FAVOR' son traspasos:
+    # suman en la deuda destino sin dejar registro en la de origen.
+    SQL_CTE_LIBRO = """
+        WITH p AS (
+            SELECT deuda_id, SUM(monto) AS pagos, COUNT(*) AS cantidad,
+                   SUM(CASE WHEN metodo = 'SALDO A FAVOR' THEN monto ELSE 0 END) AS traspasos
+            FROM pagos_detalle GROUP BY deuda_id
+        ),
+        c AS (
+            SELECT d.cliente_id, SUM(d.monto_pagado) AS pagado,
+                   SUM(COALESCE(p.pagos - p.traspasos, 0)) AS pagos_reales,
+                   SUM(COALESCE(p.traspasos, 0)) AS traspasos
+            FROM deudas d LEFT JOIN p ON p.deuda_id = d.id
+            GROUP BY d.cliente_id
+        )
+    """
+
+    def verificar_libro(self):
+        """
+        Recorre toda la base con consultas agrupadas y va devolviendo (generador)
+        las discrepancias como tuplas (tipo, id, detalle). Tipos:
+          ESTADO             el estado no corresponde a lo pagado (reparable)
+          PAGADO_DESFASADO   monto_pagado != suma de pagos, cliente sin traspasos (reparable)
+          PAGADO_SIN_RESPALDO monto_pagado mayor a los pagos registrados
+          CLIENTE_DESCUADRE  lo pagado por el cliente no coincide con sus pagos reales
+          PAGO_HUERFANO      pago de una deuda que no existe
+          DEUDA_SIN_CLIENTE  deuda de un cliente que no existe
+          MONTO_NEGATIVO     total o pagado negativo
+        """
+        # Cursor propio: el generador no debe pisar self.cursor mientras se itera
+        cur = self.conn.cursor()
+        esperado = self.SQL_ESTADO_ESPERADO.format(t="d.")
+        consultas = [
+            (f"""
+                SELECT 'ESTADO', d.id, d.estado || ' -> ' || {esperado}
+                FROM deudas d
+                WHERE d.estado IS NOT {esperado}
+            """),
+            (f"""
+                {self.SQL_CTE_LIBRO}
+                SELECT 'PAGADO_DESFASADO', d.id,
+                       printf('pagado %.2f / pagos %.2f', d.monto_pagado, p.pagos)
+                FROM deudas d JOIN p ON p.deuda_id = d.id JOIN c ON c.cliente_id = d.cliente_id
+                WHERE c.traspasos = 0 AND abs(d.monto_pagado - p.pagos) > 0.01
+            """),
+            (f"""
+                {self.SQL_CTE_LIBRO}
+                SELECT 'PAGADO_SIN_RESPALDO', d.id,
+                       printf('pagado %.2f / pagos %.2f', d.monto_pagado, COALESCE(p.pagos, 0))
+                FROM deudas d LEFT JOIN p ON p.deuda_id = d.id JOIN c ON c.cliente_id = d.cliente_id
+                WHERE d.monto_pagado > COALESCE(p.pagos, 0) + 0.01
+                  AND NOT (c.traspasos = 0 AND p.deuda_id IS NOT NULL)
+            """),
+            (f"""
+                {self.SQL_CTE_LIBRO}
+                SELECT 'CLIENTE_DESCUADRE', c.cliente_id,
+                       printf('pagado %.2f / pagos reales %.2f', c.pagado, c.pagos_reales)
+                FROM c
+                WHERE c.traspasos > 0 AND abs(c.pagado - c.pagos_reales) > 0.01
+            """),
+            ("""
+                SELECT 'PAGO_HUERFANO', pd.id, printf('deuda %d, $%.2f', pd.deuda_id, pd.monto)
+                FROM pagos_detalle pd LEFT JOIN deudas d ON d.id = pd.deuda_id
+                WHERE d.id IS NULL
+            """),
+            ("""
+                SELECT 'DEUDA_SIN_CLIENTE', d.id, printf('cliente %d', d.cliente_id)
+                FROM deudas d LEFT JOIN clientes c ON c.id = d.cliente_id
+                WHERE c.id IS NULL
+            """),
+            ("""
+                SELECT 'MONTO_NEGATIVO', id, printf('total %.2f / pagado %.2f', monto_total, monto_pagado)
+                FROM deudas WHERE monto_total < 0 OR monto_pagado < -0.01
+            """),
+        ]
+        for sql in consultas:
+            cur.execute(sql)
+            yield from cur
+
+    @invalida_cache
+    @reintenta_si_bloqueada
+    def reparar_libro(self):
+        """
+        Corrige en una sola transacción lo que se puede deducir sin ambigüedad:
+        1) monto_pagado = suma de pagos, en deudas de clientes sin traspasos de saldo.
+        2) estado recalculado según lo pagado.
+        Retorna (pagados_corregidos, estados_corregidos).
+        """
+        with self.transaccion():
+            # El UPDATE va primero (sin WITH adelante) para que sqlite3 abra la transacción
+            self.cursor.execute(f"""
+                UPDATE deudas
+                SET monto_pagado = (SELECT SUM(monto) FROM pagos_detalle WHERE deuda_id = deudas.id)
+                WHERE id IN (
+                    {self.SQL_CTE_LIBRO}
+                    SELECT d.id FROM deudas d JOIN p ON p.deuda_id = d.id JOIN c ON c.cliente_id = d.cliente_id
+                    WHERE c.traspasos = 0 AND abs(d.monto_pagado - p.pagos) > 0.01
+                )
+            """)
+            pagados = self.cursor.rowcount
+            esperado = self.SQL_ESTADO_ESPERADO.format(t="")
+            self.cursor.execute(f"""
+                UPDATE deudas SET estado = {esperado}
+                WHERE estado IS NOT {esperado}
+            """)
+            estados = self.cursor.rowcount
+            # Los triggers ya lo mantienen; se recalcula por si la base se editó sin ellos
+            self.recalcular_perfil_archivado()
+        return pagados, estados
+
+    # ==========================================
+    # MANTENIMIENTO EN TIEMPOS MUERTOS
+    # ==========================================
+    # Solo pasos cortos: el VACUUM completo y el ANALYZE total quedan para mantenimiento.py
+    TAREAS_MANTENIMIENTO = ['optimize', 'incremental_vacuum', 'checkpoint']
+
+    def crear_tabla_mantenimiento(self):
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS mantenimiento_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fecha TEXT,
+                tarea TEXT,
+                duracion_ms REAL,
+                detalle TEXT
+            )
+        """)
+        self.conn.commit()
+
+    def ejecutar_mantenimiento(self, tarea, paginas_por_paso=200):
+        """
+        Ejecuta un paso corto de la tarea indicada y lo registra en mantenimiento_log.
+        Retorna True si la tarea quedó terminada o False si necesita más pasos.
+        """
+        inicio = time.perf_counter()
+        try:
+            terminada, detalle = self._paso_mantenimiento(tarea, paginas_por_paso)
+        except sqlite3.Error as e:
+            # Se deja constancia del fallo y de cuánto tardó antes de propagarlo
+            self.conn.rollback()
+            try:
+                self.registrar_mantenimiento(tarea, (time.perf_counter() - inicio) * 1000, f"error: {e}")
+            except sqlite3.Error:
+                pass  # Base bloqueada también para el log: queda el error original
+            raise
+        self.registrar_mantenimiento(tarea, (time.perf_counter() - inicio) * 1000, detalle)
+        return terminada
+
+    def _paso_mantenimiento(self, tarea, paginas_por_paso):
+        """Hace el trabajo de ejecutar_mantenimiento. Retorna (terminada, detalle)."""
+        terminada = True
+        detalle = ""
+
+        if tarea == 'optimize':
+            # analysis_limit acota el ANALYZE que optimize decida hacer
+            self.cursor.execute("PRAGMA analysis_limit = 400")
+            self.cursor.execute("PRAGMA optimize")
+        elif tarea == 'incremental_vacuum':
+            self.cursor.execute("PRAGMA main.auto_vacuum")
+            modo = self.cursor.fetchone()[0]
+            self.cursor.execute("PRAGMA main.freelist_count")
+            libres = self.cursor.fetchone()[0]
+            if modo != 2:
+                detalle = f"sin auto_vacuum incremental ({libres} páginas libres, ver mantenimiento.py)"
+            elif libres:
+                # incremental_vacuum solo libera páginas si se leen sus filas
+                self.cursor.execute(f"PRAGMA main.incremental_vacuum({int(paginas_por_paso)})")
+                self.cursor.fetchall()
+                self.cursor.execute("PRAGMA main.freelist_count")
+                restantes = self.cursor.fetchone()[0]
+                terminada = restantes == 0
+                detalle = f"{libres - restantes} páginas liberadas, quedan {restantes}"
+        elif tarea == 'checkpoint':
+            # Con la base de archivo adjunta hay que nombrar 'main' en los PRAGMA
+            self.cursor.execute("PRAGMA main.journal_mode")
+            if self.cursor.fetchone()[0] == 'wal':
+                self.cursor.execute("PRAGMA main.wal_checkpoint(PASSIVE)")
+                ocupado, log, copiadas = self.cursor.fetchone()
+                terminada = log == copiadas
+                detalle = f"{copiadas}/{log} páginas del WAL copiadas"
+            else:
+                detalle = "sin WAL"
+        else:
+            raise ValueError(f"Tarea de mantenimiento desconocida: {tarea}")
+        return terminada, detalle
+
+    def registrar_mantenimiento(self, tarea, duracion_ms, detalle):
+        self.cursor.execute("INSERT INTO mantenimiento_log (fecha, tarea, duracion_ms, detalle) VALUES (?, ?, ?, ?)",
+                            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), tarea, round(duracion_ms, 1), detalle))
+        self.conn.commit()
+
+    def convertir_auto_vacuum_incremental(self):
+        """
+        Pasa la base principal a auto_vacuum incremental. Reescribe el archivo entero
+        con VACUUM y toma la base en exclusiva mientras tanto: solo para una ventana
+        de mantenimiento (mantenimiento.py), nunca desde la interfaz.
+        Retorna las páginas que tenía la base, o 0 si ya estaba convertida.
+        """
+        self.cursor.execute("PRAGMA main.auto_vacuum")
+        if self.cursor.fetchone()[0] == 2:
+            return 0
+        inicio = time.perf_counter()
+        self.cursor.execute("PRAGMA main.page_count")
+        paginas = self.cursor.fetchone()[0]
+        self.cursor.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+        self.cursor.execute("VACUUM main")
+        self.registrar_mantenimiento('convertir_vacuum', (time.perf_counter() - inicio) * 1000,
+                                     f"convertida a auto_vacuum incremental ({paginas} páginas)")
+        return paginas
+
+    def analizar_completo(self):
+        """ANALYZE sin límite de filas (estadísticas exactas). Para la ventana de mantenimiento."""
+        inicio = time.perf_counter()
+        self.cursor.execute("PRAGMA analysis_limit = 0")
+        self.cursor.execute("ANALYZE main")
+        self.registrar_mantenimiento('analyze', (time.perf_counter() - inicio) * 1000, "completo")
+
+    def obtener_log_mantenimiento(self, limit=50):
+        self.cursor.execute("""
+            SELECT fecha, tarea, duracion_ms, detalle FROM mantenimiento_log
+            ORDER BY id DESC LIMIT ?
+        """, (limit,))
         return self.cursor.fetchall()
 
+# ==========================================
+# TENDENCIA MENSUAL (SERIES PARA EL GRÁFICO)
+# ==========================================
+MAX_METODOS_GRAFICO = 5  # El resto de los métodos se apila como "Otros"
+
+
+def agrupar_tendencia(filas):
+    """
+    Convierte las filas de obtener_tendencia_mensual en una serie por mes:
+    ([(mes, total, variacion, media_3, media_12, {metodo: monto}), ...], metodos)
+    'metodos' son los de mayor recaudación total (más "Otros" si hace falta).
+    """
+    meses = []
+    totales_metodo = {}
+    for mes, total, variacion, media_3, media_12, metodo, monto in filas:
+        if not meses or meses[-1][0] != mes:
+            meses.append((mes, total, variacion, media_3, media_12, {}))
+        if metodo is not None:
+            meses[-1][5][metodo] = monto
+            totales_metodo[metodo] = totales_metodo.get(metodo, 0.0) + monto
+
+    metodos = sorted(totales_metodo, key=totales_metodo.get, reverse=True)
+    if len(metodos) > MAX_METODOS_GRAFICO:
+        principales = set(metodos[:MAX_METODOS_GRAFICO - 1])
+        for *_, por_metodo in meses:
+            otros = sum(m for k, m in por_metodo.items() if k not in principales)
+            for k in [k for k in por_metodo if k not in principales]:
+                del por_metodo[k]
+            if otros:
+                por_metodo["Otros"] = otros
+        metodos = metodos[:MAX_METODOS_GRAFICO - 1] + ["Otros"]
+    return meses, metodos
+
+
+def reducir_tendencia(meses, maximo_puntos):
+    """
+    Si hay más meses que puntos dibujables, junta meses consecutivos en un punto
+    con su promedio mensual (así la escala no cambia). Retorna (puntos, meses_por_punto).
+    """
+    por_punto = max(1, -(-len(meses) // max(maximo_puntos, 1)))
+    if por_punto == 1:
+        return meses, 1
+    puntos = []
+    for i in range(0, len(meses), por_punto):
+        grupo = meses[i:i + por_punto]
+        n = len(grupo)
+        por_metodo = {}
+        for *_, pm in grupo:
+            for k, m in pm.items():
+                por_metodo[k] = por_metodo.get(k, 0.0) + m / n
+        puntos.append((grupo[0][0], sum(g[1] for g in grupo) / n, None,
+                       sum(g[3] for g in grupo) / n, sum(g[4] for g in grupo) / n, por_metodo))
+    return puntos, por_punto
+
+
 # ==========================================
 # PARTE 2: INTERFAZ GRÁFICA MEJORADA
 # ==========================================
+class GestorDialogos:
+    """
+    Arma cada ventana una sola vez y después la oculta y la vuelve a mostrar
+    con datos nuevos, en lugar de crear un Toplevel nuevo en cada clic.
+    Cada tipo se registra con:
+      constructor(top) -> dict de widgets a actualizar
+      cargador(widgets, *args) -> llena los widgets con datos frescos
+    'maximo' limita cuántas ventanas de ese tipo pueden existir a la vez;
+    al llegar al límite se reutiliza la usada hace más tiempo.
+    """
+    def __init__(self, raiz):
+        self.raiz = raiz
+        self.tipos = {}
+        self.ventanas = OrderedDict()  # (tipo, clave) -> widgets, de la menos a la más usada
+
+    def registrar(self, tipo, constructor, cargador, maximo=1):
+        self.tipos[tipo] = (constructor, cargador, maximo)
+
+    def construir(self, tipo, clave=None):
+        constructor = self.tipos[tipo][0]
+        top = tk.Toplevel(self.raiz)
+        top.withdraw()
+        widgets = constructor(top) or {}
+        widgets['top'] = top
+        # La X de la ventana la oculta en lugar de destruirla
+        top.protocol("WM_DELETE_WINDOW", lambda: self.cerrar(top))
+        self.ventanas[(tipo, clave)] = widgets
+        return widgets
+
+    def abrir(self, tipo, *args, clave=None):
+        _, cargador, maximo = self.tipos[tipo]
+        llave = (tipo, clave)
+        if llave in self.ventanas:
+            widgets = self.ventanas[llave]
+        else:
+            del_tipo = [k for k in self.ventanas if k[0] == tipo]
+            if len(del_tipo) >= maximo:
+                # Reutilizamos la ventana de este tipo usada hace más tiempo
+                widgets = self.ventanas.pop(del_tipo[0])
+                self.ventanas[llave] = widgets
+            else:
+                widgets = self.construir(tipo, clave)
+        self.ventanas.move_to_end(llave)
+
+        cargador(widgets, *args)
+        top = widgets['top']
+        top.deiconify()
+        top.lift()
+        top.focus_force()
+        return widgets
+
+    def precargar(self, *tipos):
+        """Construye (ocultas) las ventanas indicadas para que abran al instante."""
+        for tipo in tipos:
+            if not any(k[0] == tipo for k in self.ventanas):
+                self.construir(tipo)
+
+    def cerrar(self, top):
+        top.withdraw()
+
+
 class Aplicacion(tk.Tk):
-    def __init__(self):
+    MAX_VENTANAS_PAGOS = 3  # Ventanas de "Historial de Pagos" abiertas a la vez
+
+    def __init__(self, db=None):
         super().__init__()
-        self.db = BaseDeDatos()
+        # 'db' puede ser una BaseDeDatosRemota (modo servidor, ver servidor.py)
+        self.db = db if db is not None else BaseDeDatos()
         self.title("Gestión de Repuestos - Sistema Profesional")
         self.geometry("1350x780")
         self.configure(bg=COLORS['light'])
@@ -410,6 +1957,112 @@ class Aplicacion(tk.Tk):
         
         self.cargar_lista_clientes()
 
+        # Ventanas reutilizables: se arman una vez y después solo se ocultan/muestran
+        self.dialogos = GestorDialogos(self)
+        self.dialogos.registrar('pago', self.construir_dialogo_pago, self.cargar_dialogo_pago)
+        self.dialogos.registrar('estadisticas', self.construir_dialogo_estadisticas, self.cargar_dialogo_estadisticas)
+        self.dialogos.registrar('historial_mensual', self.construir_dialogo_historial_mensual, self.cargar_dialogo_historial_mensual)
+        self.dialogos.registrar('nuevo_cliente', self.construir_dialogo_nuevo_cliente, self.cargar_dialogo_nuevo_cliente)
+        self.dialogos.registrar('pagos', self.construir_dialogo_pagos, self.cargar_dialogo_pagos,
+                                maximo=self.MAX_VENTANAS_PAGOS)
+        self.dialogos.registrar('pronostico', self.construir_dialogo_pronostico, self.cargar_dialogo_pronostico)
+        self.dialogos.registrar('duplicados', self.construir_dialogo_duplicados, self.cargar_dialogo_duplicados)
+        self.dialogos.registrar('pagos_cliente', self.construir_dialogo_pagos_cliente, self.cargar_dialogo_pagos_cliente)
+        self.dialogos.registrar('cierre_caja', self.construir_dialogo_cierre_caja, self.cargar_dialogo_cierre_caja)
+        self.dialogos.registrar('cobranza', self.construir_dialogo_cobranza, self.cargar_dialogo_cobranza)
+        self.dialogos.registrar('recargo_masivo', self.construir_dialogo_recargo_masivo, self.cargar_dialogo_recargo_masivo)
+        self.dialogos.registrar('carga_multiple', self.construir_dialogo_carga_multiple, self.cargar_dialogo_carga_multiple)
+        self.dialogos.registrar('pago_multiple', self.construir_dialogo_pago_multiple, self.cargar_dialogo_pago_multiple)
+        # Las más usadas se arman apenas la aplicación queda libre
+        self.after_idle(self.dialogos.precargar, 'pago', 'nuevo_cliente', 'estadisticas')
+
+        if isinstance(self.db, BaseDeDatos):
+            self.iniciar_vigilancia()
+
+        # Mantenimiento de la base cuando nadie usa la aplicación
+        if isinstance(self.db, BaseDeDatos):
+            self.iniciar_mantenimiento()
+
+        # Respaldo automático en segundo plano (no bloquea la interfaz).
+        # Con una base remota, los respaldos los hace la PC que corre el servidor.
+        if isinstance(self.db, BaseDeDatos):
+            self.respaldos = GestorRespaldos(self.db.db_name)
+            self.after(60 * 1000, self.programar_respaldo)
+
+    # --- MANTENIMIENTO EN TIEMPOS MUERTOS ---
+    INACTIVIDAD_MANTENIMIENTO_S = 60          # Segundos sin tocar nada para considerar "en reposo"
+    INTERVALO_MANTENIMIENTO_MS = 5000         # Un paso corto cada 5 segundos
+    CICLO_MANTENIMIENTO_S = 6 * 60 * 60       # Un ciclo completo cada 6 horas
+    FALLOS_MANTENIMIENTO = 3                  # Fallos seguidos antes de dejar la tarea para el próximo ciclo
+
+    def iniciar_mantenimiento(self):
+        self.ultima_actividad = time.monotonic()
+        self.mant_pendientes = list(BaseDeDatos.TAREAS_MANTENIMIENTO)
+        self.mant_ultimo_ciclo = time.monotonic()
+        self.mant_fallos = 0
+        for evento in ("<Any-KeyPress>", "<Any-ButtonPress>", "<Motion>"):
+            self.bind_all(evento, self.registrar_actividad, add="+")
+        self.after(self.INTERVALO_MANTENIMIENTO_MS, self.paso_mantenimiento)
+
+    def registrar_actividad(self, event=None):
+        self.ultima_actividad = time.monotonic()
+
+    def paso_mantenimiento(self):
+        demora = self.INTERVALO_MANTENIMIENTO_MS
+        try:
+            if not self.mant_pendientes and time.monotonic() - self.mant_ultimo_ciclo > self.CICLO_MANTENIMIENTO_S:
+                self.mant_pendientes = list(BaseDeDatos.TAREAS_MANTENIMIENTO)
+            en_reposo = time.monotonic() - self.ultima_actividad >= self.INACTIVIDAD_MANTENIMIENTO_S
+            if self.mant_pendientes and en_reposo:
+                tarea = self.mant_pendientes[0]
+                try:
+                    terminada = self.db.ejecutar_mantenimiento(tarea)
+                    self.mant_fallos = 0
+                except sqlite3.Error:
+                    # El error ya quedó en mantenimiento_log. Se espera cada vez más
+                    # (20 s, 80 s) y tras varios fallos la tarea queda para el próximo ciclo.
+                    self.mant_fallos += 1
+                    terminada = self.mant_fallos >= self.FALLOS_MANTENIMIENTO
+                    if terminada:
+                        self.mant_fallos = 0
+                    else:
+                        demora = self.INTERVALO_MANTENIMIENTO_MS * 4 ** self.mant_fallos
+                if terminada:
+                    self.mant_pendientes.pop(0)
+                    if not self.mant_pendientes:
+                        self.mant_ultimo_ciclo = time.monotonic()
+        finally:
+            self.after(demora, self.paso_mantenimiento)
+
+    # --- ERRORES DE LA BASE EN LAS ACCIONES ---
+    def report_callback_exception(self, exc, val, tb):
+        """Tk llama a esto cuando falla un botón o evento: la base ocupada se informa como tal."""
+        if isinstance(val, (sqlite3.Error, RuntimeError)) and es_bloqueo(val):
+            messagebox.showerror("Base ocupada",
+                                 "Otra ventana o PC está usando la base de datos y no se liberó a tiempo.\n"
+                                 "No se guardó nada: intente de nuevo en unos segundos.")
+        elif isinstance(val, sqlite3.Error):
+            messagebox.showerror("Error de base de datos", f"No se pudo completar la operación:\n{val}")
+        else:
+            super().report_callback_exception(exc, val, tb)
+
+    # --- RESPALDOS AUTOMÁTICOS ---
+    INTERVALO_RESPALDO_MS = 60 * 60 * 1000  # Cada una hora
+
+    def programar_respaldo(self):
+        if self.respaldos.crear_respaldo_en_segundo_plano():
+            self.after(500, self.vigilar_respaldo)
+        self.after(self.INTERVALO_RESPALDO_MS, self.programar_respaldo)
+
+    def vigilar_respaldo(self):
+        # Consultamos el hilo desde after() para no tocar Tk desde otro hilo
+        if self.respaldos.en_curso():
+            self.after(500, self.vigilar_respaldo)
+            return
+        resultado = self.respaldos.ultimo_resultado
+        if resultado and not resultado[0]:
+            messagebox.showwarning("Respaldo", f"No se pudo crear el respaldo automático:\n{resultado[1]}")
+
     def construir_panel_clientes(self, parent):
         tk.Label(parent, text="📂 LISTA DE CLIENTES", font=FONTS['h2'], 
                  bg=COLORS['secondary'], fg=COLORS['text_light']).pack(pady=(25, 15))
@@ -421,6 +2074,11 @@ class Aplicacion(tk.Tk):
                               command=self.modal_nuevo_cliente)
         btn_nuevo.pack(fill="x", padx=20, pady=10, ipady=10)
 
+        tk.Button(parent, text="👥 Buscar Duplicados", 
+                  bg=COLORS['secondary'], fg="#bdc3c7", 
+                  font=FONTS['small'], relief="flat", cursor="hand2",
+                  command=self.mostrar_duplicados).pack(fill="x", padx=20)
+
         frame_search = tk.Frame(parent, bg=COLORS['secondary'])
         frame_search.pack(fill="x", padx=20, pady=5)
         
@@ -430,21 +2088,34 @@ class Aplicacion(tk.Tk):
         self.entry_buscar.pack(fill="x", ipady=5) 
         self.entry_buscar.bind("<KeyRelease>", self.filtrar_clientes)
 
+        self.btn_filtros = tk.Button(frame_search, text="⚙ Filtros ▾", bg=COLORS['secondary'], fg="#bdc3c7",
+                                     font=FONTS['small'], relief="flat", cursor="hand2",
+                                     command=self.alternar_filtros_clientes)
+        self.btn_filtros.pack(anchor="e")
+        self.construir_filtros_clientes(parent)
+
         frame_tabla = tk.Frame(parent, bg=COLORS['secondary'])
         frame_tabla.pack(fill="both", expand=True, padx=20, pady=15)
+        self.frame_tabla_clientes = frame_tabla
 
         scrollbar = ttk.Scrollbar(frame_tabla)
         scrollbar.pack(side="right", fill="y")
 
+        def al_desplazar(primero, ultimo):
+            scrollbar.set(primero, ultimo)
+            # Cerca del final de lo cargado: pedimos la página siguiente
+            if float(ultimo) > 0.9:
+                self.cargar_pagina_clientes()
+
         columns = ("DNI", "Nombre", "Loc", "Saldo")
-        self.tree_clientes = ttk.Treeview(frame_tabla, columns=columns, show="headings", yscrollcommand=scrollbar.set)
+        self.tree_clientes = ttk.Treeview(frame_tabla, columns=columns, show="headings", yscrollcommand=al_desplazar)
         
         scrollbar.config(command=self.tree_clientes.yview)
 
-        self.tree_clientes.heading("DNI", text="DNI / ID")
-        self.tree_clientes.heading("Nombre", text="Nombre")
-        self.tree_clientes.heading("Loc", text="Loc")
-        self.tree_clientes.heading("Saldo", text="Total ($)")
+        # Clic en un encabezado: ordena por esa columna (otro clic invierte el sentido)
+        for col in columns:
+            self.tree_clientes.heading(col, command=lambda c=col: self.ordenar_clientes(c))
+        self.actualizar_encabezados_clientes()
         
         self.tree_clientes.column("DNI", width=70)
         self.tree_clientes.column("Nombre", width=130)
@@ -495,6 +2166,18 @@ class Aplicacion(tk.Tk):
                               command=self.mostrar_estadisticas)
         btn_stats.pack(side="right")
 
+        tk.Button(frame_top_bar, text="🧾 Pagos del Cliente", 
+                  bg=COLORS['secondary'], fg="white", 
+                  font=('Segoe UI', 10, 'bold'), relief="flat", cursor="hand2",
+                  padx=15, pady=5,
+                  command=self.ver_pagos_cliente).pack(side="right", padx=10)
+
+        tk.Button(frame_top_bar, text="🧮 Cierre de Caja", 
+                  bg=COLORS['success'], fg="white", 
+                  font=('Segoe UI', 10, 'bold'), relief="flat", cursor="hand2",
+                  padx=15, pady=5,
+                  command=lambda: self.dialogos.abrir('cierre_caja')).pack(side="right")
+
         frame_encabezado = tk.Frame(parent, bg=COLORS['light'])
         frame_encabezado.pack(side="top", pady=(5, 0), fill="x", padx=30) 
         
@@ -584,6 +2267,12 @@ class Aplicacion(tk.Tk):
                                   width=15, height=1,
                                   command=self.guardar_nueva_deuda)
         btn_add_deuda.grid(row=0, column=7, padx=10, sticky="e")
+
+        tk.Button(frame_add, text="📋 CARGA MÚLTIPLE", 
+                  bg=COLORS['primary'], fg="white", 
+                  font=FONTS['body_bold'], 
+                  cursor="hand2", relief="flat",
+                  command=self.ventana_carga_multiple).grid(row=0, column=8, sticky="e")
         
         # --- TABLA HISTORIAL ---
         frame_head = tk.Frame(parent, bg=COLORS['light'])
@@ -597,6 +2286,11 @@ class Aplicacion(tk.Tk):
         self.combo_filtro.bind("<<ComboboxSelected>>", self.aplicar_filtro)
         tk.Label(frame_head, text="Ordenar:", bg=COLORS['light'], font=FONTS['small']).pack(side="right", padx=5)
 
+        self.var_incluir_archivadas = tk.BooleanVar(value=False)
+        tk.Checkbutton(frame_head, text="Incluir archivadas", variable=self.var_incluir_archivadas,
+                       bg=COLORS['light'], font=FONTS['small'],
+                       command=lambda: self.aplicar_filtro(None)).pack(side="right", padx=10)
+
         frame_tabla_det = tk.Frame(parent, bg="white")
         frame_tabla_det.pack(side="top", fill="both", expand=True, padx=30, pady=5)
 
@@ -604,7 +2298,9 @@ class Aplicacion(tk.Tk):
         scrollbar_d.pack(side="right", fill="y")
 
         cols_d = ("Desc", "Original", "Pagado", "Resta", "Fecha Ingreso", "Ultimo Pago", "Estado", "Metodo")
-        self.tree_detalle = ttk.Treeview(frame_tabla_det, columns=cols_d, show="headings", height=45, yscrollcommand=scrollbar_d.set)
+        # selectmode extended: Ctrl/Shift + clic para marcar varias deudas (borrar o pagar en lote)
+        self.tree_detalle = ttk.Treeview(frame_tabla_det, columns=cols_d, show="headings", height=45,
+                                         selectmode="extended", yscrollcommand=scrollbar_d.set)
         scrollbar_d.config(command=self.tree_detalle.yview)
 
         headers = ["Concepto", "Original ($)", "Pagado ($)", "Debe ($)", "Fecha Creación", "Fecha Pago", "Estado", "Método"]
@@ -619,6 +2315,7 @@ class Aplicacion(tk.Tk):
         self.tree_detalle.tag_configure('PENDIENTE', background='#ffebee', foreground=COLORS['danger']) 
         self.tree_detalle.tag_configure('PARCIAL', background='#fff3e0', foreground=COLORS['text'])    
         self.tree_detalle.tag_configure('PAGADA', background='#e8f5e9', foreground=COLORS['success'])
+        self.tree_detalle.tag_configure('ARCHIVADA', foreground="gray")
         
         self.tree_detalle.pack(side="left", fill="both", expand=True)
 
@@ -629,6 +2326,7 @@ class Aplicacion(tk.Tk):
         self.tree_detalle.bind("<Button-3>", self.mostrar_menu_contextual)
         self.menu_contextual = Menu(self, tearoff=0)
         self.menu_contextual.add_command(label="Ver Historial de Pagos", command=self.ver_historial_pagos)
+        self.menu_contextual.add_command(label="Ver Todos los Pagos del Cliente", command=self.ver_pagos_cliente)
 
     def mostrar_menu_contextual(self, event):
         item = self.tree_detalle.identify_row(event.y)
@@ -637,32 +2335,374 @@ class Aplicacion(tk.Tk):
             self.menu_contextual.post(event.x_root, event.y_root)
 
     def ver_historial_pagos(self):
-        seleccion = self.tree_detalle.selection()
+        seleccion = self.tree_detalle.selection()[:1]
         if not seleccion: return
         deuda_id = self.tree_detalle.item(seleccion, "tags")[1]
         descripcion = self.tree_detalle.item(seleccion)['values'][0]
+        # Una ventana por deuda (hasta MAX_VENTANAS_PAGOS); si ya está abierta se reutiliza
+        self.dialogos.abrir('pagos', deuda_id, descripcion, clave=deuda_id)
 
-        pagos = self.db.obtener_detalles_pagos(deuda_id)
-        
-        top = tk.Toplevel(self)
-        top.title(f"Pagos: {descripcion}")
+    def construir_dialogo_pagos(self, top):
         top.geometry("450x300")
         top.configure(bg="white")
-        
-        if not pagos:
-            tk.Label(top, text="No hay pagos registrados para esta deuda.", bg="white").pack(pady=20)
-            return
+
+        lbl_vacio = tk.Label(top, text="No hay pagos registrados para esta deuda.", bg="white")
 
         cols = ("Fecha", "Monto", "Metodo")
         tree = ttk.Treeview(top, columns=cols, show="headings")
         tree.heading("Fecha", text="Fecha"); tree.column("Fecha", width=120, anchor="center")
         tree.heading("Monto", text="Monto"); tree.column("Monto", width=100, anchor="center")
         tree.heading("Metodo", text="Método"); tree.column("Metodo", width=150, anchor="center")
+        return {'lbl_vacio': lbl_vacio, 'tree': tree}
+
+    def cargar_dialogo_pagos(self, w, deuda_id, descripcion):
+        w['top'].title(f"Pagos: {descripcion}")
+        pagos = self.db.obtener_detalles_pagos(deuda_id)
+        tree = w['tree']
+        tree.delete(*tree.get_children())
+
+        if not pagos:
+            tree.pack_forget()
+            w['lbl_vacio'].pack(pady=20)
+            return
+        w['lbl_vacio'].pack_forget()
         tree.pack(fill="both", expand=True, padx=10, pady=10)
 
         for p in pagos:
             tree.insert("", "end", values=(p[0], f"${p[1]:,.2f}", p[2]))
 
+    # --- CLIENTES DUPLICADOS (ver duplicados.py) ---
+    def mostrar_duplicados(self):
+        self.dialogos.abrir('duplicados')
+
+    def construir_dialogo_duplicados(self, top):
+        top.title("Clientes Duplicados")
+        top.geometry("800x520")
+        top.configure(bg="white")
+
+        tk.Label(top, text="👥 Posibles Clientes Duplicados", font=FONTS['h2'], bg="white", fg=COLORS['primary']).pack(pady=10)
+        tk.Label(top, text="Seleccione el cliente que se conserva: las deudas de los tildados (☑) del grupo pasan a él.\n"
+                           "Destilde con un clic en la casilla (o con la barra espaciadora) a quien no sea la misma persona.",
+                 bg="white", fg="gray", font=FONTS['small']).pack()
+
+        frame_table = tk.Frame(top, bg="white", relief="solid", bd=1)
+        frame_table.pack(fill="both", expand=True, padx=20, pady=10)
+
+        cols = ("ID", "DNI", "Nombre", "Loc", "Saldo", "Similitud")
+        tree = ttk.Treeview(frame_table, columns=cols, show="tree headings", selectmode="browse")
+        tree.column("#0", width=70)
+        for col, ancho in zip(cols, (60, 100, 230, 110, 100, 80)):
+            tree.heading(col, text=col)
+            tree.column(col, width=ancho, anchor="w" if col in ("Nombre", "Loc") else "center")
+        scrollbar = ttk.Scrollbar(frame_table, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        lbl_resumen = tk.Label(top, text="", font=FONTS['body_bold'], bg="white", fg=COLORS['text'])
+        lbl_resumen.pack(pady=5)
+
+        # Clientes tildados para fusionar (iid de la fila); la casilla se dibuja en la columna del árbol
+        marcados = set()
+
+        def alternar(iid):
+            if not iid or not tree.parent(iid):
+                return
+            marcados.symmetric_difference_update({iid})
+            tree.item(iid, text="☑" if iid in marcados else "☐")
+
+        def click_casilla(event):
+            if tree.identify_region(event.x, event.y) == "tree":
+                alternar(tree.identify_row(event.y))
+
+        tree.bind("<Button-1>", click_casilla, add="+")
+        tree.bind("<space>", lambda e: [alternar(i) for i in tree.selection()])
+
+        def fusionar():
+            seleccion = tree.selection()
+            if not seleccion or not tree.parent(seleccion[0]):
+                messagebox.showinfo("Atención", "Seleccione dentro de un grupo el cliente que se conserva.", parent=top)
+                return
+            conservar = seleccion[0]
+            grupo = tree.parent(conservar)
+            otros = [int(i) for i in tree.get_children(grupo) if i != conservar and i in marcados]
+            if not otros:
+                messagebox.showinfo("Atención", "No hay otros clientes tildados en este grupo.", parent=top)
+                return
+            nombre = tree.item(conservar)['values'][2]
+            nombres = "\n".join(f"  • {tree.item(str(i))['values'][2]}" for i in otros)
+            if not messagebox.askyesno("Confirmar", f"¿Pasar las deudas de estos {len(otros)} cliente(s) a '{nombre}' "
+                                       f"y borrarlos?\n\n{nombres}", parent=top):
+                return
+            movidas = self.db.fusionar_clientes(int(conservar), otros)
+            for i in otros:
+                marcados.discard(str(i))
+                tree.delete(str(i))
+            # Si en el grupo queda solo el conservado, ya no hay nada que revisar
+            if len(tree.get_children(grupo)) < 2:
+                marcados.difference_update(tree.get_children(grupo))
+                tree.delete(grupo)
+            if self.cliente_seleccionado_id and int(self.cliente_seleccionado_id) in otros:
+                self.cliente_seleccionado_id = None
+                self.lbl_cliente_nombre.config(text="Seleccione un cliente...")
+            self.cargar_lista_clientes(self.entry_buscar.get())
+            if self.cliente_seleccionado_id:
+                self.actualizar_info_completa()
+            lbl_resumen.config(text=f"Fusionado: {movidas} deudas pasaron a '{nombre}'.")
+
+        tk.Button(top, text="FUSIONAR EN EL SELECCIONADO", command=fusionar, bg=COLORS['danger'], fg="white",
+                  font=FONTS['body_bold'], relief="flat", padx=15).pack(pady=(0, 10))
+        return {'tree': tree, 'lbl_resumen': lbl_resumen, 'marcados': marcados}
+
+    def cargar_dialogo_duplicados(self, w):
+        import duplicados
+        tree = w['tree']
+        tree.delete(*tree.get_children())
+        w['marcados'].clear()
+        grupos = duplicados.buscar_duplicados(self.db.obtener_clientes_con_saldo())
+        for n, grupo in enumerate(grupos, start=1):
+            nodo = tree.insert("", "end", text=f"Grupo {n}", open=True)
+            for puntaje, (cid, dni, nombre, localidad, saldo) in grupo:
+                # Todos empiezan tildados; el operador destilda los falsos positivos
+                w['marcados'].add(str(cid))
+                tree.insert(nodo, "end", iid=str(cid), text="☑",
+                            values=(cid, dni, nombre, localidad, f"${saldo:,.2f}", f"{puntaje:.0%}"))
+        # El primero de cada grupo es el sugerido para conservar
+        if grupos:
+            primero = tree.get_children(tree.get_children()[0])[0]
+            tree.selection_set(primero)
+        w['lbl_resumen'].config(text=f"{len(grupos)} grupos sospechosos")
+
+    # --- LÍNEA DE TIEMPO DE PAGOS DEL CLIENTE ---
+    PAGOS_POR_PAGINA = 200
+
+    def ver_pagos_cliente(self):
+        if not self.cliente_seleccionado_id:
+            messagebox.showinfo("Atención", "Selecciona un cliente primero.")
+            return
+        self.dialogos.abrir('pagos_cliente', self.cliente_seleccionado_id,
+                            self.lbl_cliente_nombre.cget("text").replace("👤 ", ""))
+
+    def construir_dialogo_pagos_cliente(self, top):
+        top.geometry("750x500")
+        top.configure(bg="white")
+        # Estado de la paginación: cliente actual y clave del último pago cargado
+        estado = {'cliente_id': None, 'ultimo': None, 'fin': True, 'total': 0.0}
+
+        lbl_resumen = tk.Label(top, text="", font=FONTS['body_bold'], bg="white", fg=COLORS['primary'])
+        lbl_resumen.pack(side="bottom", pady=8)
+
+        frame_table = tk.Frame(top, bg="white", relief="solid", bd=1)
+        frame_table.pack(fill="both", expand=True, padx=10, pady=10)
+
+        cols = ("Fecha", "Monto", "Metodo", "Deuda")
+        tree = ttk.Treeview(frame_table, columns=cols, show="headings")
+        tree.heading("Fecha", text="Fecha"); tree.column("Fecha", width=140, anchor="center")
+        tree.heading("Monto", text="Monto"); tree.column("Monto", width=100, anchor="e")
+        tree.heading("Metodo", text="Método"); tree.column("Metodo", width=170, anchor="center")
+        tree.heading("Deuda", text="Deuda"); tree.column("Deuda", width=280)
+        tree.tag_configure('SALDO', foreground=COLORS['warning'])
+        tree.tag_configure('ARCHIVADA', foreground="gray")
+
+        scrollbar = ttk.Scrollbar(frame_table, orient="vertical", command=tree.yview)
+
+        def cargar_pagina():
+            if estado['fin']:
+                return
+            fecha_desde, id_desde = estado['ultimo'] or (None, None)
+            pagos = self.db.obtener_pagos_cliente(estado['cliente_id'], fecha_desde, id_desde,
+                                                  self.PAGOS_POR_PAGINA)
+            for fecha, pago_id, monto, metodo, _, descripcion, archivada in pagos:
+                tag = 'ARCHIVADA' if archivada else ('SALDO' if metodo == "SALDO A FAVOR" else '')
+                tree.insert("", "end", values=(fecha, f"${monto:,.2f}", metodo, descripcion), tags=(tag,))
+                estado['total'] += monto
+            if pagos:
+                estado['ultimo'] = (pagos[-1][0], pagos[-1][1])
+            estado['fin'] = len(pagos) < self.PAGOS_POR_PAGINA
+            cargados = len(tree.get_children())
+            mas = "" if estado['fin'] else " (desplace para ver más)"
+            lbl_resumen.config(text=f"{cargados} pagos · ${estado['total']:,.2f}{mas}")
+
+        def al_desplazar(primero, ultimo):
+            scrollbar.set(primero, ultimo)
+            # Cerca del final de lo cargado: pedimos la página siguiente
+            if float(ultimo) > 0.9:
+                cargar_pagina()
+
+        tree.configure(yscrollcommand=al_desplazar)
+        tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        return {'estado': estado, 'tree': tree, 'cargar_pagina': cargar_pagina}
+
+    def cargar_dialogo_pagos_cliente(self, w, cliente_id, nombre):
+        w['top'].title(f"Pagos de {nombre}")
+        w['tree'].delete(*w['tree'].get_children())
+        w['estado'].update(cliente_id=cliente_id, ultimo=None, fin=False, total=0.0)
+        w['cargar_pagina']()
+
+    # --- LISTA DE COBRANZA (prioridad precalculada en resumen_clientes) ---
+    COBRANZA_POR_PAGINA = 100
+
+    def construir_dialogo_cobranza(self, top):
+        top.title("Lista de Cobranza")
+        top.geometry("980x560")
+        top.configure(bg="white")
+        estado = {'ultimo': None, 'fin': True, 'posicion': 0}
+
+        tk.Label(top, text="📋 A quién cobrar primero", font=FONTS['h2'], bg="white", fg=COLORS['primary']).pack(pady=(15, 2))
+        tk.Label(top, text="Ordenado por deuda abierta, antigüedad, tiempo sin pagar y puntualidad. "
+                           "Doble clic abre el cliente.", font=FONTS['small'], bg="white", fg="gray").pack()
+
+        lbl_resumen = tk.Label(top, text="", font=FONTS['body_bold'], bg="white", fg=COLORS['primary'])
+        lbl_resumen.pack(side="bottom", pady=8)
+
+        frame_table = tk.Frame(top, bg="white", relief="solid", bd=1)
+        frame_table.pack(fill="both", expand=True, padx=15, pady=10)
+        cols = ("Pos", "Cliente", "Telefono", "Loc", "Abierto", "MasVieja", "SinPagar", "ATiempo", "Puntaje")
+        tree = ttk.Treeview(frame_table, columns=cols, show="headings")
+        for col, texto, ancho, anchor in (("Pos", "#", 45, "center"), ("Cliente", "Cliente", 190, "w"),
+                                          ("Telefono", "Teléfono", 110, "center"), ("Loc", "Localidad", 100, "w"),
+                                          ("Abierto", "Deuda Abierta", 115, "e"), ("MasVieja", "Deuda más vieja", 105, "center"),
+                                          ("SinPagar", "Sin pagar", 90, "center"), ("ATiempo", "Pagó a tiempo", 95, "center"),
+                                          ("Puntaje", "Prioridad", 75, "e")):
+            tree.heading(col, text=texto)
+            tree.column(col, width=ancho, anchor=anchor)
+        scrollbar = ttk.Scrollbar(frame_table, orient="vertical", command=tree.yview)
+
+        def cargar_pagina():
+            if estado['fin']:
+                return
+            filas = self.db.obtener_lista_cobranza(estado['ultimo'], self.COBRANZA_POR_PAGINA)
+            for cliente_id, nombre, telefono, localidad, abierto, dias_vieja, dias_sin_pagar, a_tiempo, puntaje, _ in filas:
+                estado['posicion'] += 1
+                sin_pagar = "nunca pagó" if dias_sin_pagar is None else f"{dias_sin_pagar} días"
+                puntual = "—" if a_tiempo is None else f"{a_tiempo:.0%}"
+                tree.insert("", "end", iid=str(cliente_id),
+                            values=(estado['posicion'], nombre, telefono or "-", localidad or "-", f"${abierto:,.2f}",
+                                    f"{dias_vieja} días", sin_pagar, puntual, f"{puntaje:.1f}"))
+            if filas:
+                estado['ultimo'] = (filas[-1][9], filas[-1][0])
+            estado['fin'] = len(filas) < self.COBRANZA_POR_PAGINA
+            mas = "" if estado['fin'] else " (desplace para ver más)"
+            lbl_resumen.config(text=f"{estado['posicion']} clientes con deuda abierta{mas}")
+
+        def al_desplazar(primero, ultimo):
+            scrollbar.set(primero, ultimo)
+            # Cerca del final de lo cargado: pedimos la página siguiente
+            if float(ultimo) > 0.9:
+                cargar_pagina()
+
+        def abrir_cliente(event):
+            seleccion = tree.selection()
+            if seleccion:
+                self.mostrar_cliente(seleccion[0], tree.item(seleccion[0])['values'][1])
+
+        tree.configure(yscrollcommand=al_desplazar)
+        tree.bind("<Double-1>", abrir_cliente)
+        tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        return {'estado': estado, 'tree': tree, 'cargar_pagina': cargar_pagina}
+
+    def cargar_dialogo_cobranza(self, w):
+        w['tree'].delete(*w['tree'].get_children())
+        w['estado'].update(ultimo=None, fin=False, posicion=0)
+        w['cargar_pagina']()
+
+    def mostrar_cliente(self, cliente_id, nombre):
+        """Selecciona un cliente en la ventana principal (aunque no esté en la página cargada de la lista)."""
+        self.cliente_seleccionado_id = str(cliente_id)
+        self.lbl_cliente_nombre.config(text=f"👤 {nombre}")
+        if self.tree_clientes.exists(str(cliente_id)):
+            self.tree_clientes.selection_set(str(cliente_id))
+            self.tree_clientes.see(str(cliente_id))
+        self.actualizar_info_completa()
+        self.lift()
+
+    # --- CIERRE DE CAJA (ver cierre_caja.py para la versión por consola) ---
+    def construir_dialogo_cierre_caja(self, top):
+        top.title("Cierre de Caja")
+        top.geometry("850x620")
+        top.configure(bg="white")
+
+        tk.Label(top, text="🧮 Cierre de Caja", font=FONTS['h2'], bg="white", fg=COLORS['primary']).pack(pady=(15, 5))
+
+        f_rango = tk.Frame(top, bg="white")
+        f_rango.pack(pady=5)
+        entradas = {}
+        for texto, clave, ancho in (("Día:", 'fecha', 11), ("Hasta el día:", 'fecha_hasta', 11),
+                                    ("Desde:", 'desde', 6), ("Hasta:", 'hasta', 6)):
+            tk.Label(f_rango, text=texto, bg="white", font=FONTS['body']).pack(side="left", padx=(10, 4))
+            e = tk.Entry(f_rango, width=ancho, justify="center", bg="white", relief="solid", bd=1)
+            e.pack(side="left", ipady=3)
+            entradas[clave] = e
+
+        lbl_total = tk.Label(top, text="", font=FONTS['h2'], bg="white", fg=COLORS['success'])
+        lbl_total.pack(pady=5)
+
+        tree_totales = ttk.Treeview(top, columns=("Metodo", "Cobros", "Total"), show="headings", height=5)
+        tree_totales.heading("Metodo", text="Método"); tree_totales.column("Metodo", width=250)
+        tree_totales.heading("Cobros", text="Cobros"); tree_totales.column("Cobros", width=100, anchor="center")
+        tree_totales.heading("Total", text="Total"); tree_totales.column("Total", width=180, anchor="e")
+        tree_totales.pack(padx=20, pady=5)
+
+        frame_table = tk.Frame(top, bg="white", relief="solid", bd=1)
+        frame_table.pack(fill="both", expand=True, padx=20, pady=5)
+        cols = ("Fecha", "Cliente", "Detalle", "Metodo", "Monto")
+        tree = ttk.Treeview(frame_table, columns=cols, show="headings")
+        for col, texto, ancho, anchor in (("Fecha", "Fecha", 130, "center"), ("Cliente", "Cliente", 180, "w"),
+                                          ("Detalle", "Detalle", 180, "w"), ("Metodo", "Método", 150, "center"),
+                                          ("Monto", "Monto", 110, "e")):
+            tree.heading(col, text=texto)
+            tree.column(col, width=ancho, anchor=anchor)
+        scrollbar = ttk.Scrollbar(frame_table, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        def leer_dia(texto):
+            return datetime.strptime(texto.strip(), "%d/%m/%Y").date() if texto.strip() else None
+
+        def consultar():
+            try:
+                desde, hasta = rango_caja(leer_dia(entradas['fecha'].get()), entradas['desde'].get().strip(),
+                                          entradas['hasta'].get().strip(), leer_dia(entradas['fecha_hasta'].get()))
+            except ValueError:
+                messagebox.showerror("Error", "Revise el rango (días DD/MM/AAAA, horas HH:MM).", parent=top)
+                return
+            tree_totales.delete(*tree_totales.get_children())
+            total, cantidad = 0.0, 0
+            for metodo, cobros, monto in self.db.obtener_cierre_caja(desde, hasta):
+                tree_totales.insert("", "end", values=(metodo, cobros, f"${monto:,.2f}"))
+                total += monto
+                cantidad += cobros
+            lbl_total.config(text=f"Total cobrado: ${total:,.2f}  ({cantidad} cobros)")
+
+            tree.delete(*tree.get_children())
+            for fecha, _, monto, metodo, cliente, descripcion in self.db.obtener_movimientos_caja(desde, hasta):
+                tree.insert("", "end", values=(fecha, cliente or "-", descripcion or "-", metodo, f"${monto:,.2f}"))
+
+        def poner_dia(dias_atras):
+            dia = (date.today() - timedelta(days=dias_atras)).strftime("%d/%m/%Y")
+            for clave, valor in (('fecha', dia), ('fecha_hasta', ""), ('desde', "00:00"), ('hasta', "23:59")):
+                entradas[clave].delete(0, tk.END)
+                entradas[clave].insert(0, valor)
+            consultar()
+
+        f_botones = tk.Frame(f_rango, bg="white")
+        f_botones.pack(side="left", padx=10)
+        tk.Button(f_botones, text="Hoy", command=lambda: poner_dia(0), relief="flat", bg=COLORS['light']).pack(side="left", padx=2)
+        tk.Button(f_botones, text="Ayer", command=lambda: poner_dia(1), relief="flat", bg=COLORS['light']).pack(side="left", padx=2)
+        tk.Button(f_botones, text="Consultar", command=consultar, bg=COLORS['primary'], fg="white",
+                  font=FONTS['body_bold'], relief="flat", padx=10).pack(side="left", padx=(8, 0))
+        top.bind('<Return>', lambda e: consultar())
+
+        tk.Button(top, text="Cerrar", command=lambda: self.dialogos.cerrar(top), bg=COLORS['secondary'], fg="white").pack(pady=10)
+        return {'poner_dia': poner_dia}
+
+    def cargar_dialogo_cierre_caja(self, w):
+        # Cada apertura arranca en el cierre de hoy
+        w['poner_dia'](0)
+
     # --- LÓGICA DE TOOLTIPS (Concepto Y Método) ---
     def verificar_tooltip(self, event):
         try:
@@ -712,7 +2752,9 @@ class Aplicacion(tk.Tk):
 
     # --- ESTADÍSTICAS ---
     def mostrar_estadisticas(self):
-        top = tk.Toplevel(self)
+        self.dialogos.abrir('estadisticas')
+
+    def construir_dialogo_estadisticas(self, top):
         top.title("Panel de Estadísticas")
         top.geometry("900x550")
         top.configure(bg=COLORS['light'])
@@ -737,16 +2779,28 @@ class Aplicacion(tk.Tk):
                   command=self.mostrar_historial_mensual,
                   bg=COLORS['primary'], fg="white", font=FONTS['body_bold'], relief="flat", padx=15).pack(side="left", padx=10)
 
-        tk.Button(frame_foot, text="Cerrar Panel", command=top.destroy, bg=COLORS['secondary'], fg="white", font=FONTS['body_bold'], relief="flat", padx=20).pack(side="left", padx=10)
+        tk.Button(frame_foot, text="📋 Lista de Cobranza", 
+                  command=lambda: self.dialogos.abrir('cobranza'),
+                  bg=COLORS['danger'], fg="white", font=FONTS['body_bold'], relief="flat", padx=15).pack(side="left", padx=10)
+
+        tk.Button(frame_foot, text="📈 Pronóstico", 
+                  command=self.mostrar_pronostico,
+                  bg=COLORS['success'], fg="white", font=FONTS['body_bold'], relief="flat", padx=15).pack(side="left", padx=10)
+
+        tk.Button(frame_foot, text="💸 Recargo Mensual", 
+                  command=self.ventana_recargo_masivo,
+                  bg=COLORS['danger'], fg="white", font=FONTS['body_bold'], relief="flat", padx=15).pack(side="left", padx=10)
+
+        tk.Button(frame_foot, text="🗄️ Archivar Saldadas", 
+                  command=self.archivar_saldadas,
+                  bg=COLORS['warning'], fg="white", font=FONTS['body_bold'], relief="flat", padx=15).pack(side="left", padx=10)
+
+        tk.Button(frame_foot, text="Cerrar Panel", command=lambda: self.dialogos.cerrar(top), bg=COLORS['secondary'], fg="white", font=FONTS['body_bold'], relief="flat", padx=20).pack(side="left", padx=10)
         
         # --- COLUMNA IZQUIERDA: TARJETAS Y TOP DEUDORES ---
         left_panel = tk.Frame(main_content, bg=COLORS['light'])
         left_panel.grid(row=0, column=0, sticky="nsew", padx=(0, 10))
         
-        # Cálculo de datos generales
-        deuda_total = self.db.obtener_deuda_total()
-        cobro_mes = self.db.obtener_cobro_mes()
-        
         # Tarjetas Resumen
         frame_cards = tk.Frame(left_panel, bg=COLORS['light'])
         frame_cards.pack(fill="x", pady=(0, 20))
@@ -755,13 +2809,15 @@ class Aplicacion(tk.Tk):
         c1 = tk.Frame(frame_cards, bg="white", padx=15, pady=15, relief="solid", bd=1)
         c1.pack(side="left", fill="both", expand=True, padx=(0, 5))
         tk.Label(c1, text="Deuda Activa", font=FONTS['small'], bg="white", fg="gray").pack(anchor="w")
-        tk.Label(c1, text=f"${deuda_total:,.2f}", font=FONTS['h1'], fg=COLORS['danger'], bg="white").pack(anchor="w")
+        lbl_deuda_total = tk.Label(c1, text="", font=FONTS['h1'], fg=COLORS['danger'], bg="white")
+        lbl_deuda_total.pack(anchor="w")
 
         # Card 2
         c2 = tk.Frame(frame_cards, bg="white", padx=15, pady=15, relief="solid", bd=1)
         c2.pack(side="left", fill="both", expand=True, padx=(5, 0))
         tk.Label(c2, text="Ingresos del Mes", font=FONTS['small'], bg="white", fg="gray").pack(anchor="w")
-        tk.Label(c2, text=f"${cobro_mes:,.2f}", font=FONTS['h1'], fg=COLORS['success'], bg="white").pack(anchor="w")
+        lbl_cobro_mes = tk.Label(c2, text="", font=FONTS['h1'], fg=COLORS['success'], bg="white")
+        lbl_cobro_mes.pack(anchor="w")
         
         # Top Deudores
         tk.Label(left_panel, text="🏆 Top 5 Mayores Deudores", font=FONTS['h2'], bg=COLORS['light'], fg=COLORS['text']).pack(anchor="w", pady=(0, 10))
@@ -776,10 +2832,6 @@ class Aplicacion(tk.Tk):
         tree.heading("Deuda", text="Deuda")
         tree.column("Deuda", width=100, anchor="e")
         tree.pack(fill="both", expand=True)
-        
-        top_deudores = self.db.obtener_top_deudores()
-        for nombre, deuda in top_deudores:
-            tree.insert("", "end", values=(nombre, f"${deuda:,.2f}"))
 
         # --- COLUMNA DERECHA: DESGLOSE DE INGRESOS ---
         right_panel = tk.Frame(main_content, bg=COLORS['light'])
@@ -799,7 +2851,25 @@ class Aplicacion(tk.Tk):
         tree_b.heading("Porc", text="% Total")
         tree_b.column("Porc", width=60, anchor="center")
         tree_b.pack(fill="both", expand=True)
-        
+
+        return {'lbl_deuda_total': lbl_deuda_total, 'lbl_cobro_mes': lbl_cobro_mes,
+                'tree_top': tree, 'tree_desglose': tree_b}
+
+    def cargar_dialogo_estadisticas(self, w):
+        # Cálculo de datos generales
+        deuda_total = self.db.obtener_deuda_total()
+        cobro_mes = self.db.obtener_cobro_mes()
+        w['lbl_deuda_total'].config(text=f"${deuda_total:,.2f}")
+        w['lbl_cobro_mes'].config(text=f"${cobro_mes:,.2f}")
+
+        tree = w['tree_top']
+        tree.delete(*tree.get_children())
+        top_deudores = self.db.obtener_top_deudores()
+        for nombre, deuda in top_deudores:
+            tree.insert("", "end", values=(nombre, f"${deuda:,.2f}"))
+
+        tree_b = w['tree_desglose']
+        tree_b.delete(*tree_b.get_children())
         desglose = self.db.obtener_desglose_pagos_mes()
         total_desglose = sum(x[1] for x in desglose) if desglose else 1
         
@@ -809,38 +2879,356 @@ class Aplicacion(tk.Tk):
 
 
     def mostrar_historial_mensual(self):
-        top = tk.Toplevel(self)
+        self.dialogos.abrir('historial_mensual')
+
+    # Colores de las series apiladas (uno por método de pago)
+    COLORES_METODOS = ['#2980b9', '#27ae60', '#f39c12', '#8e44ad', '#95a5a6']
+
+    MESES_HISTORIAL = 36  # Meses que muestra el historial mensual
+
+    def construir_dialogo_historial_mensual(self, top):
         top.title("Historial de Recaudación Mensual")
-        top.geometry("400x500")
+        top.geometry("900x650")
         top.configure(bg="white")
+        # 'reducidas' guarda la serie ya reducida para cada ancho: al redimensionar no se recalcula
+        estado = {'meses': [], 'metodos': [], 'reducidas': {}, 'redibujo': None}
+
+        tk.Label(top, text="📅 Recaudación por Mes", font=FONTS['h2'], bg="white", fg=COLORS['primary']).pack(pady=(15, 5))
+        lbl_resumen = tk.Label(top, text="", font=FONTS['body_bold'], bg="white", fg=COLORS['text'])
+        lbl_resumen.pack()
+
+        canvas = tk.Canvas(top, bg="white", highlightthickness=0, height=300)
+        canvas.pack(fill="both", expand=True, padx=20, pady=5)
+
+        frame_table = tk.Frame(top, bg="white", relief="solid", bd=1)
+        frame_table.pack(fill="x", padx=20, pady=5)
+
+        cols = ("Mes", "Monto", "Var", "Media3", "Media12")
+        tree = ttk.Treeview(frame_table, columns=cols, show="headings", height=7)
+        for col, texto, ancho in (("Mes", "Mes (Año-Mes)", 120), ("Monto", "Total Cobrado", 140),
+                                  ("Var", "vs. Mes Anterior", 120), ("Media3", "Promedio 3 Meses", 140),
+                                  ("Media12", "Promedio 12 Meses", 140)):
+            tree.heading(col, text=texto)
+            tree.column(col, width=ancho, anchor="center" if col in ("Mes", "Var") else "e")
         
-        tk.Label(top, text="📅 Recaudación por Mes", font=FONTS['h2'], bg="white", fg=COLORS['primary']).pack(pady=15)
+        scrollbar = ttk.Scrollbar(frame_table, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
         
+        tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        def dibujar():
+            estado['redibujo'] = None
+            canvas.delete("all")
+            if not estado['meses']:
+                canvas.create_text(canvas.winfo_width() // 2, 120, text="Sin cobros registrados", font=FONTS['body'])
+                return
+            ancho = max(canvas.winfo_width(), 400)
+            alto = max(canvas.winfo_height(), 200)
+            margen_x, margen_y, margen_der = 80, 30, 130
+            area = ancho - margen_x - margen_der
+            # Al menos 6 píxeles por barra; si no entran, se agrupan meses
+            maximo_puntos = max(area // 6, 1)
+            if maximo_puntos not in estado['reducidas']:
+                estado['reducidas'][maximo_puntos] = reducir_tendencia(estado['meses'], maximo_puntos)
+            puntos, por_punto = estado['reducidas'][maximo_puntos]
+
+            maximo = max(max(p[1], p[3], p[4]) for p in puntos) or 1
+            escala = (alto - 2 * margen_y) / maximo
+            paso = area / len(puntos)
+            base_y = alto - margen_y
+
+            canvas.create_line(margen_x, base_y, margen_x + area, base_y, fill="gray")
+            for fraccion in (0.25, 0.5, 0.75, 1.0):
+                y = base_y - maximo * fraccion * escala
+                canvas.create_line(margen_x - 4, y, margen_x + area, y, fill="#eeeeee")
+                canvas.create_text(margen_x - 8, y, text=f"${maximo * fraccion:,.0f}", anchor="e", font=FONTS['small'])
+
+            colores = dict(zip(estado['metodos'], self.COLORES_METODOS))
+            cada = max(1, int(60 // paso))  # Etiquetas de mes sin que se pisen
+            for i, (mes, total, _, _, _, por_metodo) in enumerate(puntos):
+                x = margen_x + i * paso
+                y = base_y
+                for metodo in estado['metodos']:
+                    alto_barra = por_metodo.get(metodo, 0.0) * escala
+                    if alto_barra >= 0.5:
+                        canvas.create_rectangle(x + paso * 0.1, y - alto_barra, x + paso * 0.9, y,
+                                                fill=colores[metodo], outline="")
+                        y -= alto_barra
+                if i % cada == 0:
+                    canvas.create_text(x + paso / 2, base_y + 12, text=mes, font=FONTS['small'])
+
+            for indice, color in ((3, COLORS['danger']), (4, COLORS['secondary'])):
+                coords = []
+                for i, p in enumerate(puntos):
+                    coords += [margen_x + (i + 0.5) * paso, base_y - p[indice] * escala]
+                if len(coords) >= 4:
+                    canvas.create_line(*coords, fill=color, width=2)
+
+            # Leyenda
+            y = margen_y
+            leyenda = [(m, colores[m], "barra") for m in estado['metodos']]
+            leyenda += [("Prom. 3 meses", COLORS['danger'], "linea"), ("Prom. 12 meses", COLORS['secondary'], "linea")]
+            for texto, color, tipo in leyenda:
+                x = margen_x + area + 15
+                if tipo == "barra":
+                    canvas.create_rectangle(x, y - 5, x + 12, y + 5, fill=color, outline="")
+                else:
+                    canvas.create_line(x, y, x + 12, y, fill=color, width=2)
+                canvas.create_text(x + 18, y, text=texto, anchor="w", font=FONTS['small'])
+                y += 18
+            if por_punto > 1:
+                canvas.create_text(margen_x + area + 15, y + 10, anchor="w", font=FONTS['small'], fill="gray",
+                                   text=f"Cada barra: promedio\nmensual de {por_punto} meses")
+
+        def programar_dibujo(event=None):
+            # Al arrastrar el borde llegan muchos <Configure>: se dibuja una vez al final
+            if estado['redibujo']:
+                canvas.after_cancel(estado['redibujo'])
+            estado['redibujo'] = canvas.after(60, dibujar)
+
+        canvas.bind("<Configure>", programar_dibujo)
+        tk.Button(top, text="Cerrar", command=lambda: self.dialogos.cerrar(top), bg=COLORS['secondary'], fg="white").pack(pady=10)
+        return {'tree': tree, 'estado': estado, 'lbl_resumen': lbl_resumen, 'programar_dibujo': programar_dibujo}
+
+    def cargar_dialogo_historial_mensual(self, w):
+        estado = w['estado']
+        # Solo la ventana que se muestra: así no se lee el archivo si no hace falta
+        hoy = date.today()
+        anio, mes = divmod(hoy.year * 12 + hoy.month - 1 - (self.MESES_HISTORIAL - 1), 12)
+        filas = self.db.obtener_tendencia_mensual(f"{anio:04d}-{mes + 1:02d}")
+        estado['meses'], estado['metodos'] = agrupar_tendencia(filas)
+        estado['reducidas'].clear()
+
+        tree = w['tree']
+        tree.delete(*tree.get_children())
+        for mes, monto, variacion, media_3, media_12, _ in reversed(estado['meses']):
+            var_txt = "—" if variacion is None else f"{variacion:+.1%}"
+            tree.insert("", "end", values=(mes, f"${monto:,.2f}", var_txt, f"${media_3:,.2f}", f"${media_12:,.2f}"))
+
+        resumen = ""
+        if estado['meses']:
+            mes, monto, variacion, _, media_12, _ = estado['meses'][-1]
+            resumen = f"{mes}: ${monto:,.2f}"
+            if variacion is not None:
+                resumen += f"  ({variacion:+.1%} vs. mes anterior)"
+            resumen += f"   |   Promedio 12 meses: ${media_12:,.2f}"
+        w['lbl_resumen'].config(text=resumen)
+        w['programar_dibujo']()
+
+    def ventana_recargo_masivo(self):
+        self.dialogos.abrir('recargo_masivo')
+
+    def construir_dialogo_recargo_masivo(self, top):
+        top.title("Recargo Mensual por Atraso")
+        top.geometry("850x550")
+        top.configure(bg="white")
+
+        tk.Label(top, text="💸 Recargo a Deudas Atrasadas", font=FONTS['h2'], bg="white", fg=COLORS['danger']).pack(pady=15)
+
+        f_regla = tk.Frame(top, bg="white")
+        f_regla.pack(fill="x", padx=20)
+
+        entradas = {}
+        for texto, clave in (("Recargo %:", 'pct'), ("Días de atraso mín.:", 'dias'), ("Tope por deuda ($):", 'tope')):
+            tk.Label(f_regla, text=texto, bg="white", font=FONTS['body']).pack(side="left", padx=(10, 5))
+            e = tk.Entry(f_regla, width=8, justify="center", bg="white", relief="solid", bd=1)
+            e.pack(side="left", ipady=3)
+            entradas[clave] = e
+
         frame_table = tk.Frame(top, bg="white", relief="solid", bd=1)
         frame_table.pack(fill="both", expand=True, padx=20, pady=10)
-        
-        cols = ("Mes", "Monto")
+
+        cols = ("Cliente", "Concepto", "Fecha", "Dias", "Debe", "Recargo")
         tree = ttk.Treeview(frame_table, columns=cols, show="headings")
-        tree.heading("Mes", text="Mes (Año-Mes)")
-        tree.column("Mes", width=150, anchor="center")
-        tree.heading("Monto", text="Total Cobrado")
-        tree.column("Monto", width=150, anchor="e")
-        
+        for col, ancho in zip(cols, (180, 200, 110, 60, 100, 100)):
+            tree.heading(col, text=col)
+            tree.column(col, width=ancho, anchor="w" if col in ("Cliente", "Concepto") else "center")
         scrollbar = ttk.Scrollbar(frame_table, orient="vertical", command=tree.yview)
         tree.configure(yscrollcommand=scrollbar.set)
-        
         tree.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
-        
-        datos = self.db.obtener_recaudacion_historica()
-        for mes, monto in datos:
-            tree.insert("", "end", values=(mes, f"${monto:,.2f}"))
-            
-        tk.Button(top, text="Cerrar", command=top.destroy, bg=COLORS['secondary'], fg="white").pack(pady=10)
+
+        lbl_total = tk.Label(top, text="", font=FONTS['h2'], bg="white", fg=COLORS['primary'])
+        lbl_total.pack(pady=5)
+
+        def leer_regla():
+            try:
+                pct = float(entradas['pct'].get())
+                dias = int(entradas['dias'].get())
+                tope_txt = entradas['tope'].get().strip()
+                tope = float(tope_txt) if tope_txt else None
+            except ValueError:
+                messagebox.showerror("Error", "Revise el porcentaje, los días y el tope.", parent=top)
+                return None
+            if pct <= 0 or dias < 0 or (tope is not None and tope < 0):
+                messagebox.showerror("Error", "El porcentaje debe ser mayor a 0 y el tope no puede ser negativo.", parent=top)
+                return None
+            return pct, dias, tope
+
+        def previsualizar():
+            regla = leer_regla()
+            if not regla: return
+            tree.delete(*tree.get_children())
+            filas, cantidad, total = self.db.previsualizar_recargo(*regla)
+            for _, cliente, desc, fecha, dias, resta, recargo in filas:
+                tree.insert("", "end", values=(cliente, desc, fecha, dias, f"${resta:,.2f}", f"${recargo:,.2f}"))
+            lbl_total.config(text=f"{cantidad} deudas | Recargo total: ${total:,.2f}")
+
+        def aplicar():
+            regla = leer_regla()
+            if not regla: return
+            _, cantidad, total = self.db.previsualizar_recargo(*regla)
+            if not cantidad:
+                messagebox.showinfo("Recargo", "No hay deudas atrasadas con esa regla.\n"
+                                               "Las que ya tuvieron recargo este mes no se recargan de nuevo.", parent=top)
+                return
+            if not messagebox.askyesno("Confirmar", f"¿Aplicar ${total:,.2f} de recargo a {cantidad} deudas?", parent=top):
+                return
+            cantidad, total = self.db.aplicar_recargo_masivo(*regla)
+            messagebox.showinfo("Recargo", f"Se aplicó ${total:,.2f} de recargo a {cantidad} deudas.", parent=top)
+            self.dialogos.cerrar(top)
+            self.cargar_lista_clientes(self.entry_buscar.get())
+            if self.cliente_seleccionado_id:
+                self.actualizar_info_completa()
+
+        f_btn = tk.Frame(top, bg="white")
+        f_btn.pack(pady=10)
+        tk.Button(f_btn, text="Previsualizar", command=previsualizar, bg=COLORS['primary'], fg="white",
+                  font=FONTS['body_bold'], relief="flat", padx=15).pack(side="left", padx=10)
+        tk.Button(f_btn, text="APLICAR RECARGO", command=aplicar, bg=COLORS['danger'], fg="white",
+                  font=FONTS['body_bold'], relief="flat", padx=15).pack(side="left", padx=10)
+        return {'entradas': entradas, 'tree': tree, 'lbl_total': lbl_total}
+
+    def cargar_dialogo_recargo_masivo(self, w):
+        # Cada apertura arranca con la regla por defecto y sin previsualización vieja
+        for clave, inicial in (('pct', "5"), ('dias', "30"), ('tope', "")):
+            w['entradas'][clave].delete(0, tk.END)
+            w['entradas'][clave].insert(0, inicial)
+        w['tree'].delete(*w['tree'].get_children())
+        w['lbl_total'].config(text="")
+
+    # --- PRONÓSTICO DE COBRANZA (ver pronostico.py) ---
+    def mostrar_pronostico(self):
+        try:
+            import pronostico
+        except ImportError:
+            messagebox.showerror("Pronóstico", "El pronóstico necesita NumPy (pip install numpy).")
+            return
+        self.dialogos.abrir('pronostico', pronostico)
+
+    def construir_dialogo_pronostico(self, top):
+        top.title("Pronóstico de Cobranza")
+        top.geometry("850x560")
+        top.configure(bg="white")
+        # La cartera se lee una vez por apertura; cambiar el escenario solo recalcula
+        estado = {'modulo': None, 'cartera': None, 'ritmo': None}
+
+        tk.Label(top, text="📈 Cobranza Esperada", font=FONTS['h2'], bg="white", fg=COLORS['primary']).pack(pady=10)
+
+        f_regla = tk.Frame(top, bg="white")
+        f_regla.pack(fill="x", padx=20)
+
+        tk.Label(f_regla, text="Períodos:", bg="white", font=FONTS['body']).pack(side="left", padx=(10, 5))
+        c_periodo = ttk.Combobox(f_regla, values=["12 semanas", "6 meses", "12 meses"], state="readonly", width=11)
+        c_periodo.current(0)
+        c_periodo.pack(side="left")
+
+        entradas = {}
+        for texto, clave in (("Recargo %:", 'pct'), ("Atraso mín.:", 'dias'), ("Incobrable tras (días):", 'castigo')):
+            tk.Label(f_regla, text=texto, bg="white", font=FONTS['body']).pack(side="left", padx=(10, 5))
+            e = tk.Entry(f_regla, width=7, justify="center", bg="white", relief="solid", bd=1)
+            e.pack(side="left", ipady=3)
+            entradas[clave] = e
+
+        canvas = tk.Canvas(top, bg="white", highlightthickness=0, height=330)
+        canvas.pack(fill="both", expand=True, padx=20, pady=10)
+
+        lbl_resumen = tk.Label(top, text="", font=FONTS['body_bold'], bg="white", fg=COLORS['text'], justify="left")
+        lbl_resumen.pack(pady=5)
+
+        def dibujar(base, escenario, etiqueta):
+            canvas.delete("all")
+            ancho = max(canvas.winfo_width(), 780)
+            alto = max(canvas.winfo_height(), 300)
+            margen_x, margen_y = 70, 30
+            maximo = max(base.max(initial=0), escenario.max(initial=0)) or 1
+            n = len(base)
+            paso = (ancho - margen_x - 10) / max(n, 1)
+            escala = (alto - 2 * margen_y) / maximo
+
+            canvas.create_line(margen_x, alto - margen_y, ancho - 10, alto - margen_y, fill="gray")
+            for fraccion in (0.5, 1.0):
+                y = alto - margen_y - maximo * fraccion * escala
+                canvas.create_line(margen_x - 4, y, ancho - 10, y, fill="#eeeeee")
+                canvas.create_text(margen_x - 8, y, text=f"${maximo * fraccion:,.0f}", anchor="e", font=FONTS['small'])
+
+            hay_escenario = bool(abs(escenario - base).max(initial=0) >= 0.5)
+            barra = paso * (0.4 if hay_escenario else 0.7)
+            for i in range(n):
+                x = margen_x + i * paso + paso * 0.15
+                canvas.create_rectangle(x, alto - margen_y - base[i] * escala, x + barra, alto - margen_y,
+                                        fill=COLORS['primary'], outline="")
+                if hay_escenario:
+                    canvas.create_rectangle(x + barra, alto - margen_y - escenario[i] * escala, x + 2 * barra,
+                                            alto - margen_y, fill=COLORS['warning'], outline="")
+                canvas.create_text(x + barra * (1 if hay_escenario else 0.5), alto - margen_y + 12,
+                                   text=f"{etiqueta}{i + 1}", font=FONTS['small'])
+
+        def simular():
+            try:
+                pct = float(entradas['pct'].get() or 0)
+                dias = int(entradas['dias'].get() or 30)
+                castigo_txt = entradas['castigo'].get().strip()
+                castigo = int(castigo_txt) if castigo_txt else None
+            except ValueError:
+                messagebox.showerror("Error", "Revise el porcentaje y los días.", parent=top)
+                return
+            periodos, dias_por_periodo, etiqueta = {
+                "12 semanas": (12, 7, "S"), "6 meses": (6, 30, "M"), "12 meses": (12, 30, "M"),
+            }[c_periodo.get()]
+
+            r = estado['modulo'].simular(estado['cartera'], estado['ritmo'], recargo=pct, dias_minimos=dias,
+                                         castigo_dias=castigo, periodos=periodos, dias_por_periodo=dias_por_periodo)
+            dibujar(r['base'], r['escenario'], etiqueta)
+            texto = f"Esperado: ${r['base'].sum():,.2f}   |   Deuda actual: ${r['deuda_base']:,.2f}"
+            if pct or castigo is not None:
+                texto += (f"\nEscenario: ${r['escenario'].sum():,.2f}   |   Recargo: ${r['recargo_total']:,.2f}"
+                          f"   |   Incobrable: ${r['castigado_total']:,.2f} ({r['deudas_castigadas']} deudas)")
+            lbl_resumen.config(text=texto)
+
+        c_periodo.bind("<<ComboboxSelected>>", lambda e: simular())
+        top.bind('<Return>', lambda e: simular())
+        tk.Button(top, text="Simular", command=simular, bg=COLORS['primary'], fg="white",
+                  font=FONTS['body_bold'], relief="flat", padx=15).pack(pady=(0, 10))
+        return {'estado': estado, 'entradas': entradas, 'simular': simular}
+
+    def cargar_dialogo_pronostico(self, w, modulo):
+        estado = w['estado']
+        estado['modulo'] = modulo
+        estado['cartera'] = modulo.Cartera.desde_base(self.db)
+        estado['ritmo'] = modulo.ritmo_de_pago(estado['cartera'])
+        for clave, inicial in (('pct', "0"), ('dias', "30"), ('castigo', "")):
+            w['entradas'][clave].delete(0, tk.END)
+            w['entradas'][clave].insert(0, inicial)
+        w['top'].update_idletasks()
+        w['simular']()
+
+    def archivar_saldadas(self):
+        dias = simpledialog.askinteger("Archivar deudas saldadas",
+                                       "Archivar deudas pagadas (sin saldo a favor) con más de cuántos días:",
+                                       initialvalue=365, minvalue=30, parent=self)
+        if dias is None: return
+        cantidad = self.db.archivar_deudas_saldadas(dias)
+        messagebox.showinfo("Archivo", f"Se archivaron {cantidad} deudas saldadas.")
+        if self.cliente_seleccionado_id:
+            self.actualizar_info_completa()
 
     # --- LÓGICA GENERAL ---
     def modal_nuevo_cliente(self):
-        top = tk.Toplevel(self)
+        self.dialogos.abrir('nuevo_cliente')
+
+    def construir_dialogo_nuevo_cliente(self, top):
         top.title("Nuevo Cliente")
         top.geometry("400x320")
         top.configure(bg="white")
@@ -857,7 +3245,6 @@ class Aplicacion(tk.Tk):
         e_dni = tk.Entry(top, font=FONTS['body'], bg="white", relief="solid", bd=1, 
                          validate='key', validatecommand=vcmd)
         e_dni.pack(fill="x", padx=30, pady=(0, 10), ipady=3)
-        e_dni.focus()
 
         tk.Label(top, text="Nombre Completo:", bg="white", font=FONTS['body_bold']).pack(anchor="w", padx=30)
         e_nombre = tk.Entry(top, font=FONTS['body'], bg="white", relief="solid", bd=1)
@@ -867,7 +3254,6 @@ class Aplicacion(tk.Tk):
         valores_loc = ["Bombal", "Bigand", "Firmat", "Alcorta", "Rosario", "Venado Tuerto", "Otro"]
         e_localidad = ttk.Combobox(top, values=valores_loc, state="readonly", font=FONTS['body'])
         e_localidad.pack(fill="x", padx=30, pady=(0, 20), ipady=3)
-        e_localidad.current(0)
 
         def guardar():
             dni = e_dni.get().strip()
@@ -883,27 +3269,193 @@ class Aplicacion(tk.Tk):
 
             self.db.agregar_cliente(dni, nombre, e_localidad.get())
             self.cargar_lista_clientes()
-            top.destroy()
+            self.dialogos.cerrar(top)
         
         tk.Button(top, text="GUARDAR CLIENTE", bg=COLORS['primary'], fg="white", 
                   font=FONTS['body_bold'], relief="flat", cursor="hand2",
                   command=guardar).pack(pady=10, ipadx=20, ipady=5)
         top.bind('<Return>', lambda event: guardar())
+        return {'e_dni': e_dni, 'e_nombre': e_nombre, 'e_localidad': e_localidad}
+
+    def cargar_dialogo_nuevo_cliente(self, w):
+        # Formulario en blanco cada vez que se abre
+        w['e_dni'].delete(0, tk.END)
+        w['e_nombre'].delete(0, tk.END)
+        w['e_localidad'].current(0)
+        w['e_dni'].focus()
+
+    # --- LISTA DE CLIENTES: ORDEN, FILTROS Y PÁGINAS (todo lo resuelve la base) ---
+    CLIENTES_POR_PAGINA = 200
+    COLUMNAS_ORDEN_CLIENTES = {"DNI": ('dni', "DNI / ID"), "Nombre": ('nombre', "Nombre"),
+                               "Loc": ('localidad', "Loc"), "Saldo": ('saldo', "Total ($)")}
+    FILTROS_VACIOS = {'saldo_min': None, 'saldo_max': None, 'con_saldo_a_favor': False,
+                      'localidad': None, 'atraso_dias': None}
 
     def cargar_lista_clientes(self, filtro=""):
-        for row in self.tree_clientes.get_children():
-            self.tree_clientes.delete(row)
-        
-        clientes = self.db.obtener_clientes_con_saldo(filtro)
+        self.tree_clientes.delete(*self.tree_clientes.get_children())
+        self.pagina_clientes = {'filtro': filtro, 'despues_de': None, 'fin': False}
+        self.cargar_pagina_clientes()
+
+    def cargar_pagina_clientes(self):
+        estado = getattr(self, 'pagina_clientes', None)
+        if not estado or estado['fin']:
+            return
+        orden, descendente = self.orden_clientes
+        f = self.filtros_clientes
+        # Argumentos por posición: así también viajan a un servidor (BaseDeDatosRemota)
+        clientes = self.db.obtener_clientes_pagina(estado['filtro'], orden, descendente, f['saldo_min'], f['saldo_max'],
+                                                   f['con_saldo_a_favor'], f['localidad'], f['atraso_dias'],
+                                                   estado['despues_de'], self.CLIENTES_POR_PAGINA)
         for cli in clientes:
-            saldo = cli[4]
-            # Mostrar el saldo tal cual
-            if saldo < 0:
-                txt_saldo = f"+ ${abs(saldo):,.2f} (Favor)"
-            else:
-                txt_saldo = f"${saldo:,.2f}"
+            if self.tree_clientes.exists(str(cli[0])):
+                continue
+            # iid = id del cliente, para poder actualizar una fila puntual
+            self.tree_clientes.insert("", "end", iid=str(cli[0]), values=self.valores_fila_cliente(cli), tags=(cli[0],))
+        if clientes:
+            estado['despues_de'] = BaseDeDatos.clave_pagina(orden, clientes[-1])
+        estado['fin'] = len(clientes) < self.CLIENTES_POR_PAGINA
+
+    def ordenar_clientes(self, columna):
+        orden = self.COLUMNAS_ORDEN_CLIENTES[columna][0]
+        actual, descendente = self.orden_clientes
+        # El saldo arranca de mayor a menor (lo que se busca es quién debe más)
+        self.orden_clientes = (orden, (not descendente) if orden == actual else orden == 'saldo')
+        self.actualizar_encabezados_clientes()
+        self.cargar_lista_clientes(self.entry_buscar.get())
 
-            self.tree_clientes.insert("", "end", values=(cli[1], cli[2], cli[3], txt_saldo), tags=(cli[0],))
+    def actualizar_encabezados_clientes(self):
+        orden, descendente = self.orden_clientes
+        for col, (clave, titulo) in self.COLUMNAS_ORDEN_CLIENTES.items():
+            flecha = (" ▼" if descendente else " ▲") if clave == orden else ""
+            self.tree_clientes.heading(col, text=titulo + flecha)
+
+    def construir_filtros_clientes(self, parent):
+        """Panel plegable con filtros de saldo, localidad, atraso y saldo a favor."""
+        f = tk.Frame(parent, bg=COLORS['secondary'])
+        self.frame_filtros_clientes = f
+        estilo = {'bg': COLORS['secondary'], 'fg': "#bdc3c7", 'font': FONTS['small']}
+        entradas = {}
+
+        tk.Label(f, text="Saldo desde:", **estilo).grid(row=0, column=0, sticky="w")
+        tk.Label(f, text="hasta:", **estilo).grid(row=0, column=2, sticky="w", padx=(5, 0))
+        tk.Label(f, text="Localidad:", **estilo).grid(row=1, column=0, sticky="w", pady=3)
+        tk.Label(f, text="Deuda de más de", **estilo).grid(row=2, column=0, sticky="w")
+        tk.Label(f, text="días", **estilo).grid(row=2, column=2, sticky="w", padx=(5, 0))
+        for clave, fila, columna in (('saldo_min', 0, 1), ('saldo_max', 0, 3), ('atraso_dias', 2, 1)):
+            e = tk.Entry(f, width=8, font=FONTS['small'], relief="solid", bd=1)
+            e.grid(row=fila, column=columna, sticky="w")
+            e.bind("<Return>", lambda ev: self.aplicar_filtros_clientes())
+            entradas[clave] = e
+
+        c_localidad = ttk.Combobox(f, state="readonly", width=16, font=FONTS['small'])
+        c_localidad.grid(row=1, column=1, columnspan=3, sticky="w", pady=3)
+        c_localidad.bind("<<ComboboxSelected>>", lambda ev: self.aplicar_filtros_clientes())
+        entradas['localidad'] = c_localidad
+
+        var_favor = tk.BooleanVar(value=False)
+        tk.Checkbutton(f, text="Solo con saldo a favor", variable=var_favor, command=self.aplicar_filtros_clientes,
+                       selectcolor=COLORS['secondary'], activebackground=COLORS['secondary'], **estilo
+                       ).grid(row=3, column=0, columnspan=4, sticky="w")
+        entradas['con_saldo_a_favor'] = var_favor
+
+        f_botones = tk.Frame(f, bg=COLORS['secondary'])
+        f_botones.grid(row=4, column=0, columnspan=4, sticky="e", pady=(3, 0))
+        tk.Button(f_botones, text="Limpiar", command=self.limpiar_filtros_clientes, relief="flat",
+                  font=FONTS['small']).pack(side="left", padx=3)
+        tk.Button(f_botones, text="Aplicar", command=self.aplicar_filtros_clientes, relief="flat",
+                  bg=COLORS['primary'], fg="white", font=FONTS['small']).pack(side="left")
+
+        self.entradas_filtros_clientes = entradas
+        self.orden_clientes = ('nombre', False)
+        self.filtros_clientes = dict(self.FILTROS_VACIOS)
+
+    def alternar_filtros_clientes(self):
+        if self.frame_filtros_clientes.winfo_ismapped():
+            self.frame_filtros_clientes.pack_forget()
+            self.btn_filtros.config(text="⚙ Filtros ▾")
+        else:
+            self.entradas_filtros_clientes['localidad'].config(values=["Todas"] + self.db.obtener_localidades())
+            self.frame_filtros_clientes.pack(fill="x", padx=20, before=self.frame_tabla_clientes)
+            self.btn_filtros.config(text="⚙ Filtros ▴")
+
+    def aplicar_filtros_clientes(self):
+        e = self.entradas_filtros_clientes
+        try:
+            saldo_min = float(e['saldo_min'].get()) if e['saldo_min'].get().strip() else None
+            saldo_max = float(e['saldo_max'].get()) if e['saldo_max'].get().strip() else None
+            atraso = int(e['atraso_dias'].get()) if e['atraso_dias'].get().strip() else None
+        except ValueError:
+            messagebox.showerror("Filtros", "Los saldos y los días deben ser números.")
+            return
+        localidad = e['localidad'].get()
+        self.filtros_clientes = {'saldo_min': saldo_min, 'saldo_max': saldo_max,
+                                 'con_saldo_a_favor': e['con_saldo_a_favor'].get(),
+                                 'localidad': localidad if localidad not in ("", "Todas") else None,
+                                 'atraso_dias': atraso}
+        activos = sum(1 for k, v in self.filtros_clientes.items() if v not in (None, False))
+        abierto = "▴" if self.frame_filtros_clientes.winfo_ismapped() else "▾"
+        self.btn_filtros.config(text=f"⚙ Filtros ({activos}) {abierto}" if activos else f"⚙ Filtros {abierto}")
+        self.cargar_lista_clientes(self.entry_buscar.get())
+
+    def limpiar_filtros_clientes(self):
+        e = self.entradas_filtros_clientes
+        for clave in ('saldo_min', 'saldo_max', 'atraso_dias'):
+            e[clave].delete(0, tk.END)
+        e['localidad'].set("")
+        e['con_saldo_a_favor'].set(False)
+        self.aplicar_filtros_clientes()
+
+    def valores_fila_cliente(self, cli):
+        saldo = cli[4]
+        # Mostrar el saldo tal cual
+        if saldo < 0:
+            txt_saldo = f"+ ${abs(saldo):,.2f} (Favor)"
+        else:
+            txt_saldo = f"${saldo:,.2f}"
+        return (cli[1], cli[2], cli[3], txt_saldo)
+
+    # --- VIGILANCIA DE CAMBIOS EXTERNOS ---
+    INTERVALO_VIGILANCIA_MS = 2000
+
+    def iniciar_vigilancia(self):
+        self.data_version = self.db.obtener_data_version()
+        self.versiones_vistas = self.db.obtener_versiones_tabla()
+        self.after(self.INTERVALO_VIGILANCIA_MS, self.vigilar_cambios)
+
+    def vigilar_cambios(self):
+        """
+        En reposo hace una sola consulta (PRAGMA data_version). Si otro proceso
+        escribió, refresca solo las filas de los clientes afectados y el detalle abierto.
+        """
+        try:
+            dv = self.db.obtener_data_version()
+            if dv != self.data_version:
+                self.data_version = dv
+                self.refrescar_cambios_externos()
+        finally:
+            self.after(self.INTERVALO_VIGILANCIA_MS, self.vigilar_cambios)
+
+    def refrescar_cambios_externos(self):
+        versiones = self.db.obtener_versiones_tabla()
+        anteriores = self.versiones_vistas
+        self.versiones_vistas = versiones
+        if versiones['*'] == anteriores.get('*'):
+            return
+
+        afectados = self.db.obtener_clientes_modificados(anteriores.get('*', 0))
+        orden, _ = self.orden_clientes
+        # Ordenada por otra columna o con filtros, un saldo nuevo puede mover la fila o sacarla de la lista
+        reubicar = orden != 'nombre' or any(v not in (None, False) for v in self.filtros_clientes.values())
+        if versiones['clientes'] != anteriores.get('clientes') or (reubicar and afectados):
+            # Altas/bajas de clientes cambian el orden de la lista: recarga completa
+            self.cargar_lista_clientes(self.entry_buscar.get())
+        else:
+            visibles = [c for c in afectados if self.tree_clientes.exists(str(c))]
+            for cli in self.db.obtener_saldos_clientes(visibles):
+                self.tree_clientes.item(str(cli[0]), values=self.valores_fila_cliente(cli))
+
+        if self.cliente_seleccionado_id and int(self.cliente_seleccionado_id) in afectados:
+            self.actualizar_info_completa()
 
     def filtrar_clientes(self, event):
         self.cargar_lista_clientes(self.entry_buscar.get())
@@ -927,7 +3479,8 @@ class Aplicacion(tk.Tk):
         for row in self.tree_detalle.get_children():
             self.tree_detalle.delete(row)
             
-        historial = self.db.obtener_historial_cliente(self.cliente_seleccionado_id)
+        historial = self.db.obtener_historial_cliente(self.cliente_seleccionado_id,
+                                                      self.var_incluir_archivadas.get())
         
         # Filtros de ordenamiento
         filtro_actual = self.combo_filtro.get()
@@ -951,7 +3504,8 @@ class Aplicacion(tk.Tk):
                 txt_resta = f"${resta_valor:,.2f}"
 
             valores_fila = (h[1], f"${h[2]:,.2f}", f"${h[3]:,.2f}", txt_resta, f_creacion, f_pago, h[7], metodo)
-            self.tree_detalle.insert("", "end", values=valores_fila, tags=(h[7], h[0])) 
+            # tags: (estilo, deuda_id). Las archivadas se ven en gris y no se pueden pagar
+            self.tree_detalle.insert("", "end", values=valores_fila, tags=('ARCHIVADA' if h[9] else h[7], h[0]))
 
         # TOTAL GENERAL Y SALDO A FAVOR
         total = self.db.obtener_total_individual(self.cliente_seleccionado_id)
@@ -1020,11 +3574,187 @@ class Aplicacion(tk.Tk):
         except ValueError:
             messagebox.showerror("Error", "El monto debe ser un número")
 
+    # --- CARGA MÚLTIPLE DE DEUDAS (REMITOS CON MUCHOS ITEMS) ---
+    def validar_linea_deuda(self, desc, monto_txt, fecha_txt):
+        """
+        Valida una línea de la grilla. Retorna ((monto, desc, fecha_final), None)
+        o (None, mensaje_error). Fecha: dd/mm/aaaa, dd/mm (año actual) o vacía (ahora).
+        """
+        try:
+            monto = float(monto_txt.replace(',', '.'))
+        except ValueError:
+            return None, "El monto debe ser un número"
+        if monto <= 0:
+            return None, "El monto debe ser mayor a 0"
+
+        if not fecha_txt:
+            return (monto, desc or "Factura", datetime.now().strftime("%Y-%m-%d %H:%M")), None
+
+        partes = fecha_txt.split("/")
+        if len(partes) == 2:
+            partes.append(str(datetime.now().year))
+        try:
+            fecha_obj = datetime.strptime("/".join(p.strip() for p in partes), "%d/%m/%Y")
+        except ValueError:
+            return None, "Fecha inválida"
+        if fecha_obj.date() > datetime.now().date():
+            return None, "Fecha futura"
+        return (monto, desc or "Factura", fecha_obj.strftime("%Y-%m-%d 00:00")), None
+
+    def ventana_carga_multiple(self):
+        if not self.cliente_seleccionado_id:
+            messagebox.showwarning("Error", "Selecciona un cliente primero")
+            return
+        self.dialogos.abrir('carga_multiple', self.cliente_seleccionado_id, self.lbl_cliente_nombre.cget("text"))
+
+    def construir_dialogo_carga_multiple(self, top):
+        top.title("Carga Múltiple de Deudas")
+        top.geometry("700x520")
+        top.configure(bg="white")
+        # Cliente al que se cargan las deudas (se reemplaza en cada apertura)
+        estado = {'cliente_id': None}
+
+        lbl_cliente = tk.Label(top, text="", font=FONTS['h2'], bg="white", fg=COLORS['primary'])
+        lbl_cliente.pack(pady=(15, 0))
+        tk.Label(top, text="Tab: siguiente campo | Enter: nueva línea | ↑/↓: cambiar línea | Ctrl+Enter: guardar todo",
+                 font=FONTS['small'], bg="white", fg="gray").pack(pady=(0, 10))
+
+        # Grilla con scroll (Canvas + Frame interno)
+        contenedor = tk.Frame(top, bg="white")
+        contenedor.pack(fill="both", expand=True, padx=20)
+        canvas = tk.Canvas(contenedor, bg="white", highlightthickness=0)
+        scrollbar = ttk.Scrollbar(contenedor, orient="vertical", command=canvas.yview)
+        grilla = tk.Frame(canvas, bg="white")
+        grilla.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
+        canvas.create_window((0, 0), window=grilla, anchor="nw")
+        canvas.configure(yscrollcommand=scrollbar.set)
+        canvas.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        for col, (texto, ancho) in enumerate((("#", 3), ("Concepto / Repuesto", 35), ("Monto ($)", 12), ("Fecha (dd/mm/aaaa)", 16), ("", 25))):
+            tk.Label(grilla, text=texto, bg="white", font=FONTS['body_bold'], width=ancho, anchor="w").grid(row=0, column=col, sticky="w")
+
+        filas = []  # [(entry_desc, entry_monto, entry_fecha, lbl_error), ...]
+        numeros = []  # Etiqueta con el número de cada línea
+
+        lbl_resumen = tk.Label(top, text="", font=FONTS['body_bold'], bg="white", fg=COLORS['text'])
+        lbl_resumen.pack(pady=5)
+
+        def actualizar_resumen(e=None):
+            total = 0.0
+            for _, e_monto, _, _ in filas:
+                try: total += float(e_monto.get().replace(',', '.'))
+                except ValueError: pass
+            lbl_resumen.config(text=f"{len(filas)} líneas | Total: ${total:,.2f}")
+
+        def mover(fila, col, delta):
+            destino = fila + delta
+            if 0 <= destino < len(filas):
+                filas[destino][col].focus_set()
+            return "break"
+
+        def agregar_fila(e=None):
+            i = len(filas)
+            lbl_numero = tk.Label(grilla, text=str(i + 1), bg="white", font=FONTS['small'])
+            lbl_numero.grid(row=i + 1, column=0)
+            numeros.append(lbl_numero)
+            entradas = []
+            for col, ancho in ((1, 35), (2, 12), (3, 16)):
+                ent = tk.Entry(grilla, width=ancho, font=FONTS['body'], bg="white", relief="solid", bd=1)
+                ent.grid(row=i + 1, column=col, padx=2, pady=2, ipady=3, sticky="w")
+                ent.bind("<Up>", lambda e, f=i, c=col - 1: mover(f, c, -1))
+                ent.bind("<Down>", lambda e, f=i, c=col - 1: mover(f, c, 1))
+                ent.bind("<Return>", agregar_fila)
+                ent.bind("<Control-Return>", lambda e: guardar() or "break")
+                entradas.append(ent)
+            entradas[1].bind("<KeyRelease>", actualizar_resumen, add="+")
+            lbl_error = tk.Label(grilla, text="", bg="white", fg=COLORS['danger'], font=FONTS['small'], anchor="w")
+            lbl_error.grid(row=i + 1, column=4, sticky="w")
+            filas.append((entradas[0], entradas[1], entradas[2], lbl_error))
+            entradas[0].focus_set()
+            canvas.yview_moveto(1.0)
+            actualizar_resumen()
+            return "break"
+
+        def guardar():
+            lineas = []
+            errores = 0
+            for e_desc, e_monto, e_fecha, lbl_error in filas:
+                desc, monto_txt, fecha_txt = e_desc.get().strip(), e_monto.get().strip(), e_fecha.get().strip()
+                if not desc and not monto_txt and not fecha_txt:
+                    lbl_error.config(text="")
+                    continue  # Línea vacía: se ignora
+                linea, error = self.validar_linea_deuda(desc, monto_txt, fecha_txt)
+                lbl_error.config(text=error or "")
+                for ent in (e_desc, e_monto, e_fecha):
+                    ent.config(bg="#ffebee" if error else "white")
+                if error:
+                    errores += 1
+                else:
+                    lineas.append(linea)
+
+            if errores:
+                messagebox.showerror("Error", f"Hay {errores} líneas con errores. Corríjalas antes de guardar.", parent=top)
+                return
+            if not lineas:
+                return
+
+            self.db.agregar_deudas_lote(estado['cliente_id'], lineas)
+            self.dialogos.cerrar(top)
+            # Una sola recarga de las vistas para todo el lote
+            self.actualizar_info_completa()
+            self.cargar_lista_clientes(self.entry_buscar.get())
+
+        def reiniciar():
+            # Vuelve a 5 líneas vacías: las que se agregaron en la apertura anterior se quitan
+            while len(filas) > 5:
+                for widget in filas.pop()[:4] + (numeros.pop(),):
+                    widget.destroy()
+            for fila in filas:
+                for ent in fila[:3]:
+                    ent.delete(0, tk.END)
+                    ent.config(bg="white")
+                fila[3].config(text="")
+            while len(filas) < 5:
+                agregar_fila()
+            canvas.yview_moveto(0.0)
+            actualizar_resumen()
+            filas[0][0].focus_set()
+
+        f_btn = tk.Frame(top, bg="white")
+        f_btn.pack(pady=10)
+        tk.Button(f_btn, text="+ Línea", command=agregar_fila, bg=COLORS['light'], fg=COLORS['text'],
+                  font=FONTS['body_bold'], relief="flat", padx=15).pack(side="left", padx=10)
+        tk.Button(f_btn, text="GUARDAR TODO", command=guardar, bg=COLORS['success'], fg="white",
+                  font=FONTS['body_bold'], relief="flat", padx=15).pack(side="left", padx=10)
+
+        top.bind("<Escape>", lambda e: self.dialogos.cerrar(top))
+        return {'estado': estado, 'lbl_cliente': lbl_cliente, 'reiniciar': reiniciar}
+
+    def cargar_dialogo_carga_multiple(self, w, cliente_id, nombre):
+        w['estado']['cliente_id'] = cliente_id
+        w['lbl_cliente'].config(text=nombre)
+        w['reiniciar']()
+
+    def hay_archivadas(self, seleccion):
+        """Avisa y retorna True si la selección incluye deudas archivadas (no se les puede cargar nada)."""
+        if any(self.tree_detalle.item(item, "tags")[0] == 'ARCHIVADA' for item in seleccion):
+            messagebox.showinfo("Deuda archivada",
+                                "Las deudas archivadas ya están saldadas y solo se pueden consultar.\n"
+                                "Desmarque 'Incluir archivadas' o elija otra deuda.")
+            return True
+        return False
+
     def abrir_ventana_pago(self):
         seleccion = self.tree_detalle.selection()
         if not seleccion:
             messagebox.showinfo("Atención", "Selecciona qué deuda quiere pagar el cliente (clic en la lista).")
             return
+        if self.hay_archivadas(seleccion):
+            return
+        if len(seleccion) > 1:
+            self.abrir_ventana_pago_multiple(seleccion)
+            return
             
         tags = self.tree_detalle.item(seleccion, "tags")
         deuda_id = tags[1] 
@@ -1057,32 +3787,39 @@ class Aplicacion(tk.Tk):
         if val_falta <= 0 and "Favor" not in texto_debe:
             messagebox.showinfo("Bien", "Esta deuda ya está pagada o tiene saldo a favor. (Puedes agregar más pago si deseas aumentar el saldo)")
 
-        popup = tk.Toplevel(self)
+        self.dialogos.abrir('pago', deuda_id, desc, val_falta, txt_sugerencia)
+
+    def construir_dialogo_pago(self, popup):
         popup.title("Ingresar Pago")
         popup.geometry("450x650") 
         popup.configure(bg="white")
+        # Datos de la deuda actual (se reemplazan en cada apertura)
+        estado = {'deuda_id': None, 'val_falta': 0.0}
         
         tk.Label(popup, text="Registrar Pago", font=FONTS['h2'], bg="white", fg=COLORS['secondary']).pack(pady=(20, 5))
-        tk.Label(popup, text=f"Item: {desc}", font=FONTS['body'], bg="white", fg="gray").pack()
+        lbl_item = tk.Label(popup, text="", font=FONTS['body'], bg="white", fg="gray")
+        lbl_item.pack()
 
         f_saldo = tk.Frame(popup, bg=COLORS['light'], padx=10, pady=10)
         f_saldo.pack(fill="x", padx=30, pady=15)
         tk.Label(f_saldo, text="Saldo Pendiente:", bg=COLORS['light'], font=FONTS['body']).pack(side="left")
-        tk.Label(f_saldo, text=f"${val_falta:,.2f}", bg=COLORS['light'], font=FONTS['h2'], fg=COLORS['danger']).pack(side="right")
+        lbl_saldo = tk.Label(f_saldo, text="", bg=COLORS['light'], font=FONTS['h2'], fg=COLORS['danger'])
+        lbl_saldo.pack(side="right")
         
-        tk.Label(popup, text=txt_sugerencia, bg="white", fg=COLORS['warning'], font=FONTS['body_bold']).pack()
+        lbl_sugerencia = tk.Label(popup, text="", bg="white", fg=COLORS['warning'], font=FONTS['body_bold'])
+        lbl_sugerencia.pack()
 
         f_int = tk.LabelFrame(popup, text="Recargo / Interés %", bg="white", font=FONTS['small'])
         f_int.pack(fill="x", padx=30, pady=10)
         
         entry_pct = tk.Entry(f_int, justify="center", width=5, bg="white", relief="solid", bd=1)
         entry_pct.pack(side="left", padx=10, pady=10, ipady=3)
-        entry_pct.insert(0, "0")
 
-        lbl_total_cobrar = tk.Label(popup, text=f"Total: ${val_falta:,.2f}", font=FONTS['h2'], bg="white", fg=COLORS['primary'])
+        lbl_total_cobrar = tk.Label(popup, text="", font=FONTS['h2'], bg="white", fg=COLORS['primary'])
         lbl_total_cobrar.pack(pady=5)
 
         def calc_total(e=None):
+            val_falta = estado['val_falta']
             try:
                 pct = float(entry_pct.get())
                 total = val_falta * (1 + pct/100)
@@ -1095,14 +3832,12 @@ class Aplicacion(tk.Tk):
         tk.Label(popup, text="Monto a Pagar ($):", bg="white", font=FONTS['body_bold']).pack(anchor="w", padx=30)
         e_pago = tk.Entry(popup, font=('Segoe UI', 14), justify="center", bg="white", relief="solid", bd=1)
         e_pago.pack(fill="x", padx=30, pady=5, ipady=5)
-        e_pago.focus()
 
         tk.Button(popup, text="▼ Pagar Totalidad", command=lambda: [e_pago.delete(0,tk.END), e_pago.insert(0, f"{calc_total():.2f}")], 
                   font=FONTS['small'], bg="white", fg=COLORS['primary'], relief="flat", cursor="hand2").pack()
 
         tk.Label(popup, text="Medio de Pago:", bg="white", font=FONTS['body_bold']).pack(anchor="w", padx=30, pady=(10,0))
         c_metodo = ttk.Combobox(popup, values=["Efectivo", "Transferencia", "Débito", "Crédito", "Cheque"], state="readonly")
-        c_metodo.current(0)
         c_metodo.pack(fill="x", padx=30, pady=5)
 
         tk.Label(popup, text="Observaciones (Nro Cheque / Nota):", bg="white", font=FONTS['body_bold']).pack(anchor="w", padx=30, pady=(10,0))
@@ -1110,34 +3845,36 @@ class Aplicacion(tk.Tk):
         e_obs.pack(fill="x", padx=30, pady=5, ipady=3)
 
         def confirmar():
+            deuda_id = estado['deuda_id']
+            val_falta = estado['val_falta']
             try:
                 monto = float(e_pago.get())
-                if monto <= 0: return
-                
-                # --- LÓGICA DE INTERÉS AGREGADA ---
-                try:
-                    pct = float(entry_pct.get())
-                except: pct = 0.0
-
-                if pct > 0:
-                    # El interés se calcula sobre lo que faltaba pagar (val_falta)
-                    # Al confirmar, SUMAMOS ese interés a la deuda original 'monto_total'
-                    # Así cuando paguen el total + interés, la cuenta da 0 y no sobra plata.
-                    interes_monto = val_falta * (pct / 100.0)
-                    if interes_monto > 0:
-                        self.db.agregar_interes_deuda(deuda_id, interes_monto)
-                # ----------------------------------
-
-                metodo_final = c_metodo.get()
-                obs = e_obs.get().strip()
-                if obs:
-                    metodo_final += f" ({obs})"
-
-                self.db.registrar_pago(deuda_id, monto, metodo_final)
-                self.actualizar_info_completa()
-                self.cargar_lista_clientes(self.entry_buscar.get())
-                popup.destroy()
-            except: messagebox.showerror("Error", "Monto inválido")
+            except ValueError:
+                messagebox.showerror("Error", "Monto inválido", parent=popup)
+                return
+            if monto <= 0: return
+
+            # --- LÓGICA DE INTERÉS AGREGADA ---
+            try:
+                pct = float(entry_pct.get())
+            except ValueError: pct = 0.0
+
+            metodo_final = c_metodo.get()
+            obs = e_obs.get().strip()
+            if obs:
+                metodo_final += f" ({obs})"
+
+            # El interés se calcula sobre lo que faltaba pagar (val_falta)
+            # Al confirmar, SUMAMOS ese interés a la deuda original 'monto_total'
+            # Así cuando paguen el total + interés, la cuenta da 0 y no sobra plata.
+            interes_monto = val_falta * (pct / 100.0) if pct > 0 else 0.0
+            # ----------------------------------
+
+            # Interés y pago se confirman juntos (o ninguno de los dos), también en modo servidor
+            self.db.registrar_pago_con_interes(deuda_id, interes_monto, monto, metodo_final)
+            self.actualizar_info_completa()
+            self.cargar_lista_clientes(self.entry_buscar.get())
+            self.dialogos.cerrar(popup)
 
         frame_btn_pago = tk.Frame(popup, bg="white")
         frame_btn_pago.pack(fill="x", pady=20, side="bottom") 
@@ -1147,13 +3884,31 @@ class Aplicacion(tk.Tk):
                   command=confirmar, cursor="hand2").pack(fill="x", padx=30, pady=10, ipady=10)
         
         popup.bind('<Return>', lambda e: confirmar())
+        return {'estado': estado, 'lbl_item': lbl_item, 'lbl_saldo': lbl_saldo, 'lbl_sugerencia': lbl_sugerencia,
+                'entry_pct': entry_pct, 'lbl_total_cobrar': lbl_total_cobrar, 'e_pago': e_pago,
+                'c_metodo': c_metodo, 'e_obs': e_obs}
+
+    def cargar_dialogo_pago(self, w, deuda_id, desc, val_falta, txt_sugerencia):
+        w['estado'].update(deuda_id=deuda_id, val_falta=val_falta)
+        w['lbl_item'].config(text=f"Item: {desc}")
+        w['lbl_saldo'].config(text=f"${val_falta:,.2f}")
+        w['lbl_sugerencia'].config(text=txt_sugerencia)
+        w['lbl_total_cobrar'].config(text=f"Total: ${val_falta:,.2f}")
+        w['entry_pct'].delete(0, tk.END)
+        w['entry_pct'].insert(0, "0")
+        w['e_pago'].delete(0, tk.END)
+        w['e_obs'].delete(0, tk.END)
+        w['c_metodo'].current(0)
+        w['e_pago'].focus()
 
     def click_usar_saldo(self):
         """Lógica para el botón USAR SALDO A FAVOR"""
-        seleccion = self.tree_detalle.selection()
+        seleccion = self.tree_detalle.selection()[:1]
         if not seleccion:
             messagebox.showinfo("Atención", "Selecciona a qué deuda (ROJA/PENDIENTE) quieres aplicarle el saldo.")
             return
+        if self.hay_archivadas(seleccion):
+            return
         
         deuda_id = self.tree_detalle.item(seleccion, "tags")[1]
         item = self.tree_detalle.item(seleccion)
@@ -1177,12 +3932,102 @@ class Aplicacion(tk.Tk):
     def eliminar_error(self):
         seleccion = self.tree_detalle.selection()
         if not seleccion: return
-        if messagebox.askyesno("Confirmar", "¿Eliminar este registro permanentemente?\nEsto afectará el saldo total."):
-            tags = self.tree_detalle.item(seleccion, "tags")
-            self.db.borrar_deuda_permanentemente(tags[1])
+        if len(seleccion) == 1:
+            pregunta = "¿Eliminar este registro permanentemente?\nEsto afectará el saldo total."
+        else:
+            pregunta = f"¿Eliminar los {len(seleccion)} registros seleccionados permanentemente?\nEsto afectará el saldo total."
+        if messagebox.askyesno("Confirmar", pregunta):
+            ids = [self.tree_detalle.item(item, "tags")[1] for item in seleccion]
+            self.db.borrar_deudas_permanentemente(ids)
             self.actualizar_info_completa()
             self.cargar_lista_clientes(self.entry_buscar.get())
 
+    def abrir_ventana_pago_multiple(self, seleccion):
+        ids = [self.tree_detalle.item(item, "tags")[1] for item in seleccion]
+        total_debe = 0.0
+        for item in seleccion:
+            texto_debe = str(self.tree_detalle.item(item)['values'][3])
+            if "Favor" not in texto_debe:
+                try: total_debe += float(texto_debe.replace('$', '').replace(',', ''))
+                except ValueError: pass
+
+        self.dialogos.abrir('pago_multiple', ids, total_debe)
+
+    def construir_dialogo_pago_multiple(self, popup):
+        popup.title("Pagar Varias Deudas")
+        popup.geometry("450x480")
+        popup.configure(bg="white")
+        # Deudas elegidas (se reemplazan en cada apertura)
+        estado = {'ids': []}
+
+        tk.Label(popup, text="Pago en Lote", font=FONTS['h2'], bg="white", fg=COLORS['secondary']).pack(pady=(20, 5))
+        lbl_cantidad = tk.Label(popup, text="", font=FONTS['body'], bg="white", fg="gray")
+        lbl_cantidad.pack()
+
+        f_saldo = tk.Frame(popup, bg=COLORS['light'], padx=10, pady=10)
+        f_saldo.pack(fill="x", padx=30, pady=15)
+        tk.Label(f_saldo, text="Saldo Pendiente:", bg=COLORS['light'], font=FONTS['body']).pack(side="left")
+        lbl_saldo = tk.Label(f_saldo, text="", bg=COLORS['light'], font=FONTS['h2'], fg=COLORS['danger'])
+        lbl_saldo.pack(side="right")
+
+        tk.Label(popup, text="Monto a Pagar ($):", bg="white", font=FONTS['body_bold']).pack(anchor="w", padx=30)
+        e_pago = tk.Entry(popup, font=('Segoe UI', 14), justify="center", bg="white", relief="solid", bd=1)
+        e_pago.pack(fill="x", padx=30, pady=5, ipady=5)
+
+        tk.Label(popup, text="Repartir el pago:", bg="white", font=FONTS['body_bold']).pack(anchor="w", padx=30, pady=(10,0))
+        c_orden = ttk.Combobox(popup, values=list(BaseDeDatos.ORDENES_REPARTO), state="readonly")
+        c_orden.pack(fill="x", padx=30, pady=5)
+
+        tk.Label(popup, text="Medio de Pago:", bg="white", font=FONTS['body_bold']).pack(anchor="w", padx=30, pady=(10,0))
+        c_metodo = ttk.Combobox(popup, values=["Efectivo", "Transferencia", "Débito", "Crédito", "Cheque"], state="readonly")
+        c_metodo.pack(fill="x", padx=30, pady=5)
+
+        tk.Label(popup, text="Observaciones (Nro Cheque / Nota):", bg="white", font=FONTS['body_bold']).pack(anchor="w", padx=30, pady=(10,0))
+        e_obs = tk.Entry(popup, font=FONTS['body'], bg="white", relief="solid", bd=1)
+        e_obs.pack(fill="x", padx=30, pady=5, ipady=3)
+
+        def confirmar():
+            try:
+                monto = float(e_pago.get())
+            except ValueError:
+                messagebox.showerror("Error", "Monto inválido", parent=popup)
+                return
+            if monto <= 0: return
+
+            metodo_final = c_metodo.get()
+            obs = e_obs.get().strip()
+            if obs:
+                metodo_final += f" ({obs})"
+
+            self.db.registrar_pago_multiple(estado['ids'], monto, metodo_final, c_orden.get())
+            self.actualizar_info_completa()
+            self.cargar_lista_clientes(self.entry_buscar.get())
+            self.dialogos.cerrar(popup)
+
+        tk.Button(popup, text="CONFIRMAR PAGO", bg=COLORS['success'], fg="white", 
+                  font=FONTS['body_bold'], relief="raised", bd=2,
+                  command=confirmar, cursor="hand2").pack(fill="x", padx=30, pady=20, ipady=10, side="bottom")
+        popup.bind('<Return>', lambda e: confirmar())
+        return {'estado': estado, 'lbl_cantidad': lbl_cantidad, 'lbl_saldo': lbl_saldo,
+                'e_pago': e_pago, 'c_orden': c_orden, 'c_metodo': c_metodo, 'e_obs': e_obs}
+
+    def cargar_dialogo_pago_multiple(self, w, ids, total_debe):
+        w['estado']['ids'] = ids
+        w['lbl_cantidad'].config(text=f"{len(ids)} deudas seleccionadas")
+        w['lbl_saldo'].config(text=f"${total_debe:,.2f}")
+        w['e_pago'].delete(0, tk.END)
+        w['e_pago'].insert(0, f"{total_debe:.2f}")
+        w['e_pago'].focus()
+        w['e_pago'].select_range(0, tk.END)
+        w['c_orden'].current(0)
+        w['c_metodo'].current(0)
+        w['e_obs'].delete(0, tk.END)
+
 if __name__ == "__main__":
-    app = Aplicacion()
+    db = None
+    # Uso: app.py --servidor http://IP:8765  (conectarse a un servidor.py en lugar de la base local)
+    if "--servidor" in sys.argv:
+        from servidor import BaseDeDatosRemota
+        db = BaseDeDatosRemota(sys.argv[sys.argv.index("--servidor") + 1])
+    app = Aplicacion(db)
     app.mainloop()
\ No newline at end of file
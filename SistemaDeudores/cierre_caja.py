@@ -0,0 +1,89 @@
+import sys
+import time
+import argparse
+from datetime import date, datetime, timedelta
+
+# ==========================================
+# CIERRE DE CAJA
+# ==========================================
+# Totales cobrados por método (sin SALDO A FAVOR) y la lista de movimientos
+# de un día o de cualquier rango de fechas y horas. Lee solo el rango pedido
+# con el índice por fecha de pagos_detalle, así que tarda lo mismo el día 1
+# que a fin de mes.
+#
+# Uso:
+#   python cierre_caja.py                                -> hoy
+#   python cierre_caja.py --fecha 2026-10-18             -> otro día
+#   python cierre_caja.py --desde 08:00 --hasta 13:00    -> un turno
+#   python cierre_caja.py --fecha 2026-10-01 --hasta-fecha 2026-10-15 --sin-detalle
+
+
+def rango_caja(fecha=None, hora_desde="00:00", hora_hasta="23:59", fecha_hasta=None):
+    """
+    Convierte día(s) y horas en el rango [desde, hasta) que usan las consultas de caja.
+    fecha / fecha_hasta: date o 'YYYY-MM-DD' (por defecto hoy / el mismo día).
+    La hora 'hora_hasta' queda incluida. Lanza ValueError si algo no es válido.
+    """
+    if fecha is None:
+        fecha = date.today()
+    elif isinstance(fecha, str):
+        fecha = date.fromisoformat(fecha)
+    if fecha_hasta is None:
+        fecha_hasta = fecha
+    elif isinstance(fecha_hasta, str):
+        fecha_hasta = date.fromisoformat(fecha_hasta)
+
+    inicio = datetime.combine(fecha, datetime.strptime(hora_desde, "%H:%M").time())
+    # Las fechas se guardan al minuto: el fin exclusivo es el minuto siguiente
+    fin = datetime.combine(fecha_hasta, datetime.strptime(hora_hasta, "%H:%M").time()) + timedelta(minutes=1)
+    if fin <= inicio:
+        raise ValueError("El fin del rango es anterior al inicio")
+    return inicio.strftime("%Y-%m-%d %H:%M"), fin.strftime("%Y-%m-%d %H:%M")
+
+
+def imprimir_cierre(db, desde, hasta, detalle=True):
+    """Imprime totales por método y (opcional) los movimientos. Retorna el total cobrado."""
+    totales = db.obtener_cierre_caja(desde, hasta)
+    if detalle:
+        for fecha, pago_id, monto, metodo, cliente, descripcion in db.obtener_movimientos_caja(desde, hasta):
+            print(f"{fecha}  #{pago_id:<7} {(cliente or '-')[:28]:<28} {(descripcion or '-')[:24]:<24} "
+                  f"{metodo[:22]:<22} ${monto:>12,.2f}")
+        print("-" * 100)
+    for metodo, cantidad, total in totales:
+        print(f"{metodo:<30} {cantidad:>5} cobros   ${total:>14,.2f}")
+    total = sum(t for _, _, t in totales)
+    print(f"{'TOTAL':<30} {sum(c for _, c, _ in totales):>5} cobros   ${total:>14,.2f}")
+    return total
+
+
+# ==========================================
+# LÍNEA DE COMANDOS
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cierre de caja de la base del taller")
+    parser.add_argument("--db", default="taller_repuestos_final.db")
+    parser.add_argument("--fecha", default=None, help="Día (YYYY-MM-DD), por defecto hoy")
+    parser.add_argument("--hasta-fecha", default=None, help="Último día del rango (YYYY-MM-DD)")
+    parser.add_argument("--desde", default="00:00", help="Hora de inicio (HH:MM)")
+    parser.add_argument("--hasta", default="23:59", help="Hora de fin, incluida (HH:MM)")
+    parser.add_argument("--sin-detalle", action="store_true", help="Solo los totales por método")
+    args = parser.parse_args(argv)
+
+    try:
+        desde, hasta = rango_caja(args.fecha, args.desde, args.hasta, args.hasta_fecha)
+    except ValueError as e:
+        parser.error(f"Rango inválido: {e}")
+
+    from app import BaseDeDatos
+    db = BaseDeDatos(args.db)
+
+    inicio = time.perf_counter()
+    print(f"Cierre de caja desde {desde} hasta {hasta} (excluido)")
+    print("=" * 100)
+    imprimir_cierre(db, desde, hasta, detalle=not args.sin_detalle)
+    print(f"Calculado en {time.perf_counter() - inicio:.3f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+import re
+import sys
+import time
+import argparse
+import functools
+import unicodedata
+from itertools import combinations
+from difflib import SequenceMatcher
+
+# ==========================================
+# DETECCIÓN DE CLIENTES DUPLICADOS
+# ==========================================
+# Comparar todos contra todos es O(n²). En su lugar, cada cliente genera
+# unas pocas "claves de bloque" y solo se comparan los clientes que
+# comparten alguna:
+#   - DNI normalizado (solo dígitos)
+#   - tokens del nombre ordenados ("Gómez Juan" == "Juan Gomez")
+#   - cada par de claves fonéticas del nombre ("Juan Gomes" y "Gómez Juan"
+#     comparten el par jn+gms); con una sola palabra, su clave + localidad
+# En los bloques grandes (nombres muy comunes) no se comparan todos los
+# pares: se ordenan por fonética y nombre, y cada uno se compara solo con sus vecinos
+# más cercanos, así el costo sigue siendo casi lineal.
+#
+# Uso:
+#   python duplicados.py                  -> lista los grupos sospechosos
+#   python duplicados.py --umbral 0.9
+
+UMBRAL = 0.85       # Puntaje mínimo para considerar dos clientes duplicados
+MAX_BLOQUE = 20     # Hasta este tamaño se comparan todos los pares del bloque
+VENTANA = 5         # En bloques más grandes, vecinos (por orden alfabético) a comparar
+FACTOR_DNI_DISTINTO = 0.6
+EXTRA_LOCALIDAD = 0.03
+PALABRAS_VACIAS = {'de', 'del', 'la', 'las', 'los', 'y', 'e', 'el', 'sr', 'sra'}
+
+
+# ==========================================
+# NORMALIZACIÓN Y CLAVES
+# ==========================================
+def sin_acentos(texto):
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+
+def tokens_nombre(nombre):
+    """'Gómez, Juan  de la Cruz' -> ['gomez', 'juan', 'cruz']"""
+    limpio = re.sub(r"[^a-z0-9 ]", " ", sin_acentos((nombre or "").lower()))
+    return [t for t in limpio.split() if t not in PALABRAS_VACIAS]
+
+
+def solo_digitos(dni):
+    return re.sub(r"\D", "", dni or "")
+
+
+# Reemplazos fonéticos del castellano rioplatense, en orden
+_FONETICA = [(re.compile(patron), reemplazo) for patron, reemplazo in (
+    (r"ch", "x"), (r"ll", "y"), (r"qu", "k"), (r"c(?=[ei])", "s"), (r"c", "k"),
+    (r"g(?=[ei])", "j"), (r"gu(?=[ei])", "g"), (r"z", "s"), (r"v", "b"), (r"w", "u"),
+    (r"h", ""), (r"y$", "i"), (r"(.)\1+", r"\1"),
+)]
+_VOCALES = re.compile(r"[aeiou]")
+
+
+@functools.lru_cache(maxsize=20000)
+def clave_fonetica(token):
+    """
+    Clave fonética simple para nombres en castellano:
+    'Gomez'/'Gómes' -> 'gms', 'Vazquez'/'Basques' -> 'bsks'.
+    Se conserva la primera letra ya transformada y luego solo consonantes.
+    """
+    t = token
+    for patron, reemplazo in _FONETICA:
+        t = patron.sub(reemplazo, t)
+    if not t:
+        return ""
+    return t[0] + _VOCALES.sub("", t[1:])
+
+
+class Registro:
+    __slots__ = ('id', 'dni', 'nombre', 'localidad', 'saldo', 'tokens', 'orden', 'foneticos', 'dni_norm')
+
+    def __init__(self, fila):
+        self.id, self.dni, self.nombre, self.localidad, self.saldo = fila
+        self.tokens = tokens_nombre(self.nombre)
+        self.orden = " ".join(sorted(self.tokens))
+        self.foneticos = sorted({clave_fonetica(t) for t in self.tokens if len(t) > 1} - {""})
+        self.dni_norm = solo_digitos(self.dni)
+
+    def claves_bloque(self):
+        if len(self.dni_norm) >= 6:
+            yield ('dni', self.dni_norm)
+        if self.tokens:
+            yield ('nombre', self.orden)
+        if len(self.foneticos) >= 2:
+            for par in combinations(self.foneticos, 2):
+                yield ('fon',) + par
+        elif self.foneticos:
+            yield ('fon', self.foneticos[0], " ".join(tokens_nombre(self.localidad)))
+
+
+# ==========================================
+# PUNTAJE
+# ==========================================
+def similitud(a, b, umbral=0.0):
+    """
+    Entre 0 y 1. Combina texto (sin importar el orden de las palabras), fonética y DNI.
+    Si se indica 'umbral', la comparación de texto (la parte cara) se saltea
+    cuando ya se sabe que no puede alcanzarlo.
+    """
+    if a.dni_norm and a.dni_norm == b.dni_norm:
+        return 1.0
+    # Dos DNI distintos: casi seguro son personas distintas con nombre parecido
+    factor = FACTOR_DNI_DISTINTO if a.dni_norm and b.dni_norm else 1.0
+    extra = EXTRA_LOCALIDAD if a.localidad and a.localidad == b.localidad else 0.0
+
+    fa, fb = set(a.foneticos), set(b.foneticos)
+    puntaje = (len(fa & fb) / len(fa | fb) if fa and fb else 0.0) * 0.95
+
+    necesario = (umbral - extra) / factor
+    if puntaje < necesario <= 1.0 or not umbral:
+        comparador = SequenceMatcher(None, a.orden, b.orden)
+        # real_quick_ratio y quick_ratio son cotas superiores baratas de ratio()
+        if comparador.real_quick_ratio() >= necesario and comparador.quick_ratio() >= necesario:
+            puntaje = max(puntaje, comparador.ratio())
+    return min(puntaje * factor + extra, 1.0)
+
+
+# ==========================================
+# BÚSQUEDA
+# ==========================================
+def pares_del_bloque(miembros, registros, max_bloque=MAX_BLOQUE, ventana=VENTANA):
+    """Todos los pares si el bloque es chico; si no, solo vecinos (por fonética y nombre)."""
+    if len(miembros) <= max_bloque:
+        return combinations(miembros, 2)
+    ordenados = sorted(miembros, key=lambda i: (registros[i].foneticos, registros[i].orden))
+    return ((ordenados[x], ordenados[y])
+            for x in range(len(ordenados))
+            for y in range(x + 1, min(x + 1 + ventana, len(ordenados))))
+
+
+def buscar_duplicados(clientes, umbral=UMBRAL, max_bloque=MAX_BLOQUE):
+    """
+    clientes: filas (id, dni, nombre, localidad, saldo) como las de obtener_clientes_con_saldo.
+    Retorna una lista de grupos, cada uno [(puntaje, fila), ...] con el cliente
+    sugerido para conservar primero. Ordenado por puntaje del grupo.
+    """
+    registros = [Registro(f) for f in clientes]
+
+    bloques = {}
+    for i, r in enumerate(registros):
+        for clave in r.claves_bloque():
+            bloques.setdefault(clave, []).append(i)
+
+    # Cada par se compara una sola vez aunque comparta varios bloques
+    comparados = set()
+    # Con DNI distintos el puntaje no puede pasar de esto: si no alcanza, ni se comparan
+    saltear_dni_distinto = FACTOR_DNI_DISTINTO + EXTRA_LOCALIDAD < umbral
+    padre = list(range(len(registros)))
+    dnis = [{r.dni_norm} - {""} for r in registros]  # DNI presentes en cada grupo (por raíz)
+    mejor = {}
+
+    def raiz(i):
+        while padre[i] != i:
+            padre[i] = padre[padre[i]]
+            i = padre[i]
+        return i
+
+    for miembros in bloques.values():
+        if len(miembros) < 2:
+            continue
+        for par in pares_del_bloque(miembros, registros, max_bloque):
+            par = (min(par), max(par))
+            if par in comparados:
+                continue
+            comparados.add(par)
+            a, b = registros[par[0]], registros[par[1]]
+            if saltear_dni_distinto and a.dni_norm and b.dni_norm and a.dni_norm != b.dni_norm:
+                continue
+            puntaje = similitud(a, b, umbral)
+            if puntaje >= umbral:
+                ra, rb = raiz(par[0]), raiz(par[1])
+                if ra != rb:
+                    # Un cliente sin DNI no puede unir dos grupos con DNI distintos
+                    if len(dnis[ra] | dnis[rb]) > 1:
+                        continue
+                    padre[ra] = rb
+                    dnis[rb] |= dnis[ra]
+                for i in par:
+                    mejor[i] = max(mejor.get(i, 0), puntaje)
+
+    grupos = {}
+    for i in mejor:
+        grupos.setdefault(raiz(i), []).append(i)
+
+    resultado = []
+    for indices in grupos.values():
+        # Conservamos el que tiene DNI y, entre esos, el de mayor saldo (más historia)
+        indices.sort(key=lambda i: (not registros[i].dni_norm, -abs(registros[i].saldo or 0), registros[i].id))
+        resultado.append([(mejor[i], clientes[i]) for i in indices])
+    resultado.sort(key=lambda g: -max(p for p, _ in g))
+    return resultado
+
+
+# ==========================================
+# LÍNEA DE COMANDOS
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Busca clientes duplicados en la base del taller")
+    parser.add_argument("--db", default="taller_repuestos_final.db")
+    parser.add_argument("--umbral", type=float, default=UMBRAL)
+    args = parser.parse_args(argv)
+
+    from app import BaseDeDatos
+    db = BaseDeDatos(args.db)
+
+    inicio = time.perf_counter()
+    clientes = db.obtener_clientes_con_saldo()
+    grupos = buscar_duplicados(clientes, args.umbral)
+    for grupo in grupos:
+        for n, (puntaje, (cid, dni, nombre, localidad, saldo)) in enumerate(grupo):
+            marca = "*" if n == 0 else " "
+            print(f"{marca} #{cid:<6} {dni or '-':<12} {nombre:<30} {localidad or '-':<14} ${saldo:>10,.2f}  {puntaje:.2f}")
+        print("-" * 60)
+    print(f"{len(grupos)} grupos sospechosos entre {len(clientes)} clientes ({time.perf_counter() - inicio:.2f}s)")
+    print("* = cliente sugerido para conservar (fusionar desde la aplicación)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
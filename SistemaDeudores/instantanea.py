@@ -0,0 +1,311 @@
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import bisect
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+# ==========================================
+# INSTANTÁNEA PARA ANÁLISIS (ARCHIVO COLUMNAR)
+# ==========================================
+# Copia clientes, deudas y pagos_detalle (con lo archivado) a un archivo
+# de solo lectura, guardado por columnas: cada columna es un array de ancho
+# fijo (enteros, reales, fechas en minutos) y los textos se guardan como
+# códigos int32 más un diccionario ordenado de valores. El lector mapea el
+# archivo en memoria: abrirlo solo lee la cabecera y cada columna es un
+# array de NumPy sobre el mapa, sin copiar nada. Así las planillas y los
+# scripts de análisis no tocan la base del mostrador.
+#
+# Formato: MAGICO | largo del manifiesto (uint32) | manifiesto JSON | bloques
+# alineados a ALINEACION bytes. Los desplazamientos del manifiesto se
+# cuentan desde el primer bloque.
+#
+# Uso:
+#   python instantanea.py exportar                       -> taller_repuestos_final_instantanea.bin
+#   python instantanea.py exportar --salida analisis.bin
+#   python instantanea.py ver analisis.bin               -> tablas, columnas y un resumen
+#
+# Desde un script:
+#   with Instantanea("analisis.bin") as inst:
+#       pagos = inst['pagos_detalle']
+#       efectivo = pagos['metodo'] == pagos.codigo('metodo', 'Efectivo')
+#       print(pagos['monto'][efectivo].sum())
+
+MAGICO = b"SDINST01"
+CABECERA = "<8sI"
+VERSION_FORMATO = 1
+ALINEACION = 64
+
+NULO_ENTERO = -1                            # ids y códigos de texto faltantes
+NULO_FECHA = np.iinfo(np.int64).min         # NaT al verlo como datetime64
+
+# Tipo de cada columna -> dtype en el archivo
+TIPOS = {
+    'entero': '<i8',
+    'real': '<f8',
+    'fecha': '<i8',     # minutos desde 1970, se lee como datetime64[m]
+    'bandera': '|b1',
+    'texto': '<i4',     # código en el diccionario de la columna
+}
+
+# Columnas de cada tabla, en el orden de BaseDeDatos.obtener_datos_instantanea
+TABLAS = {
+    'clientes': (
+        ('id', 'entero'), ('dni', 'texto'), ('nombre', 'texto'), ('telefono', 'texto'), ('localidad', 'texto'),
+    ),
+    'deudas': (
+        ('id', 'entero'), ('cliente_id', 'entero'), ('monto_total', 'real'), ('monto_pagado', 'real'),
+        ('descripcion', 'texto'), ('estado', 'texto'), ('fecha_creacion', 'fecha'), ('fecha_pago', 'fecha'),
+        ('metodo_pago', 'texto'), ('archivada', 'bandera'),
+    ),
+    'pagos_detalle': (
+        ('id', 'entero'), ('deuda_id', 'entero'), ('cliente_id', 'entero'), ('monto', 'real'),
+        ('fecha', 'fecha'), ('metodo', 'texto'), ('archivado', 'bandera'),
+    ),
+}
+
+
+def alinear(posicion):
+    return -(-posicion // ALINEACION) * ALINEACION
+
+
+# ==========================================
+# EXPORTACIÓN
+# ==========================================
+def codificar_columna(valores, tipo):
+    """Retorna los bloques de una columna: [array] o [códigos, desplazamientos, datos] si es texto."""
+    n = len(valores)
+    if tipo == 'real':
+        # None -> NaN
+        return [np.array(valores, dtype=TIPOS[tipo]).reshape(n)]
+    if tipo == 'bandera':
+        return [np.array(valores, dtype=TIPOS[tipo]).reshape(n)]
+    if tipo in ('entero', 'fecha'):
+        nulo = NULO_FECHA if tipo == 'fecha' else NULO_ENTERO
+        return [np.fromiter((nulo if v is None else v for v in valores), dtype=TIPOS[tipo], count=n)]
+
+    # Texto: diccionario ordenado, así los códigos respetan el orden alfabético
+    diccionario = sorted({v for v in valores if v is not None})
+    indice = {v: i for i, v in enumerate(diccionario)}
+    codigos = np.fromiter((indice.get(v, NULO_ENTERO) for v in valores), dtype=TIPOS[tipo], count=n)
+    codificados = [v.encode("utf-8") for v in diccionario]
+    desplazamientos = np.zeros(len(codificados) + 1, dtype='<i8')
+    np.cumsum([len(c) for c in codificados], out=desplazamientos[1:])
+    return [codigos, desplazamientos, np.frombuffer(b"".join(codificados), dtype='|u1')]
+
+
+def exportar_instantanea(db, ruta):
+    """
+    Escribe la instantánea de la base en 'ruta'. Se escribe a un temporal y se
+    reemplaza al final, así un lector nunca ve un archivo a medio escribir.
+    Retorna el manifiesto.
+    """
+    version, datos = db.obtener_datos_instantanea()
+
+    bloques = []
+    posicion = 0
+
+    def agregar(array):
+        nonlocal posicion
+        bloques.append((posicion, array))
+        descripcion = {'desplazamiento': posicion, 'cantidad': len(array)}
+        posicion = alinear(posicion + array.nbytes)
+        return descripcion
+
+    manifiesto = {
+        'formato': VERSION_FORMATO,
+        'creada': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'base': os.path.abspath(db.db_name),
+        'version': version,
+        'archivo_hasta': db.archivo_hasta,
+        'tablas': {},
+    }
+    for tabla, columnas in TABLAS.items():
+        filas = datos[tabla]
+        valores = list(zip(*filas)) if filas else [()] * len(columnas)
+        descripciones = []
+        for (nombre, tipo), columna in zip(columnas, valores):
+            partes = [agregar(a) for a in codificar_columna(columna, tipo)]
+            descripcion = {'nombre': nombre, 'tipo': tipo, 'datos': partes[0]}
+            if tipo == 'texto':
+                descripcion['diccionario'] = {'desplazamientos': partes[1], 'bytes': partes[2]}
+            descripciones.append(descripcion)
+        manifiesto['tablas'][tabla] = {'filas': len(filas), 'columnas': descripciones}
+
+    encabezado = json.dumps(manifiesto, ensure_ascii=False).encode("utf-8")
+    inicio = alinear(struct.calcsize(CABECERA) + len(encabezado))
+    tmp = ruta + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(struct.pack(CABECERA, MAGICO, len(encabezado)))
+            f.write(encabezado)
+            for desplazamiento, array in bloques:
+                f.seek(inicio + desplazamiento)
+                f.write(array.tobytes())
+            f.truncate(inicio + posicion)
+        os.replace(tmp, ruta)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return manifiesto
+
+
+# ==========================================
+# LECTURA
+# ==========================================
+class Tabla:
+    """
+    Columnas de una tabla de la instantánea. tabla['col'] es un array de solo
+    lectura sobre el archivo mapeado (códigos int32 si la columna es texto).
+    """
+    def __init__(self, instantanea, descripcion):
+        self.instantanea = instantanea
+        self.filas = descripcion['filas']
+        self.descripciones = {c['nombre']: c for c in descripcion['columnas']}
+        self.diccionarios = {}
+
+    @property
+    def columnas(self):
+        return list(self.descripciones)
+
+    def tipo(self, nombre):
+        return self.descripciones[nombre]['tipo']
+
+    def __getitem__(self, nombre):
+        c = self.descripciones[nombre]
+        array = self.instantanea.bloque(c['datos'], TIPOS[c['tipo']])
+        if c['tipo'] == 'fecha':
+            return array.view('datetime64[m]')
+        return array
+
+    def diccionario(self, nombre):
+        """Valores distintos de una columna de texto, ordenados (el código es la posición)."""
+        if nombre not in self.diccionarios:
+            d = self.descripciones[nombre]['diccionario']
+            desplazamientos = self.instantanea.bloque(d['desplazamientos'], '<i8').tolist()
+            datos = self.instantanea.bloque(d['bytes'], '|u1').tobytes()
+            self.diccionarios[nombre] = [datos[a:b].decode("utf-8")
+                                         for a, b in zip(desplazamientos, desplazamientos[1:])]
+        return self.diccionarios[nombre]
+
+    def codigo(self, nombre, valor):
+        """Código de 'valor' en la columna, o NULO_ENTERO si no aparece (para filtrar con ==)."""
+        diccionario = self.diccionario(nombre)
+        i = bisect.bisect_left(diccionario, valor)
+        return i if i < len(diccionario) and diccionario[i] == valor else NULO_ENTERO
+
+    def texto(self, nombre, codigos=None):
+        """Decodifica códigos (por defecto toda la columna) a un array de str; los nulos quedan en None."""
+        if codigos is None:
+            codigos = self[nombre]
+        # El último lugar es el None: los códigos -1 caen ahí
+        return np.array(self.diccionario(nombre) + [None], dtype=object)[codigos]
+
+
+class Instantanea:
+    """Abre un archivo de exportar_instantanea. Abrirlo solo lee el manifiesto."""
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(ruta, "rb") as f:
+            self.mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magico, largo = struct.unpack_from(CABECERA, self.mapa, 0)
+            if magico != MAGICO:
+                raise ValueError(f"{ruta} no es una instantánea del sistema")
+            principio = struct.calcsize(CABECERA)
+            self.manifiesto = json.loads(self.mapa[principio:principio + largo].decode("utf-8"))
+            if self.manifiesto['formato'] != VERSION_FORMATO:
+                raise ValueError(f"Formato de instantánea {self.manifiesto['formato']} no soportado")
+        except Exception:
+            self.mapa.close()
+            raise
+        self.inicio = alinear(principio + largo)
+        self.tablas = {nombre: Tabla(self, d) for nombre, d in self.manifiesto['tablas'].items()}
+
+    def bloque(self, descripcion, dtype):
+        return np.frombuffer(self.mapa, dtype=dtype, count=descripcion['cantidad'],
+                             offset=self.inicio + descripcion['desplazamiento'])
+
+    def __getitem__(self, tabla):
+        return self.tablas[tabla]
+
+    def cerrar(self):
+        try:
+            self.mapa.close()
+        except BufferError:
+            # Todavía hay arrays en uso apuntando al mapa: se libera cuando se descarten
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+# ==========================================
+# RESUMEN
+# ==========================================
+def imprimir_resumen(inst):
+    m = inst.manifiesto
+    print(f"Instantánea de {m['base']} creada el {m['creada']} (versión {m['version']})")
+    for nombre, tabla in inst.tablas.items():
+        print(f"  {nombre:<14} {tabla.filas:>9} filas   {', '.join(tabla.columnas)}")
+
+    deudas = inst['deudas']
+    saldo = deudas['monto_total'] - deudas['monto_pagado']
+    print(f"Saldo pendiente: ${saldo[saldo > 0.009].sum():,.2f} "
+          f"en {np.count_nonzero(saldo > 0.009)} deudas")
+
+    pagos = inst['pagos_detalle']
+    metodos = pagos.diccionario('metodo')
+    codigos = pagos['metodo']
+    cobros = (codigos >= 0) & (codigos != pagos.codigo('metodo', 'SALDO A FAVOR'))
+    totales = np.bincount(codigos[cobros], weights=pagos['monto'][cobros], minlength=len(metodos))
+    print("Cobrado por método:")
+    for i in np.argsort(-totales)[:10]:
+        if totales[i]:
+            print(f"  {metodos[i][:30]:<30} ${totales[i]:>14,.2f}")
+
+
+# ==========================================
+# LÍNEA DE COMANDOS
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Instantánea columnar de la base del taller para análisis")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_exp = sub.add_parser("exportar")
+    p_exp.add_argument("--db", default="taller_repuestos_final.db")
+    p_exp.add_argument("--salida", default=None, help="Archivo a escribir (por defecto junto a la base)")
+    p_ver = sub.add_parser("ver")
+    p_ver.add_argument("archivo")
+    args = parser.parse_args(argv)
+
+    if args.comando == "exportar":
+        from app import BaseDeDatos
+        db = BaseDeDatos(args.db, tamanio_cache=0)
+        salida = args.salida or f"{os.path.splitext(args.db)[0]}_instantanea.bin"
+        inicio = time.perf_counter()
+        manifiesto = exportar_instantanea(db, salida)
+        filas = ", ".join(f"{t['filas']} {nombre}" for nombre, t in manifiesto['tablas'].items())
+        print(f"Exportado {salida} ({os.path.getsize(salida) / 1e6:.1f} MB): {filas} "
+              f"en {time.perf_counter() - inicio:.2f}s")
+    elif args.comando == "ver":
+        inicio = time.perf_counter()
+        try:
+            inst = Instantanea(args.archivo)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        with inst:
+            print(f"Abierta en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+            imprimir_resumen(inst)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
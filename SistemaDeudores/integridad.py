@@ -0,0 +1,67 @@
+import sys
+import time
+import argparse
+
+# ==========================================
+# VERIFICADOR DEL LIBRO DE DEUDAS
+# ==========================================
+# Uso:
+#   python integridad.py                 -> informe de discrepancias
+#   python integridad.py --reparar       -> informe + reparación (pide confirmación)
+#   python integridad.py --reparar --si  -> sin confirmación
+# Sale con 0 si no hay discrepancias o si se repararon, 1 si quedan sin reparar.
+
+
+def imprimir_informe(db, limite_por_tipo=50):
+    """Imprime las discrepancias a medida que salen y retorna {tipo: cantidad}."""
+    conteo = {}
+    for tipo, id_, detalle in db.verificar_libro():
+        conteo[tipo] = conteo.get(tipo, 0) + 1
+        if conteo[tipo] <= limite_por_tipo:
+            print(f"{tipo:<20} #{id_:<8} {detalle}")
+        elif conteo[tipo] == limite_por_tipo + 1:
+            print(f"{tipo:<20} ... (se omiten el resto)")
+    return conteo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica deudas, pagos y estados de la base del taller")
+    parser.add_argument("--db", default="taller_repuestos_final.db")
+    parser.add_argument("--limite", type=int, default=50, help="Máximo de filas a mostrar por tipo")
+    parser.add_argument("--reparar", action="store_true", help="Corregir lo reparable en una transacción")
+    parser.add_argument("--si", action="store_true", help="No pedir confirmación")
+    args = parser.parse_args(argv)
+
+    from app import BaseDeDatos
+    db = BaseDeDatos(args.db)
+
+    inicio = time.perf_counter()
+    conteo = imprimir_informe(db, args.limite)
+    print("-" * 60)
+    if not conteo:
+        print(f"Sin discrepancias ({time.perf_counter() - inicio:.2f}s)")
+        return 0
+    for tipo, cantidad in sorted(conteo.items()):
+        print(f"{tipo:<20} {cantidad}")
+    print(f"Verificación completa en {time.perf_counter() - inicio:.2f}s")
+
+    if args.reparar:
+        if not args.si and input("¿Reparar estados y pagados desfasados? (s/N): ").strip().lower() != "s":
+            return 1
+        pagados, estados = db.reparar_libro()
+        print(f"Reparado: {pagados} montos pagados, {estados} estados.")
+        # reparar_libro solo corrige estados y pagados: lo demás queda para revisar a mano
+        pendientes = {}
+        for tipo, _, _ in db.verificar_libro():
+            pendientes[tipo] = pendientes.get(tipo, 0) + 1
+        if pendientes:
+            print("Quedan sin reparar:")
+            for tipo, cantidad in sorted(pendientes.items()):
+                print(f"{tipo:<20} {cantidad}")
+            return 1
+        return 0
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import sys
+import argparse
+
+# ==========================================
+# MANTENIMIENTO PESADO DE LA BASE
+# ==========================================
+# Lo que la aplicación no hace sola porque toma la base entera: pasar a
+# auto_vacuum incremental (un VACUUM completo, una sola vez) y un ANALYZE
+# exacto. Correr con las demás PCs cerradas, p. ej. al cierre del día.
+#
+# Uso:
+#   python mantenimiento.py --convertir-vacuum
+#   python mantenimiento.py --analyze
+#   python mantenimiento.py --log 20        -> últimas tareas registradas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mantenimiento pesado de la base del taller")
+    parser.add_argument("--db", default="taller_repuestos_final.db")
+    parser.add_argument("--convertir-vacuum", action="store_true",
+                        help="Pasar a auto_vacuum incremental (reescribe la base entera)")
+    parser.add_argument("--analyze", action="store_true", help="ANALYZE completo, sin límite de filas")
+    parser.add_argument("--log", type=int, default=0, metavar="N", help="Mostrar las últimas N tareas")
+    args = parser.parse_args(argv)
+    if not (args.convertir_vacuum or args.analyze or args.log):
+        parser.error("indicar --convertir-vacuum, --analyze o --log")
+
+    import sqlite3
+    from app import BaseDeDatos
+    db = BaseDeDatos(args.db)
+
+    try:
+        if args.convertir_vacuum:
+            paginas = db.convertir_auto_vacuum_incremental()
+            print(f"Convertida a auto_vacuum incremental ({paginas} páginas)." if paginas
+                  else "La base ya usa auto_vacuum incremental.")
+        if args.analyze:
+            db.analizar_completo()
+            print("Estadísticas actualizadas.")
+    except sqlite3.OperationalError as e:
+        print(f"No se pudo completar ({e}). ¿Hay otra PC usando la base?")
+        return 1
+
+    for fecha, tarea, duracion_ms, detalle in db.obtener_log_mantenimiento(args.log) if args.log else []:
+        print(f"{fecha}  {tarea:<20} {duracion_ms:>9.1f} ms  {detalle or ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# ==========================================
+# PRONÓSTICO DE COBRANZA Y SIMULACIONES
+# ==========================================
+# Carga todo el historial en columnas (arrays de NumPy) con una sola lectura
+# y calcula, para cada cliente, su ritmo de pago:
+#   - intervalo medio entre pagos y monto medio por pago
+#   - días desde el último pago (si se atrasó respecto de su ritmo,
+#     la probabilidad de que siga pagando baja)
+# Con eso proyecta cuánto va a entrar por semana o por mes, sin pasar
+# nunca del saldo que el cliente debe. Las simulaciones (recargo,
+# incobrables) modifican los saldos de toda la cartera de una vez.
+#
+# Uso:
+#   python pronostico.py                      -> próximas 12 semanas
+#   python pronostico.py --dias 30 --periodos 6
+#   python pronostico.py --recargo 5 --castigo 720
+
+VENTANA_DIAS = 365          # Solo los pagos del último año marcan el ritmo
+INTERVALO_POR_DEFECTO = 30  # Para clientes con un solo pago si no hay otra referencia
+
+
+class Cartera:
+    """Columnas de pagos y deudas con saldo, indexadas por cliente (0..n-1)."""
+    def __init__(self, pagos, deudas):
+        p = np.array(pagos, dtype=float).reshape(-1, 3)
+        d = np.array(deudas, dtype=float).reshape(-1, 4)
+
+        self.clientes = np.unique(np.concatenate([p[:, 0], d[:, 1]])).astype(np.int64)
+        self.n = len(self.clientes)
+
+        self.pago_cliente = np.searchsorted(self.clientes, p[:, 0].astype(np.int64))
+        self.pago_antiguedad = p[:, 1]
+        self.pago_monto = p[:, 2]
+
+        self.deuda_id = d[:, 0].astype(np.int64)
+        self.deuda_cliente = np.searchsorted(self.clientes, d[:, 1].astype(np.int64))
+        self.deuda_antiguedad = d[:, 2]
+        self.deuda_saldo = d[:, 3]
+
+    @classmethod
+    def desde_base(cls, db):
+        return cls(*db.obtener_datos_pronostico())
+
+    def saldos_por_cliente(self, saldos_deuda=None):
+        if saldos_deuda is None:
+            saldos_deuda = self.deuda_saldo
+        return np.bincount(self.deuda_cliente, weights=saldos_deuda, minlength=self.n)
+
+
+# ==========================================
+# MODELO DE RITMO DE PAGO
+# ==========================================
+def ritmo_de_pago(cartera, ventana=VENTANA_DIAS):
+    """
+    Retorna un dict de arrays (uno por cliente):
+      pagos, monto_medio, intervalo, dias_sin_pagar, probabilidad, tasa_diaria
+    'tasa_diaria' es lo que se espera cobrarle por día mientras tenga saldo.
+    """
+    n = cartera.n
+    recientes = cartera.pago_antiguedad <= ventana
+    cli = cartera.pago_cliente[recientes]
+    ant = cartera.pago_antiguedad[recientes]
+    monto = cartera.pago_monto[recientes]
+
+    pagos = np.bincount(cli, minlength=n)
+    total = np.bincount(cli, weights=monto, minlength=n)
+
+    # Pago más nuevo y más viejo de cada cliente dentro de la ventana
+    ultimo = np.full(n, np.inf)
+    primero = np.full(n, -np.inf)
+    np.minimum.at(ultimo, cli, ant)
+    np.maximum.at(primero, cli, ant)
+
+    con_ritmo = pagos >= 2
+    intervalo = np.empty(n)
+    intervalo[con_ritmo] = np.maximum(primero[con_ritmo] - ultimo[con_ritmo], 1) / (pagos[con_ritmo] - 1)
+    referencia = np.median(intervalo[con_ritmo]) if con_ritmo.any() else INTERVALO_POR_DEFECTO
+    intervalo[~con_ritmo] = referencia
+
+    monto_medio = np.divide(total, pagos, out=np.zeros(n), where=pagos > 0)
+    dias_sin_pagar = np.where(pagos > 0, ultimo, np.inf)
+
+    # Pasado su intervalo habitual, la chance de que vuelva a pagar decae
+    atraso = np.maximum(dias_sin_pagar - intervalo, 0)
+    probabilidad = np.exp(-atraso / intervalo)
+
+    tasa_diaria = monto_medio / intervalo * probabilidad
+
+    # Sin pagos en la ventana: tasa de recupero promedio de la cartera sobre su saldo
+    saldo = cartera.saldos_por_cliente()
+    sin_historial = pagos == 0
+    deuda_total = saldo.sum()
+    recupero = min(total.sum() / ventana / deuda_total, 1.0) if deuda_total > 0 else 0.0
+    tasa_diaria[sin_historial] = saldo[sin_historial] * recupero * 0.5
+    probabilidad[sin_historial] = 0.5
+
+    return {'pagos': pagos, 'monto_medio': monto_medio, 'intervalo': intervalo,
+            'dias_sin_pagar': dias_sin_pagar, 'probabilidad': probabilidad,
+            'tasa_diaria': tasa_diaria}
+
+
+def proyectar(tasa_diaria, saldos, periodos=12, dias_por_periodo=7):
+    """
+    Cobro esperado en cada uno de los próximos 'periodos'. Lo acumulado por
+    cliente nunca supera su saldo. Retorna un array de largo 'periodos'.
+    """
+    cortes = np.arange(1, periodos + 1) * dias_por_periodo
+    acumulado = np.minimum(np.outer(tasa_diaria, cortes), np.maximum(saldos, 0)[:, None]).sum(axis=0)
+    return np.diff(acumulado, prepend=0.0)
+
+
+# ==========================================
+# SIMULACIONES
+# ==========================================
+def simular(cartera, ritmo=None, recargo=0.0, dias_minimos=30, tope=None,
+            castigo_dias=None, periodos=12, dias_por_periodo=7):
+    """
+    Compara la proyección actual con un escenario:
+      recargo: % sobre el saldo de las deudas con al menos 'dias_minimos'
+               de antigüedad (misma regla que el Recargo Mensual, con 'tope' por deuda)
+      castigo_dias: las deudas más viejas que esto se dan por incobrables
+    Los clientes sin historial cobran en proporción a su saldo, así que el
+    recargo también mueve su tasa. Retorna un dict con ambas proyecciones y totales.
+    """
+    if ritmo is None:
+        ritmo = ritmo_de_pago(cartera)
+    saldo_deuda = cartera.deuda_saldo
+
+    monto_recargo = np.zeros_like(saldo_deuda)
+    if recargo:
+        alcanzadas = cartera.deuda_antiguedad >= dias_minimos
+        monto_recargo = np.where(alcanzadas, np.round(saldo_deuda * recargo / 100.0, 2), 0.0)
+        if tope:
+            monto_recargo = np.minimum(monto_recargo, tope)
+    nuevo_saldo = saldo_deuda + monto_recargo
+
+    castigado = np.zeros_like(saldo_deuda, dtype=bool)
+    if castigo_dias is not None:
+        castigado = cartera.deuda_antiguedad > castigo_dias
+        nuevo_saldo = np.where(castigado, 0.0, nuevo_saldo)
+
+    saldo_base = cartera.saldos_por_cliente()
+    saldo_escenario = cartera.saldos_por_cliente(nuevo_saldo)
+
+    tasa = ritmo['tasa_diaria']
+    sin_historial = ritmo['pagos'] == 0
+    tasa_escenario = tasa.copy()
+    tasa_escenario[sin_historial] = np.divide(tasa[sin_historial] * saldo_escenario[sin_historial],
+                                              saldo_base[sin_historial], out=np.zeros(sin_historial.sum()),
+                                              where=saldo_base[sin_historial] > 0)
+
+    base = proyectar(tasa, saldo_base, periodos, dias_por_periodo)
+    escenario = proyectar(tasa_escenario, saldo_escenario, periodos, dias_por_periodo)
+    return {
+        'base': base,
+        'escenario': escenario,
+        'deuda_base': saldo_base.sum(),
+        'deuda_escenario': saldo_escenario.sum(),
+        'recargo_total': (monto_recargo * ~castigado).sum(),
+        'castigado_total': saldo_deuda[castigado].sum(),
+        'deudas_castigadas': int(castigado.sum()),
+    }
+
+
+def pronosticar(db, periodos=12, dias_por_periodo=7, **escenario):
+    """Atajo: una lectura de la base, el modelo y la simulación. Retorna (resultado, segundos)."""
+    inicio = time.perf_counter()
+    cartera = Cartera.desde_base(db)
+    resultado = simular(cartera, periodos=periodos, dias_por_periodo=dias_por_periodo, **escenario)
+    return resultado, time.perf_counter() - inicio
+
+
+def formatear_texto(resultado, dias_por_periodo=7, ancho=40):
+    """Tabla con barras de texto: período, cobro esperado y escenario."""
+    unidad = "Semana" if dias_por_periodo == 7 else f"{dias_por_periodo}d"
+    base, escenario = resultado['base'], resultado['escenario']
+    maximo = max(base.max(initial=0), escenario.max(initial=0)) or 1
+    lineas = []
+    for i, (b, e) in enumerate(zip(base, escenario), start=1):
+        barra = "█" * int(round(b / maximo * ancho))
+        extra = f"  → ${e:,.0f}" if abs(e - b) >= 0.5 else ""
+        lineas.append(f"{unidad} {i:>2}  ${b:>12,.0f}{extra:<16} {barra}")
+    lineas.append(f"Total esperado: ${base.sum():,.2f}"
+                  + (f"  (escenario: ${escenario.sum():,.2f})" if abs(escenario.sum() - base.sum()) >= 0.5 else ""))
+    return "\n".join(lineas)
+
+
+# ==========================================
+# LÍNEA DE COMANDOS
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pronóstico de cobranza de la base del taller")
+    parser.add_argument("--db", default="taller_repuestos_final.db")
+    parser.add_argument("--periodos", type=int, default=12)
+    parser.add_argument("--dias", type=int, default=7, help="Días por período (7 = semanas, 30 = meses)")
+    parser.add_argument("--recargo", type=float, default=0.0, help="Simular un recargo de este %%")
+    parser.add_argument("--dias-minimos", type=int, default=30)
+    parser.add_argument("--tope", type=float, default=None)
+    parser.add_argument("--castigo", type=int, default=None, help="Dar por incobrables las deudas de más de N días")
+    args = parser.parse_args(argv)
+
+    from app import BaseDeDatos
+    db = BaseDeDatos(args.db)
+    resultado, segundos = pronosticar(db, args.periodos, args.dias, recargo=args.recargo,
+                                      dias_minimos=args.dias_minimos, tope=args.tope,
+                                      castigo_dias=args.castigo)
+    print(formatear_texto(resultado, args.dias))
+    print("-" * 60)
+    print(f"Deuda actual: ${resultado['deuda_base']:,.2f}  ->  escenario: ${resultado['deuda_escenario']:,.2f}")
+    if args.recargo:
+        print(f"Recargo simulado: ${resultado['recargo_total']:,.2f}")
+    if args.castigo is not None:
+        print(f"Incobrables: {resultado['deudas_castigadas']} deudas, ${resultado['castigado_total']:,.2f}")
+    print(f"Calculado en {segundos:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,549 @@
+import sqlite3
+import os
+import sys
+import gzip
+import json
+import uuid
+import socket
+import argparse
+import tempfile
+
+# ==========================================
+# REPLICACIÓN POR CAMBIOS (MOSTRADOR <-> OFICINA)
+# ==========================================
+# Cada fila de clientes, deudas y pagos_detalle tiene un 'uuid' estable.
+# Unos triggers anotan cada alta/modificación/baja en la tabla 'cambios'
+# y guardan la versión de la fila (marca de tiempo + nodo) en 'replica_versiones'.
+# Exportar manda las filas cambiadas desde lo que la otra PC confirmó haber
+# recibido (cada paquete lleva el acuse de lo recibido de la otra): si un
+# paquete se pierde, el siguiente lo vuelve a incluir.
+# Cada base tiene su nodo (uuid en replica_meta) y recuerda en qué PC y ruta
+# se generó: si el archivo aparece en otra (copiado por pendrive al instalar
+# la segunda PC), la copia toma un nodo nuevo al abrirse.
+# Importar aplica "gana la última escritura", desempatando por nodo,
+# así las dos PCs terminan con el mismo resultado sin importar el orden.
+# Excepción: lo pagado de una deuda no se pisa. Se conserva el ajuste de la
+# versión ganadora (monto_pagado menos sus pagos, que mueve usar_saldo_manual)
+# y se le suman los pagos de las dos PCs, así dos cobros de la misma deuda
+# entre sincronizaciones cuentan los dos.
+# Las deudas archivadas (base 'archivo') conservan su uuid: se exportan desde
+# ahí, y si un cambio importado toca una deuda archivada, la deuda y sus pagos
+# vuelven primero a las tablas principales (archivar de nuevo la saca después).
+
+# Columnas replicadas de cada tabla. Las claves foráneas viajan como uuid.
+TABLAS = {
+    'clientes': {
+        'columnas': ['dni', 'nombre', 'telefono', 'localidad'],
+        'padre': None,
+    },
+    'deudas': {
+        'columnas': ['monto_total', 'monto_pagado', 'descripcion', 'estado',
+                     'fecha_creacion', 'fecha_pago', 'metodo_pago'],
+        'padre': ('cliente_id', 'clientes'),
+    },
+    'pagos_detalle': {
+        'columnas': ['monto', 'fecha', 'metodo'],
+        'padre': ('deuda_id', 'deudas'),
+    },
+}
+# Orden para aplicar altas (padres primero) y bajas (hijos primero)
+ORDEN_TABLAS = ['clientes', 'deudas', 'pagos_detalle']
+
+# Campos usados para generar el uuid de las filas que ya existían,
+# así dos copias del mismo archivo generan los mismos uuid.
+CAMPOS_UUID_INICIAL = {
+    'clientes': 'id, dni, nombre',
+    'deudas': 'id, cliente_id, fecha_creacion, descripcion',
+    'pagos_detalle': 'id, deuda_id, fecha, monto',
+}
+
+SQL_MARCA = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+SQL_NODO = "(SELECT valor FROM replica_meta WHERE clave = 'nodo')"
+SQL_ACTIVA = "(SELECT valor FROM replica_meta WHERE clave = 'pausada') = '0'"
+# Misma regla de estado que registrar_pago
+SQL_ESTADO_DEUDA = """
+    CASE WHEN round(monto_pagado, 2) >= round(monto_total, 2) THEN 'PAGADA'
+         WHEN monto_pagado > 0 THEN 'PARCIAL'
+         ELSE 'PENDIENTE' END
+"""
+
+
+def instalar_captura(conn):
+    """
+    Crea (si faltan) las columnas uuid, las tablas de control y los triggers
+    de captura de cambios. Es idempotente: se llama en cada arranque.
+    """
+    cur = conn.cursor()
+    cur.execute("CREATE TABLE IF NOT EXISTS replica_meta (clave TEXT PRIMARY KEY, valor TEXT)")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cambios (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabla TEXT NOT NULL,
+            fila_uuid TEXT NOT NULL,
+            operacion TEXT NOT NULL
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS replica_versiones (
+            tabla TEXT NOT NULL,
+            fila_uuid TEXT NOT NULL,
+            marca TEXT NOT NULL,
+            nodo TEXT NOT NULL,
+            PRIMARY KEY (tabla, fila_uuid)
+        )
+    """)
+    cur.execute("INSERT OR IGNORE INTO replica_meta (clave, valor) VALUES ('nodo', ?)", (uuid.uuid4().hex,))
+    cur.execute("INSERT OR IGNORE INTO replica_meta (clave, valor) VALUES ('pausada', '0')")
+    ubicacion = _ubicacion(cur)
+    cur.execute("INSERT OR IGNORE INTO replica_meta (clave, valor) VALUES ('ubicacion', ?)", (ubicacion,))
+    if cur.execute("SELECT valor FROM replica_meta WHERE clave = 'ubicacion'").fetchone()[0] != ubicacion:
+        # Copia de la base de otra PC (o movida de carpeta): no puede compartir el nodo
+        _renovar_nodo(cur, ubicacion)
+
+    for tabla in ORDEN_TABLAS:
+        columnas = [c[1] for c in cur.execute(f"PRAGMA table_info({tabla})")]
+        if 'uuid' not in columnas:
+            cur.execute(f"ALTER TABLE {tabla} ADD COLUMN uuid TEXT")
+            # uuid determinístico para lo que ya existía
+            filas = cur.execute(f"SELECT id, {CAMPOS_UUID_INICIAL[tabla]} FROM {tabla}").fetchall()
+            cur.executemany(f"UPDATE {tabla} SET uuid = ? WHERE id = ?",
+                            [(uuid.uuid5(uuid.NAMESPACE_OID, f"{tabla}|{f[1:]}").hex, f[0]) for f in filas])
+        cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{tabla}_uuid ON {tabla}(uuid)")
+
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{tabla}_alta AFTER INSERT ON {tabla}
+            BEGIN
+                UPDATE {tabla} SET uuid = lower(hex(randomblob(16))) WHERE id = NEW.id AND uuid IS NULL;
+                INSERT INTO cambios (tabla, fila_uuid, operacion)
+                    SELECT '{tabla}', uuid, 'U' FROM {tabla} WHERE id = NEW.id AND {SQL_ACTIVA};
+                INSERT OR REPLACE INTO replica_versiones (tabla, fila_uuid, marca, nodo)
+                    SELECT '{tabla}', uuid, {SQL_MARCA}, {SQL_NODO} FROM {tabla} WHERE id = NEW.id AND {SQL_ACTIVA};
+            END
+        """)
+        # OLD.uuid IS NOT NULL evita registrar el UPDATE que asigna el uuid
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{tabla}_modif AFTER UPDATE ON {tabla}
+            WHEN OLD.uuid IS NOT NULL AND {SQL_ACTIVA}
+            BEGIN
+                INSERT INTO cambios (tabla, fila_uuid, operacion) VALUES ('{tabla}', NEW.uuid, 'U');
+                INSERT OR REPLACE INTO replica_versiones (tabla, fila_uuid, marca, nodo)
+                    VALUES ('{tabla}', NEW.uuid, {SQL_MARCA}, {SQL_NODO});
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{tabla}_baja AFTER DELETE ON {tabla}
+            WHEN OLD.uuid IS NOT NULL AND {SQL_ACTIVA}
+            BEGIN
+                INSERT INTO cambios (tabla, fila_uuid, operacion) VALUES ('{tabla}', OLD.uuid, 'D');
+                INSERT OR REPLACE INTO replica_versiones (tabla, fila_uuid, marca, nodo)
+                    VALUES ('{tabla}', OLD.uuid, {SQL_MARCA}, {SQL_NODO});
+            END
+        """)
+    conn.commit()
+
+
+def _ubicacion(cur):
+    """PC y ruta del archivo de la base, para reconocer una copia."""
+    archivo = cur.execute("SELECT file FROM pragma_database_list WHERE name = 'main'").fetchone()[0]
+    return f"{socket.gethostname()}|{os.path.normcase(os.path.abspath(archivo)) if archivo else ''}"
+
+
+def _renovar_nodo(cur, ubicacion):
+    cur.execute("UPDATE replica_meta SET valor = ? WHERE clave = 'nodo'", (uuid.uuid4().hex,))
+    cur.execute("UPDATE replica_meta SET valor = ? WHERE clave = 'ubicacion'", (ubicacion,))
+    # Lo que las otras PCs confirmaron era del nodo anterior: el próximo
+    # paquete sale desde el principio del registro y ellas descartan lo que ya tienen
+    cur.execute("DELETE FROM replica_meta WHERE clave LIKE 'confirmado:%'")
+
+
+def renovar_nodo(conn):
+    """
+    Genera un nodo nuevo para esta base (comando 'nuevo-nodo'). Para una copia
+    que quedó con el mismo nodo que la original. Retorna el nodo nuevo.
+    """
+    cur = conn.cursor()
+    _renovar_nodo(cur, _ubicacion(cur))
+    conn.commit()
+    return cur.execute(f"SELECT {SQL_NODO}").fetchone()[0]
+
+
+def pausar_captura(cursor, pausada=True):
+    """
+    Activa/desactiva la captura dentro de la transacción en curso.
+    Se usa al aplicar cambios importados y al archivar, que no deben replicarse.
+    """
+    cursor.execute("UPDATE replica_meta SET valor = ? WHERE clave = 'pausada'", ('1' if pausada else '0',))
+
+
+def anotar_cambios(cursor, tabla, uuids, operacion='U'):
+    """
+    Anota cambios de filas que los triggers no ven (las del archivo), dentro de
+    la transacción en curso. No hace nada si la captura está pausada.
+    """
+    uuids = [u for u in uuids if u]
+    if not uuids or not cursor.execute(f"SELECT {SQL_ACTIVA}").fetchone()[0]:
+        return
+    cursor.executemany("INSERT INTO cambios (tabla, fila_uuid, operacion) VALUES (?, ?, ?)",
+                       [(tabla, u, operacion) for u in uuids])
+    cursor.executemany(f"""
+        INSERT OR REPLACE INTO replica_versiones (tabla, fila_uuid, marca, nodo)
+        VALUES (?, ?, {SQL_MARCA}, {SQL_NODO})
+    """, [(tabla, u) for u in uuids])
+
+
+def _esquemas(cur, tabla):
+    """Dónde puede estar una fila: 'main' y, para deudas y pagos, el archivo si guarda uuid."""
+    if tabla == 'clientes':
+        return ['main']
+    adjunto = cur.execute("SELECT 1 FROM pragma_database_list WHERE name = 'archivo'").fetchone()
+    if adjunto and cur.execute("SELECT 1 FROM pragma_table_info('deudas', 'archivo') WHERE name = 'uuid'").fetchone():
+        return ['main', 'archivo']
+    return ['main']
+
+
+# ==========================================
+# EXPORTAR
+# ==========================================
+def exportar_cambios(conn, ruta, desde_seq=None, completo=False):
+    """
+    Escribe en 'ruta' (JSON comprimido) las filas cambiadas con seq > desde_seq.
+    Si desde_seq es None parte de lo que la otra PC confirmó haber recibido
+    (ver confirmado_por_pares): exportar de nuevo sin importar nada repite el paquete.
+    Con completo=True manda todas las filas (para inicializar una PC nueva).
+    Retorna (cantidad_de_cambios, hasta_seq).
+    """
+    cur = conn.cursor()
+    meta = dict(cur.execute("SELECT clave, valor FROM replica_meta").fetchall())
+    if completo:
+        desde_seq = 0
+    elif desde_seq is None:
+        desde_seq = confirmado_por_pares(meta)
+    hasta_seq = cur.execute("SELECT COALESCE(MAX(seq), 0) FROM cambios").fetchone()[0]
+
+    cambios = []
+    for tabla in ORDEN_TABLAS:
+        if completo:
+            uuids = [(u, 'U') for esquema in _esquemas(cur, tabla)
+                     for (u,) in cur.execute(f"SELECT uuid FROM {esquema}.{tabla} WHERE uuid IS NOT NULL")]
+        else:
+            # Nos quedamos solo con la última operación de cada fila
+            uuids = cur.execute("""
+                SELECT c.fila_uuid, c.operacion FROM cambios c
+                JOIN (SELECT fila_uuid, MAX(seq) AS seq FROM cambios
+                      WHERE tabla = ? AND seq > ? GROUP BY fila_uuid) u ON u.seq = c.seq
+            """, (tabla, desde_seq)).fetchall()
+        for fila_uuid, operacion in uuids:
+            cambio = _armar_cambio(cur, tabla, fila_uuid, operacion, meta['nodo'])
+            if cambio:
+                cambios.append(cambio)
+
+    # Acuse: hasta qué seq de cada otra PC ya se importó todo
+    recibido = {clave[len('recibido:'):]: int(valor) for clave, valor in meta.items() if clave.startswith('recibido:')}
+    paquete = {'nodo': meta['nodo'], 'desde_seq': desde_seq, 'hasta_seq': hasta_seq,
+               'recibido': recibido, 'cambios': cambios}
+    with gzip.open(ruta, "wt", encoding="utf-8") as f:
+        json.dump(paquete, f, ensure_ascii=False, separators=(",", ":"))
+    return len(cambios), hasta_seq
+
+
+def confirmado_por_pares(meta):
+    """Menor seq propio que todas las otras PCs confirmaron (0 si ninguna confirmó todavía)."""
+    confirmados = [int(v) for clave, v in meta.items() if clave.startswith('confirmado:')]
+    return min(confirmados) if confirmados else 0
+
+
+def _armar_cambio(cur, tabla, fila_uuid, operacion, nodo_local):
+    version = cur.execute("SELECT marca, nodo FROM replica_versiones WHERE tabla = ? AND fila_uuid = ?",
+                          (tabla, fila_uuid)).fetchone()
+    marca, nodo = version if version else ("", nodo_local)
+    cambio = {'t': tabla, 'u': fila_uuid, 'op': operacion, 'm': marca, 'n': nodo}
+    if operacion == 'D':
+        return cambio
+
+    info = TABLAS[tabla]
+    columnas = ", ".join(f"x.{c}" for c in info['columnas'])
+    fila = None
+    for esquema in _esquemas(cur, tabla):
+        if info['padre']:
+            fk, tabla_padre = info['padre']
+            # Los clientes nunca se archivan; los pagos archivados cuelgan de deudas archivadas
+            esquema_padre = 'main' if tabla_padre == 'clientes' else esquema
+            fila = cur.execute(f"""
+                SELECT {columnas}, p.uuid FROM {esquema}.{tabla} x LEFT JOIN {esquema_padre}.{tabla_padre} p ON p.id = x.{fk}
+                WHERE x.uuid = ?
+            """, (fila_uuid,)).fetchone()
+        else:
+            fila = cur.execute(f"SELECT {columnas} FROM {tabla} x WHERE x.uuid = ?", (fila_uuid,)).fetchone()
+        if fila is not None:
+            break
+    if fila is None:
+        # Se borró después sin quedar en el rango: no hay nada que mandar
+        return None
+    cambio['f'] = list(fila)
+    if tabla == 'deudas':
+        # Suma de los pagos que conoce esta versión: con eso el otro lado separa
+        # lo pagado en pagos registrados y ajuste (ver _recalcular_pagados)
+        cambio['sp'] = cur.execute(f"""
+            SELECT COALESCE(SUM(p.monto), 0) FROM {esquema}.pagos_detalle p JOIN {esquema}.deudas d ON d.id = p.deuda_id
+            WHERE d.uuid = ?
+        """, (fila_uuid,)).fetchone()[0]
+    return cambio
+
+
+# ==========================================
+# IMPORTAR
+# ==========================================
+def importar_cambios(conn, ruta, al_desarchivar=None):
+    """
+    Aplica un paquete exportado por la otra PC en una sola transacción.
+    Cada fila se aplica solo si su versión (marca, nodo) es más nueva que la local,
+    por lo que importar dos veces el mismo paquete no tiene efecto.
+    al_desarchivar(cliente_ids) se llama, dentro de la transacción, si alguna
+    deuda volvió del archivo (BaseDeDatos.recalcular_perfil_archivado).
+    Retorna un dict con contadores: aplicados, ignorados, huerfanos, desarchivadas.
+    """
+    with gzip.open(ruta, "rt", encoding="utf-8") as f:
+        paquete = json.load(f)
+
+    cur = conn.cursor()
+    if paquete['nodo'] == cur.execute(f"SELECT {SQL_NODO}").fetchone()[0]:
+        # Misma base o una copia con el mismo nodo: los acuses y el desempate
+        # por nodo no distinguirían las dos PCs
+        raise ValueError("El paquete tiene el mismo nodo que esta base (¿es una copia?). "
+                         "Ejecute 'replicacion.py nuevo-nodo' en una de las dos PCs.")
+    resumen = {'aplicados': 0, 'ignorados': 0, 'huerfanos': 0}
+    try:
+        pausar_captura(cur, True)
+        resumen['desarchivadas'], clientes = _desarchivar_tocadas(cur, paquete['cambios'])
+        altas = [c for c in paquete['cambios'] if c['op'] != 'D']
+        bajas = [c for c in paquete['cambios'] if c['op'] == 'D']
+        altas.sort(key=lambda c: ORDEN_TABLAS.index(c['t']))
+        bajas.sort(key=lambda c: -ORDEN_TABLAS.index(c['t']))
+        ajustes = _ajustes_locales(cur, paquete['cambios'])
+
+        for cambio in altas + bajas:
+            local = cur.execute("SELECT marca, nodo FROM replica_versiones WHERE tabla = ? AND fila_uuid = ?",
+                                (cambio['t'], cambio['u'])).fetchone()
+            if local and tuple(local) >= (cambio['m'], cambio['n']):
+                resumen['ignorados'] += 1
+                continue
+
+            if cambio['op'] == 'D':
+                cur.execute(f"DELETE FROM {cambio['t']} WHERE uuid = ?", (cambio['u'],))
+            elif not _aplicar_fila(cur, cambio):
+                resumen['huerfanos'] += 1
+                continue
+            if cambio['t'] == 'deudas':
+                # Ganó la versión de la otra PC: su ajuste es el que vale
+                ajustes[cambio['u']] = (cambio['f'][1] - cambio['sp']) if 'sp' in cambio else None
+
+            cur.execute("INSERT OR REPLACE INTO replica_versiones (tabla, fila_uuid, marca, nodo) VALUES (?, ?, ?, ?)",
+                        (cambio['t'], cambio['u'], cambio['m'], cambio['n']))
+            resumen['aplicados'] += 1
+
+        resumen['recalculadas'] = _recalcular_pagados(cur, ajustes)
+        if clientes and al_desarchivar:
+            al_desarchivar(clientes)
+        _registrar_acuses(cur, paquete)
+        pausar_captura(cur, False)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return resumen
+
+
+def _desarchivar_tocadas(cur, cambios):
+    """
+    Devuelve a las tablas principales (mismo id y uuid) las deudas archivadas que
+    el paquete toca, ellas o sus pagos, junto con todos sus pagos.
+    Retorna (cantidad, ids de sus clientes).
+    """
+    if 'archivo' not in _esquemas(cur, 'deudas'):
+        return 0, []
+    deudas = set()
+    for c in cambios:
+        if c['t'] == 'deudas':
+            deudas.add(c['u'])
+        elif c['t'] == 'pagos_detalle' and c['op'] != 'D':
+            deudas.add(c['f'][-1])
+        elif c['t'] == 'pagos_detalle':
+            fila = cur.execute("""
+                SELECT d.uuid FROM archivo.pagos_detalle p JOIN archivo.deudas d ON d.id = p.deuda_id WHERE p.uuid = ?
+            """, (c['u'],)).fetchone()
+            if fila:
+                deudas.add(fila[0])
+    if not deudas:
+        return 0, []
+    ids = [r[0] for r in cur.execute("SELECT id FROM archivo.deudas WHERE uuid IN (SELECT value FROM json_each(?))",
+                                     (json.dumps(sorted(deudas)),))]
+    if not ids:
+        return 0, []
+    lista = (json.dumps(ids),)
+    clientes = [r[0] for r in cur.execute(
+        "SELECT DISTINCT cliente_id FROM archivo.deudas WHERE id IN (SELECT value FROM json_each(?))", lista)]
+    # Padres primero: los triggers del resumen buscan la deuda de cada pago
+    for tabla in ORDEN_TABLAS[1:]:
+        fk = TABLAS[tabla]['padre'][0]
+        columnas = ", ".join(['id', fk] + TABLAS[tabla]['columnas'] + ['uuid'])
+        donde = "id" if tabla == 'deudas' else "deuda_id"
+        cur.execute(f"""
+            INSERT INTO main.{tabla} ({columnas})
+            SELECT {columnas} FROM archivo.{tabla} WHERE {donde} IN (SELECT value FROM json_each(?))
+        """, lista)
+    cur.execute("DELETE FROM archivo.pagos_detalle WHERE deuda_id IN (SELECT value FROM json_each(?))", lista)
+    cur.execute("DELETE FROM archivo.deudas WHERE id IN (SELECT value FROM json_each(?))", lista)
+    return len(ids), clientes
+
+
+def _ajustes_locales(cur, cambios):
+    """
+    Antes de aplicar: para cada deuda que el paquete toca (ella o sus pagos),
+    el ajuste local = monto_pagado - suma de sus pagos. {deuda_uuid: ajuste o None}.
+    """
+    deudas = set()
+    for c in cambios:
+        if c['t'] == 'deudas':
+            deudas.add(c['u'])
+        elif c['t'] == 'pagos_detalle' and c['op'] != 'D':
+            deudas.add(c['f'][-1])
+        elif c['t'] == 'pagos_detalle':
+            fila = cur.execute("""
+                SELECT d.uuid FROM pagos_detalle p JOIN deudas d ON d.id = p.deuda_id WHERE p.uuid = ?
+            """, (c['u'],)).fetchone()
+            if fila:
+                deudas.add(fila[0])
+    ajustes = {}
+    for deuda_uuid in deudas:
+        fila = cur.execute("""
+            SELECT d.monto_pagado - COALESCE((SELECT SUM(monto) FROM pagos_detalle WHERE deuda_id = d.id), 0)
+            FROM deudas d WHERE d.uuid = ?
+        """, (deuda_uuid,)).fetchone()
+        ajustes[deuda_uuid] = fila[0] if fila else None
+    return ajustes
+
+
+def _recalcular_pagados(cur, ajustes):
+    """
+    Después de aplicar: monto_pagado = pagos ya combinados + ajuste de la versión
+    ganadora, y el estado según lo pagado. Retorna la cantidad de deudas corregidas.
+    """
+    corregidas = 0
+    for deuda_uuid, ajuste in ajustes.items():
+        if ajuste is None:
+            continue
+        cur.execute("""
+            UPDATE deudas
+            SET monto_pagado = ? + COALESCE((SELECT SUM(monto) FROM pagos_detalle WHERE deuda_id = deudas.id), 0)
+            WHERE uuid = ?
+              AND abs(monto_pagado - ? - COALESCE((SELECT SUM(monto) FROM pagos_detalle WHERE deuda_id = deudas.id), 0)) > 0.005
+        """, (ajuste, deuda_uuid, ajuste))
+        if cur.rowcount:
+            cur.execute(f"UPDATE deudas SET estado = {SQL_ESTADO_DEUDA} WHERE uuid = ?", (deuda_uuid,))
+            corregidas += 1
+    return corregidas
+
+
+def _registrar_acuses(cur, paquete):
+    """Anota hasta dónde se recibió de la otra PC y hasta dónde confirmó ella lo nuestro."""
+    nodo_local = cur.execute(f"SELECT {SQL_NODO}").fetchone()[0]
+    clave = f"recibido:{paquete['nodo']}"
+    fila = cur.execute("SELECT valor FROM replica_meta WHERE clave = ?", (clave,)).fetchone()
+    recibido = int(fila[0]) if fila else 0
+    # Solo si el paquete empalma con lo ya recibido (no hay huecos en el medio)
+    if paquete['desde_seq'] <= recibido:
+        cur.execute("INSERT OR REPLACE INTO replica_meta (clave, valor) VALUES (?, ?)",
+                    (clave, str(max(recibido, paquete['hasta_seq']))))
+    if nodo_local in paquete.get('recibido', {}):
+        clave = f"confirmado:{paquete['nodo']}"
+        fila = cur.execute("SELECT valor FROM replica_meta WHERE clave = ?", (clave,)).fetchone()
+        confirmado = max(int(fila[0]) if fila else 0, paquete['recibido'][nodo_local])
+        cur.execute("INSERT OR REPLACE INTO replica_meta (clave, valor) VALUES (?, ?)", (clave, str(confirmado)))
+
+
+def _aplicar_fila(cur, cambio):
+    info = TABLAS[cambio['t']]
+    columnas = list(info['columnas'])
+    valores = list(cambio['f'][:len(columnas)])
+    if info['padre']:
+        fk, tabla_padre = info['padre']
+        padre = cur.execute(f"SELECT id FROM {tabla_padre} WHERE uuid = ?", (cambio['f'][-1],)).fetchone()
+        if padre is None:
+            # El padre fue borrado de este lado: no se puede colgar la fila
+            return False
+        columnas.append(fk)
+        valores.append(padre[0])
+
+    existe = cur.execute(f"SELECT id FROM {cambio['t']} WHERE uuid = ?", (cambio['u'],)).fetchone()
+    if existe:
+        asignaciones = ", ".join(f"{c} = ?" for c in columnas)
+        cur.execute(f"UPDATE {cambio['t']} SET {asignaciones} WHERE id = ?", valores + [existe[0]])
+    else:
+        marcas = ", ".join("?" for _ in columnas)
+        cur.execute(f"INSERT INTO {cambio['t']} ({', '.join(columnas)}, uuid) VALUES ({marcas}, ?)",
+                    valores + [cambio['u']])
+    return True
+
+
+def sincronizar(conn_a, conn_b, carpeta=None, al_desarchivar_a=None, al_desarchivar_b=None):
+    """Intercambia los cambios entre dos bases locales (útil para pruebas)."""
+    carpeta = carpeta or tempfile.mkdtemp(prefix="sync_")
+    ruta_a = os.path.join(carpeta, "a_hacia_b.json.gz")
+    ruta_b = os.path.join(carpeta, "b_hacia_a.json.gz")
+    exportar_cambios(conn_a, ruta_a)
+    exportar_cambios(conn_b, ruta_b)
+    return (importar_cambios(conn_b, ruta_a, al_desarchivar_b),
+            importar_cambios(conn_a, ruta_b, al_desarchivar_a))
+
+
+# ==========================================
+# LÍNEA DE COMANDOS
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replicación de cambios entre PCs del taller")
+    parser.add_argument("--db", default="taller_repuestos_final.db")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_exp = sub.add_parser("exportar")
+    p_exp.add_argument("archivo")
+    p_exp.add_argument("--desde", type=int, default=None, help="Exportar cambios con seq mayor a este")
+    p_exp.add_argument("--completo", action="store_true", help="Exportar todas las filas")
+    p_imp = sub.add_parser("importar")
+    p_imp.add_argument("archivo")
+    p_sync = sub.add_parser("sincronizar", help="Sincronizar con otra base local")
+    p_sync.add_argument("otra_db")
+    sub.add_parser("nuevo-nodo", help="Generar otro nodo (base copiada de otra PC)")
+    args = parser.parse_args(argv)
+
+    # Importamos acá para no crear una dependencia circular con app.py
+    from app import BaseDeDatos
+    db = BaseDeDatos(args.db)
+
+    if args.comando == "exportar":
+        cantidad, hasta = exportar_cambios(db.conn, args.archivo, args.desde, args.completo)
+        print(f"Exportados {cantidad} cambios (hasta seq {hasta}) a {args.archivo}")
+    elif args.comando == "importar":
+        try:
+            resumen = importar_cambios(db.conn, args.archivo, db.recalcular_perfil_archivado)
+        except ValueError as e:
+            print(e)
+            return 1
+        print(f"Aplicados: {resumen['aplicados']} | Ignorados: {resumen['ignorados']} | "
+              f"Huérfanos: {resumen['huerfanos']} | Pagados recalculados: {resumen['recalculadas']} | "
+              f"Desarchivadas: {resumen['desarchivadas']}")
+    elif args.comando == "sincronizar":
+        otra = BaseDeDatos(args.otra_db)
+        try:
+            hacia_otra, hacia_esta = sincronizar(db.conn, otra.conn, None,
+                                                 db.recalcular_perfil_archivado, otra.recalcular_perfil_archivado)
+        except ValueError as e:
+            print(e)
+            return 1
+        print(f"-> {args.otra_db}: {hacia_otra}")
+        print(f"<- {args.otra_db}: {hacia_esta}")
+    elif args.comando == "nuevo-nodo":
+        print(f"Nodo nuevo: {renovar_nodo(db.conn)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
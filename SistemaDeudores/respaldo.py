@@ -0,0 +1,335 @@
+import sqlite3
+import os
+import sys
+import gzip
+import shutil
+import hashlib
+import threading
+import argparse
+from datetime import datetime
+
+# ==========================================
+# RESPALDOS EN CALIENTE (API ONLINE BACKUP DE SQLITE)
+# ==========================================
+PREFIJO = "respaldo_"
+EXTENSION = ".db.gz"
+# Compañero de cada respaldo con la base de archivo (deudas saldadas viejas)
+EXTENSION_ARCHIVO = ".archivo.db.gz"
+SUFIJOS_AUXILIARES = ("-wal", "-shm", "-journal")
+
+
+def ruta_archivo(db_name):
+    """Base de archivo que BaseDeDatos adjunta junto a 'db_name'."""
+    base, _ = os.path.splitext(db_name)
+    return f"{base}_archivo.db"
+
+
+def archivo_del_respaldo(ruta):
+    """'respaldo_X.db.gz' -> 'respaldo_X.archivo.db.gz'"""
+    return ruta[:-len(EXTENSION)] + EXTENSION_ARCHIVO
+
+
+class GestorRespaldos:
+    def __init__(self, db_name, carpeta=None, paginas_por_paso=64, pausa=0.01, max_respaldos=10):
+        self.db_name = os.path.abspath(db_name)
+        if carpeta is None:
+            carpeta = os.path.join(os.path.dirname(self.db_name), "respaldos")
+        self.carpeta = carpeta
+        self.paginas_por_paso = paginas_por_paso
+        self.pausa = pausa
+        self.max_respaldos = max_respaldos
+
+        # Estado del respaldo en segundo plano
+        self.hilo = None
+        self.progreso = (0, 0)
+        self.ultimo_resultado = None
+
+    # --- CREACIÓN ---
+    def crear_respaldo(self):
+        """
+        Copia la base en vivo (y su base de archivo, si existe) por tandas de
+        páginas, las verifica, las comprime y rota los respaldos viejos.
+        Retorna la ruta del respaldo de la base principal.
+        """
+        os.makedirs(self.carpeta, exist_ok=True)
+        sello = datetime.now().strftime("%Y%m%d_%H%M%S")
+        destino_final = os.path.join(self.carpeta, f"{PREFIJO}{sello}{EXTENSION}")
+        copias = [('main', destino_final)]
+        archivo = ruta_archivo(self.db_name)
+        if os.path.exists(archivo):
+            copias.append(('archivo', archivo_del_respaldo(destino_final)))
+        temporales = [(esquema, final, os.path.join(self.carpeta, "." + os.path.basename(final) + ".tmp"))
+                      for esquema, final in copias]
+
+        def progreso(status, restantes, total):
+            self.progreso = (total - restantes, total)
+
+        # Conexión propia: el respaldo corre fuera del hilo de la interfaz
+        origen = sqlite3.connect(self.db_name)
+        try:
+            if len(copias) > 1:
+                origen.execute("ATTACH DATABASE ? AS archivo", (archivo,))
+            # pages > 0 copia de a tandas y libera el lock entre paso y paso, así la
+            # aplicación puede seguir escribiendo mientras tanto (la base no usa WAL:
+            # una foto única de las dos la frenaría durante toda la copia).
+            # La principal va primero: una deuda que se archive entre las dos copias
+            # queda en ambas (nunca en ninguna) y quitar_archivadas_repetidas lo corrige.
+            for esquema, _, tmp in temporales:
+                self._copiar(origen, esquema, tmp, progreso, self.pausa)
+        except BaseException:
+            for _, _, tmp in temporales:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            raise
+        finally:
+            origen.close()
+
+        try:
+            if len(temporales) > 1:
+                quitar_archivadas_repetidas(temporales[0][2], temporales[1][2])
+            for _, final, tmp in temporales:
+                ok, detalle = verificar_base(tmp)
+                if not ok:
+                    raise sqlite3.DatabaseError(f"El respaldo no pasó la verificación: {detalle}")
+
+                with open(tmp, "rb") as f_in, gzip.open(final + ".tmp", "wb") as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+                os.replace(final + ".tmp", final)
+
+                # Guardamos la huella para poder verificar el archivo comprimido después
+                with open(final + ".sha256", "w") as f:
+                    f.write(calcular_sha256(final))
+        finally:
+            for _, _, tmp in temporales:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+        self.rotar()
+        return destino_final
+
+    def _copiar(self, origen, esquema, ruta_destino, progreso, pausa):
+        destino = sqlite3.connect(ruta_destino)
+        try:
+            origen.backup(destino, pages=self.paginas_por_paso, progress=progreso, name=esquema, sleep=pausa)
+        finally:
+            destino.close()
+
+    def crear_respaldo_en_segundo_plano(self):
+        """
+        Lanza crear_respaldo en un hilo. Retorna False si ya hay uno corriendo.
+        El resultado queda en self.ultimo_resultado como (exito, ruta_o_error).
+        """
+        if self.en_curso():
+            return False
+
+        def tarea():
+            try:
+                self.ultimo_resultado = (True, self.crear_respaldo())
+            except Exception as e:
+                self.ultimo_resultado = (False, str(e))
+
+        self.ultimo_resultado = None
+        self.progreso = (0, 0)
+        self.hilo = threading.Thread(target=tarea, daemon=True)
+        self.hilo.start()
+        return True
+
+    def en_curso(self):
+        return self.hilo is not None and self.hilo.is_alive()
+
+    # --- ROTACIÓN Y LISTADO ---
+    def listar_respaldos(self):
+        """Retorna las rutas de los respaldos, del más reciente al más antiguo."""
+        if not os.path.isdir(self.carpeta):
+            return []
+        archivos = [f for f in os.listdir(self.carpeta)
+                    if f.startswith(PREFIJO) and f.endswith(EXTENSION) and not f.endswith(EXTENSION_ARCHIVO)]
+        archivos.sort(reverse=True)
+        return [os.path.join(self.carpeta, f) for f in archivos]
+
+    def rotar(self):
+        for ruta in self.listar_respaldos()[self.max_respaldos:]:
+            for archivo in (ruta, ruta + ".sha256", archivo_del_respaldo(ruta), archivo_del_respaldo(ruta) + ".sha256"):
+                if os.path.exists(archivo):
+                    os.remove(archivo)
+
+    # --- VERIFICACIÓN Y RESTAURACIÓN ---
+    def verificar_respaldo(self, ruta):
+        """
+        Comprueba la huella SHA-256 del archivo comprimido y corre integrity_check
+        sobre una copia descomprimida (también la del archivo, si la hay). Retorna (ok, detalle).
+        """
+        ok, detalle = self._verificar_comprimido(ruta)
+        companero = archivo_del_respaldo(ruta)
+        if ok and os.path.exists(companero):
+            ok, detalle = self._verificar_comprimido(companero)
+            if not ok:
+                detalle = f"Archivo de deudas saldadas: {detalle}"
+        return ok, detalle
+
+    def _verificar_comprimido(self, ruta):
+        if os.path.exists(ruta + ".sha256"):
+            with open(ruta + ".sha256") as f:
+                esperado = f.read().strip()
+            if calcular_sha256(ruta) != esperado:
+                return False, "La huella SHA-256 no coincide (archivo dañado)."
+
+        tmp = ruta + ".verif.tmp"
+        try:
+            descomprimir(ruta, tmp)
+            return verificar_base(tmp)
+        except (OSError, EOFError, sqlite3.DatabaseError) as e:
+            return False, str(e)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def restaurar(self, ruta):
+        """
+        Reemplaza la base de datos (y su archivo) por el respaldo indicado. El reemplazo
+        se hace con os.replace, que es atómico: nunca queda un archivo a medio copiar.
+        La aplicación debe estar cerrada (o reconectarse) antes de restaurar.
+        """
+        ok, detalle = self.verificar_respaldo(ruta)
+        if not ok:
+            return False, f"Respaldo inválido: {detalle}"
+
+        archivo = ruta_archivo(self.db_name)
+        companero = archivo_del_respaldo(ruta)
+        # Antes de tocar nada, lo confirmado que quede en un -wal (o un journal
+        # caliente) vuelve a la base: si algo falla más abajo, no se pierde.
+        for base in (self.db_name, archivo):
+            if os.path.exists(base) and not consolidar(base):
+                return False, f"{os.path.basename(base)} está en uso: cierre la aplicación antes de restaurar."
+
+        reemplazos = [(ruta, self.db_name)]
+        if os.path.exists(companero):
+            reemplazos.append((companero, archivo))
+        # Los temporales van en la misma carpeta que la base para que os.replace sea atómico
+        temporales = [(origen, destino, destino + ".restaurando.tmp") for origen, destino in reemplazos]
+        mensaje = f"Base restaurada desde {os.path.basename(ruta)}"
+        try:
+            for origen, _, tmp in temporales:
+                descomprimir(origen, tmp)
+            if not os.path.exists(companero) and os.path.exists(archivo):
+                # Respaldo sin archivo: el actual tendría deudas que el respaldo aún
+                # tiene en la base (quedarían duplicadas). Se aparta, no se borra.
+                apartado = archivo + ".antes_de_restaurar"
+                os.replace(archivo, apartado)
+                quitar_auxiliares(archivo)
+                mensaje += f" (el archivo de deudas saldadas anterior quedó en {os.path.basename(apartado)})"
+            for _, destino, tmp in temporales:
+                os.replace(tmp, destino)
+                # Recién ahora: los -wal / -shm que queden eran de la base anterior
+                quitar_auxiliares(destino)
+        finally:
+            for _, _, tmp in temporales:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        return True, mensaje
+
+
+# ==========================================
+# FUNCIONES AUXILIARES
+# ==========================================
+def verificar_base(ruta):
+    conn = sqlite3.connect(ruta)
+    try:
+        resultado = conn.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        conn.close()
+    if resultado == [("ok",)]:
+        return True, "ok"
+    return False, "; ".join(r[0] for r in resultado)
+
+
+def quitar_archivadas_repetidas(ruta_principal, ruta_archivo):
+    """
+    Deja la copia del archivo coherente con la de la base principal: lo que figura
+    en las dos (se archivó entre una copia y otra) queda solo en la principal, que
+    es la foto anterior al archivado. Los ids no se reutilizan (AUTOINCREMENT).
+    Retorna la cantidad de deudas quitadas del archivo.
+    """
+    conn = sqlite3.connect(ruta_archivo)
+    try:
+        conn.execute("ATTACH DATABASE ? AS principal", (ruta_principal,))
+        with conn:
+            conn.execute("DELETE FROM main.pagos_detalle WHERE id IN (SELECT id FROM principal.pagos_detalle)")
+            quitadas = conn.execute("DELETE FROM main.deudas WHERE id IN (SELECT id FROM principal.deudas)").rowcount
+        return quitadas
+    finally:
+        conn.close()
+
+
+def consolidar(ruta):
+    """
+    Abre la base para que SQLite deshaga un journal caliente y pasa todo el -wal
+    a la base. Retorna False si otra conexión la está usando y no se pudo.
+    """
+    conn = sqlite3.connect(ruta, timeout=1)
+    try:
+        conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        ocupada, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+    return not ocupada
+
+
+def quitar_auxiliares(ruta):
+    for sufijo in SUFIJOS_AUXILIARES:
+        if os.path.exists(ruta + sufijo):
+            os.remove(ruta + sufijo)
+
+
+def calcular_sha256(ruta):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def descomprimir(ruta, destino):
+    with gzip.open(ruta, "rb") as f_in, open(destino, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+
+
+# ==========================================
+# LÍNEA DE COMANDOS
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Respaldos de la base de datos del taller")
+    parser.add_argument("--db", default="taller_repuestos_final.db")
+    parser.add_argument("--carpeta", default=None)
+    parser.add_argument("--max", type=int, default=10, help="Cantidad de respaldos a conservar")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("crear")
+    sub.add_parser("listar")
+    p_ver = sub.add_parser("verificar")
+    p_ver.add_argument("archivo")
+    p_res = sub.add_parser("restaurar")
+    p_res.add_argument("archivo")
+    args = parser.parse_args(argv)
+
+    gestor = GestorRespaldos(args.db, carpeta=args.carpeta, max_respaldos=args.max)
+
+    if args.comando == "crear":
+        print(f"Respaldo creado: {gestor.crear_respaldo()}")
+    elif args.comando == "listar":
+        for ruta in gestor.listar_respaldos():
+            print(f"{os.path.basename(ruta)}  ({os.path.getsize(ruta):,} bytes)")
+    elif args.comando == "verificar":
+        ok, detalle = gestor.verificar_respaldo(args.archivo)
+        print("OK" if ok else f"ERROR: {detalle}")
+        return 0 if ok else 1
+    elif args.comando == "restaurar":
+        ok, detalle = gestor.restaurar(args.archivo)
+        print(detalle)
+        return 0 if ok else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+import sqlite3
+import sys
+import json
+import uuid
+import asyncio
+import argparse
+import threading
+import http.client
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# ==========================================
+# MODO SERVIDOR (VARIOS MOSTRADORES)
+# ==========================================
+# Expone los métodos de BaseDeDatos como un servicio HTTP/JSON local:
+#   POST /rpc/<metodo>   cuerpo: {"args": [...], "clave": "..."}   respuesta: {"ok": true, "resultado": ...}
+# 'clave' (solo escrituras) identifica el pedido: si el cliente lo reintenta
+# porque se cortó la conexión antes de la respuesta, no se aplica dos veces.
+# Las lecturas corren en un pool de conexiones de solo consulta (una por hilo).
+# Las escrituras pasan por una única cola: el escritor toma todo lo pendiente,
+# lo ejecuta con una transacción anidada (SAVEPOINT) por operación dentro
+# de BaseDeDatos.transaccion() y confirma con un solo commit.
+
+LECTURAS = {
+    'existe_cliente', 'obtener_clientes_con_saldo', 'obtener_historial_cliente',
+    'obtener_total_individual', 'obtener_detalles_pagos', 'obtener_saldo_a_favor_disponible',
+    'obtener_top_deudores', 'obtener_deuda_total', 'obtener_cobro_mes',
+    'obtener_desglose_pagos_mes', 'obtener_recaudacion_historica', 'previsualizar_recargo',
+    'obtener_pagos_cliente', 'obtener_datos_pronostico', 'obtener_tendencia_mensual',
+    'obtener_cierre_caja', 'obtener_movimientos_caja', 'obtener_clientes_pagina', 'obtener_localidades',
+    'obtener_lista_cobranza',
+}
+ESCRITURAS = {
+    'agregar_cliente', 'agregar_deuda', 'borrar_deuda_permanentemente',
+    'agregar_interes_deuda', 'registrar_pago', 'registrar_pago_con_interes', 'usar_saldo_manual',
+    'archivar_deudas_saldadas', 'aplicar_recargo_masivo', 'agregar_deudas_lote', 'reparar_libro',
+    'borrar_deudas_permanentemente', 'registrar_pago_multiple', 'fusionar_clientes',
+}
+
+MAX_LOTE = 64
+MAX_CLAVES_RECORDADAS = 1000  # Escrituras recientes cuyo resultado se guarda para los reintentos
+
+
+class ServidorBaseDeDatos:
+    def __init__(self, db_name, lectores=4, timeout=10.0):
+        self.db_name = db_name
+        self.timeout = timeout
+        self.local = threading.local()
+        self.pool_lectores = ThreadPoolExecutor(max_workers=lectores, thread_name_prefix="lector",
+                                                initializer=self._abrir_lector)
+        self.hilo_escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="escritor",
+                                                initializer=self._abrir_escritor)
+        self.cola_escrituras = None
+        self.escrituras_recientes = OrderedDict()  # clave -> futuro con el resultado
+        self.estadisticas = {'lecturas': 0, 'escrituras': 0, 'lotes': 0, 'errores': 0, 'repetidas': 0}
+
+    # --- CONEXIONES (una por hilo, creada dentro del hilo) ---
+    def _abrir_lector(self):
+        from app import BaseDeDatos
+        # Sin caché: las escrituras las hace otra conexión (la del escritor)
+        self.local.db = BaseDeDatos(self.db_name, tamanio_cache=0, timeout=self.timeout)
+
+    def _abrir_escritor(self):
+        from app import BaseDeDatos
+        self.local.db = BaseDeDatos(self.db_name, tamanio_cache=0, timeout=self.timeout)
+        # WAL permite que los lectores sigan consultando mientras el escritor confirma
+        self.local.db.cursor.execute("PRAGMA journal_mode=WAL")
+
+    def _leer(self, metodo, args):
+        return getattr(self.local.db, metodo)(*args)
+
+    def _escribir_lote(self, lote):
+        """Corre en el hilo escritor. Retorna [(ok, resultado_o_error), ...]."""
+        db = self.local.db
+        try:
+            # Si otro proceso tiene la base tomada, se repite el lote entero
+            return db.con_reintentos(self._aplicar_lote, db, lote)
+        except sqlite3.Error as e:
+            return [(False, str(e))] * len(lote)
+
+    def _aplicar_lote(self, db, lote):
+        resultados = []
+        with db.transaccion():
+            for metodo, args in lote:
+                try:
+                    # Cada operación es un nivel anidado: si falla, solo se deshace ella
+                    with db.transaccion():
+                        resultados.append((True, getattr(db, metodo)(*args)))
+                except Exception as e:
+                    resultados.append((False, str(e)))
+        return resultados
+
+    # --- ATENCIÓN DE PEDIDOS ---
+    async def ejecutar(self, metodo, args, clave=None):
+        loop = asyncio.get_running_loop()
+        if metodo in LECTURAS:
+            self.estadisticas['lecturas'] += 1
+            return await loop.run_in_executor(self.pool_lectores, self._leer, metodo, args)
+        if metodo in ESCRITURAS:
+            if clave is not None and clave in self.escrituras_recientes:
+                # Reintento de un pedido ya recibido: se espera (o se repite) el mismo resultado
+                self.estadisticas['repetidas'] += 1
+                futuro = self.escrituras_recientes[clave]
+            else:
+                self.estadisticas['escrituras'] += 1
+                futuro = loop.create_future()
+                if clave is not None:
+                    self.escrituras_recientes[clave] = futuro
+                    while len(self.escrituras_recientes) > MAX_CLAVES_RECORDADAS:
+                        self.escrituras_recientes.popitem(last=False)
+                await self.cola_escrituras.put((metodo, args, futuro))
+            ok, resultado = await futuro
+            if not ok:
+                raise RuntimeError(resultado)
+            return resultado
+        raise KeyError(f"Método desconocido: {metodo}")
+
+    async def escritor(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pedidos = [await self.cola_escrituras.get()]
+            while len(pedidos) < MAX_LOTE and not self.cola_escrituras.empty():
+                pedidos.append(self.cola_escrituras.get_nowait())
+
+            lote = [(metodo, args) for metodo, args, _ in pedidos]
+            try:
+                resultados = await loop.run_in_executor(self.hilo_escritor, self._escribir_lote, lote)
+            except Exception as e:
+                resultados = [(False, str(e))] * len(pedidos)
+            self.estadisticas['lotes'] += 1
+            for (_, _, futuro), resultado in zip(pedidos, resultados):
+                if not futuro.done():
+                    futuro.set_result(resultado)
+
+    async def atender(self, reader, writer):
+        # HTTP/1.1 mínimo con keep-alive: alcanza para clientes en la red local
+        try:
+            while True:
+                linea = await reader.readline()
+                if not linea:
+                    break
+                try:
+                    verbo, ruta, _ = linea.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    break
+
+                cabeceras = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    clave, _, valor = h.decode("latin-1").partition(":")
+                    cabeceras[clave.strip().lower()] = valor.strip()
+
+                largo = int(cabeceras.get("content-length", 0))
+                cuerpo = await reader.readexactly(largo) if largo else b""
+
+                estado, respuesta = await self.despachar(verbo, ruta, cuerpo)
+                datos = json.dumps(respuesta, ensure_ascii=False).encode("utf-8")
+                writer.write((f"HTTP/1.1 {estado}\r\n"
+                              "Content-Type: application/json; charset=utf-8\r\n"
+                              f"Content-Length: {len(datos)}\r\n\r\n").encode("latin-1") + datos)
+                await writer.drain()
+
+                if cabeceras.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def despachar(self, verbo, ruta, cuerpo):
+        if verbo == "GET" and ruta == "/salud":
+            return "200 OK", {'ok': True, 'estadisticas': self.estadisticas}
+        if verbo != "POST" or not ruta.startswith("/rpc/"):
+            return "404 Not Found", {'ok': False, 'error': "Ruta inexistente"}
+
+        metodo = ruta[len("/rpc/"):]
+        try:
+            pedido = json.loads(cuerpo or b"{}")
+            resultado = await self.ejecutar(metodo, pedido.get("args", []), pedido.get("clave"))
+            return "200 OK", {'ok': True, 'resultado': resultado}
+        except KeyError as e:
+            return "404 Not Found", {'ok': False, 'error': str(e)}
+        except Exception as e:
+            self.estadisticas['errores'] += 1
+            return "500 Internal Server Error", {'ok': False, 'error': str(e)}
+
+    async def iniciar(self, host="127.0.0.1", puerto=8765):
+        self.cola_escrituras = asyncio.Queue()
+        tarea_escritor = asyncio.create_task(self.escritor())
+        servidor = await asyncio.start_server(self.atender, host, puerto)
+        print(f"Servidor escuchando en http://{host}:{puerto}")
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            tarea_escritor.cancel()
+
+
+# ==========================================
+# ADAPTADOR PARA LA INTERFAZ
+# ==========================================
+class BaseDeDatosRemota:
+    """
+    Misma interfaz que BaseDeDatos, pero cada llamada viaja al servidor.
+    La interfaz Tk la usa en lugar de abrir la base directamente.
+    """
+    def __init__(self, url="http://127.0.0.1:8765", timeout=15):
+        partes = urlsplit(url)
+        self.host = partes.hostname
+        self.puerto = partes.port or 80
+        self.timeout = timeout
+        self.http = None
+
+    def _llamar(self, metodo, *args):
+        pedido = {'args': list(args)}
+        if metodo in ESCRITURAS:
+            # Misma clave en el reintento: si el servidor ya la aplicó, no la repite
+            pedido['clave'] = uuid.uuid4().hex
+        datos = json.dumps(pedido).encode("utf-8")
+        for intento in range(2):
+            if self.http is None:
+                self.http = http.client.HTTPConnection(self.host, self.puerto, timeout=self.timeout)
+            try:
+                self.http.request("POST", f"/rpc/{metodo}", body=datos,
+                                  headers={"Content-Type": "application/json"})
+                respuesta = json.loads(self.http.getresponse().read())
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # El servidor cerró la conexión persistente: reintentamos una vez
+                self.http.close()
+                self.http = None
+                if intento:
+                    raise
+        if not respuesta['ok']:
+            raise RuntimeError(respuesta['error'])
+        return respuesta['resultado']
+
+    def transaccion(self):
+        """
+        Cada llamada ya es atómica en el servidor, pero varias llamadas no se pueden
+        agrupar desde acá: se confirmarían por separado. Se rechaza en lugar de
+        fingir atomicidad; lo que tiene varios pasos va como un solo método
+        (p. ej. registrar_pago_con_interes).
+        """
+        raise RuntimeError("En modo servidor no se pueden agrupar varias escrituras: "
+                           "use un método compuesto de BaseDeDatos")
+
+    def __getattr__(self, metodo):
+        if metodo in LECTURAS or metodo in ESCRITURAS:
+            return lambda *args: self._llamar(metodo, *args)
+        raise AttributeError(metodo)
+
+
+# ==========================================
+# LÍNEA DE COMANDOS
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor JSON local de la base del taller")
+    parser.add_argument("--db", default="taller_repuestos_final.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--lectores", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    servidor = ServidorBaseDeDatos(args.db, lectores=args.lectores)
+    try:
+        asyncio.run(servidor.iniciar(args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
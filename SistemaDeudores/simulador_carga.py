@@ -0,0 +1,191 @@
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+
+# ==========================================
+# SIMULADOR DE CARGA CONCURRENTE
+# ==========================================
+# Lanza N procesos que usan la misma base a la vez (como varias ventanas o
+# las dos PCs del taller) con una mezcla de búsquedas, pagos y usos de
+# saldo a favor. Al final informa operaciones por segundo, latencia p95
+# por tipo de operación y cuánto tiempo se pasó esperando el lock.
+#
+# Uso:
+#   python simulador_carga.py                          -> 4 procesos, 10 s, base temporal
+#   python simulador_carga.py --procesos 8 --segundos 30 --wal
+#   python simulador_carga.py --db copia.db            -> sobre una COPIA de la base real
+#                                                         (registra pagos de prueba)
+
+MEZCLA = {'busqueda': 0.60, 'pago': 0.30, 'transferencia': 0.10}
+NOMBRES = ["Juan", "María", "Carlos", "Ana", "Luis", "Laura", "Jorge", "Sofía", "Pedro", "Lucía"]
+APELLIDOS = ["Gómez", "Fernández", "López", "Martínez", "Pérez", "Rodríguez", "Sosa", "Díaz", "Romero", "Ruiz"]
+LOCALIDADES = ["Centro", "Norte", "Sur", "Oeste", "Rural"]
+
+
+# ==========================================
+# BASE DE PRUEBA
+# ==========================================
+def preparar_base(ruta, clientes=2000, deudas_por_cliente=3, semilla=1):
+    """Crea una base con clientes, deudas y algo de saldo a favor. Todo en una transacción."""
+    from app import BaseDeDatos
+    rng = random.Random(semilla)
+    db = BaseDeDatos(ruta, tamanio_cache=0)
+    hoy = time.strftime("%Y-%m-%d %H:%M")
+    with db.transaccion():
+        for n in range(clientes):
+            db.agregar_cliente(str(20000000 + n), f"{rng.choice(APELLIDOS)} {rng.choice(NOMBRES)}",
+                               rng.choice(LOCALIDADES))
+    ids = [c[0] for c in db.obtener_clientes_con_saldo()]
+    with db.transaccion():
+        for cliente_id in ids:
+            db.agregar_deudas_lote(cliente_id, [(round(rng.uniform(500, 20000), 2), "Repuestos", hoy)
+                                                for _ in range(deudas_por_cliente)])
+            # Un tercio de los clientes pagó de más una boleta (saldo a favor)
+            if rng.random() < 0.33:
+                deuda_id, _, total = db.obtener_historial_cliente(cliente_id)[0][:3]
+                db.registrar_pago(deuda_id, total + round(rng.uniform(100, 3000), 2), "Efectivo")
+    db.conn.close()
+    return len(ids)
+
+
+# ==========================================
+# PROCESO DE TRABAJO
+# ==========================================
+def trabajador(ruta, segundos, semilla, opciones, barrera, cola):
+    from app import BaseDeDatos
+    rng = random.Random(semilla)
+    db = BaseDeDatos(ruta, tamanio_cache=0, **opciones)
+    clientes = [c[0] for c in db.obtener_clientes_con_saldo()]
+    operaciones = list(MEZCLA)
+    pesos = list(MEZCLA.values())
+    latencias = {op: [] for op in operaciones}
+    errores = {op: 0 for op in operaciones}
+
+    # Todos arrancan juntos: la importación y la conexión no cuentan
+    barrera.wait()
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        op = rng.choices(operaciones, pesos)[0]
+        cliente_id = rng.choice(clientes)
+        inicio = time.perf_counter()
+        try:
+            if op == 'busqueda':
+                # Lo que se escribe en el buscador: las primeras letras de un apellido
+                db.obtener_clientes_con_saldo(rng.choice(APELLIDOS)[:rng.randint(2, 4)])
+            else:
+                pendientes = [d for d in db.obtener_historial_cliente(cliente_id) if d[4] > 0]
+                if pendientes and op == 'pago':
+                    deuda = rng.choice(pendientes)
+                    # A veces paga de más y genera saldo a favor
+                    db.registrar_pago(deuda[0], round(deuda[4] * rng.uniform(0.2, 1.1), 2), "Efectivo")
+                elif pendientes:
+                    db.usar_saldo_manual(cliente_id, rng.choice(pendientes)[0])
+        except sqlite3.Error:
+            errores[op] += 1
+            continue
+        latencias[op].append(time.perf_counter() - inicio)
+
+    cola.put((latencias, errores, db.estadisticas_contencion()))
+    db.conn.close()
+
+
+# ==========================================
+# INFORME
+# ==========================================
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p / 100.0), len(ordenados) - 1)]
+
+
+def combinar(resultados):
+    latencias = {op: [] for op in MEZCLA}
+    errores = {op: 0 for op in MEZCLA}
+    contencion = {}
+    for lat, err, cont in resultados:
+        for op in MEZCLA:
+            latencias[op] += lat[op]
+            errores[op] += err[op]
+        for clave, valor in cont.items():
+            if clave.endswith('_max'):
+                contencion[clave] = max(contencion.get(clave, 0.0), valor)
+            elif clave != 'espera_lock_media':
+                contencion[clave] = contencion.get(clave, 0) + valor
+    t = contencion.get('transacciones', 0)
+    contencion['espera_lock_media'] = contencion.get('espera_lock', 0.0) / t if t else 0.0
+    return latencias, errores, contencion
+
+
+def imprimir_informe(latencias, errores, contencion, segundos, procesos):
+    total = sum(len(v) for v in latencias.values())
+    print(f"{procesos} procesos durante {segundos:.0f}s: {total} operaciones, {total / segundos:,.1f} op/s")
+    print("-" * 72)
+    print(f"{'Operación':<14}{'Cantidad':>10}{'op/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'máx ms':>10}{'Errores':>9}")
+    for op, valores in latencias.items():
+        print(f"{op:<14}{len(valores):>10}{len(valores) / segundos:>10.1f}"
+              f"{percentil(valores, 50) * 1000:>10.1f}{percentil(valores, 95) * 1000:>10.1f}"
+              f"{max(valores, default=0) * 1000:>10.1f}{errores[op]:>9}")
+    print("-" * 72)
+    print(f"Transacciones: {contencion['transacciones']}  "
+          f"espera de lock: total {contencion['espera_lock']:.2f}s, "
+          f"media {contencion['espera_lock_media'] * 1000:.1f} ms, máx {contencion['espera_lock_max'] * 1000:.0f} ms")
+    print(f"Bloqueos: {contencion['bloqueos']}  reintentos: {contencion['reintentos']} "
+          f"({contencion['espera_reintentos']:.2f}s de pausa)  escrituras fallidas: {contencion['fallidas']}")
+
+
+# ==========================================
+# LÍNEA DE COMANDOS
+# ==========================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simula varios procesos usando la base del taller a la vez")
+    parser.add_argument("--db", default=None, help="Base a usar (por defecto se crea una temporal)")
+    parser.add_argument("--procesos", type=int, default=4)
+    parser.add_argument("--segundos", type=float, default=10.0)
+    parser.add_argument("--clientes", type=int, default=2000, help="Clientes de la base temporal")
+    parser.add_argument("--timeout", type=float, default=None, help="Espera de lock de SQLite (s)")
+    parser.add_argument("--reintentos", type=int, default=None)
+    parser.add_argument("--wal", action="store_true", help="Pasar la base a modo WAL antes de empezar")
+    args = parser.parse_args(argv)
+
+    ruta = args.db
+    temporal = ruta is None
+    if temporal:
+        ruta = os.path.join(tempfile.mkdtemp(prefix="simulador_"), "carga.db")
+        inicio = time.perf_counter()
+        cantidad = preparar_base(ruta, args.clientes)
+        print(f"Base temporal con {cantidad} clientes en {ruta} ({time.perf_counter() - inicio:.1f}s)")
+    if args.wal:
+        with sqlite3.connect(ruta) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+
+    opciones = {}
+    if args.timeout is not None:
+        opciones['timeout'] = args.timeout
+    if args.reintentos is not None:
+        opciones['reintentos'] = args.reintentos
+
+    contexto = multiprocessing.get_context("spawn")  # Igual en Windows y Linux
+    barrera = contexto.Barrier(args.procesos)
+    cola = contexto.Queue()
+    procesos = [contexto.Process(target=trabajador, args=(ruta, args.segundos, n, opciones, barrera, cola))
+                for n in range(args.procesos)]
+    for p in procesos:
+        p.start()
+    resultados = [cola.get() for _ in procesos]
+    for p in procesos:
+        p.join()
+
+    imprimir_informe(*combinar(resultados), args.segundos, args.procesos)
+    if temporal:
+        print(f"(La base temporal queda en {ruta})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
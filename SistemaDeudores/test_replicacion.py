@@ -0,0 +1,190 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from app import BaseDeDatos
+from replicacion import exportar_cambios, importar_cambios, renovar_nodo, sincronizar
+
+# ==========================================
+# PRUEBAS DE REPLICACIÓN ENTRE DOS BASES LOCALES
+# ==========================================
+# Uso:
+#   python -m unittest test_replicacion      (o pytest, desde SistemaDeudores)
+
+
+class PruebaReplicacion(unittest.TestCase):
+    def setUp(self):
+        self.carpeta = tempfile.mkdtemp(prefix="prueba_replica_")
+        self.mostrador = BaseDeDatos(os.path.join(self.carpeta, "mostrador.db"), tamanio_cache=0)
+        self.oficina = BaseDeDatos(os.path.join(self.carpeta, "oficina.db"), tamanio_cache=0)
+
+    def tearDown(self):
+        self.mostrador.conn.close()
+        self.oficina.conn.close()
+        shutil.rmtree(self.carpeta, ignore_errors=True)
+
+    # --- AYUDAS ---
+    def sincronizar(self):
+        return sincronizar(self.mostrador.conn, self.oficina.conn, self.carpeta,
+                           self.mostrador.recalcular_perfil_archivado, self.oficina.recalcular_perfil_archivado)
+
+    def paquete(self, nombre):
+        return os.path.join(self.carpeta, nombre)
+
+    def deuda(self, db, descripcion):
+        """(id, monto_total, monto_pagado, estado) de la deuda con esa descripción."""
+        return db.conn.execute("SELECT id, monto_total, monto_pagado, estado FROM deudas WHERE descripcion = ?",
+                               (descripcion,)).fetchone()
+
+    def cantidad_pagos(self, db, descripcion):
+        return db.conn.execute("""
+            SELECT COUNT(*) FROM pagos_detalle p JOIN deudas d ON d.id = p.deuda_id WHERE d.descripcion = ?
+        """, (descripcion,)).fetchone()[0]
+
+    def crear_deuda_compartida(self, descripcion="Embrague", monto=100.0):
+        self.mostrador.agregar_cliente("30111222", "Gómez Juan", "Centro")
+        cliente_id = self.mostrador.conn.execute("SELECT id FROM clientes WHERE dni = '30111222'").fetchone()[0]
+        self.mostrador.agregar_deuda(cliente_id, monto, descripcion)
+        self.sincronizar()
+
+    # --- PRUEBAS ---
+    def test_altas_llegan_a_la_otra_base(self):
+        self.crear_deuda_compartida()
+        self.assertEqual(self.oficina.conn.execute("SELECT nombre FROM clientes").fetchall(), [("Gómez Juan",)])
+        self.assertEqual(self.deuda(self.oficina, "Embrague")[1:], (100.0, 0, 'PENDIENTE'))
+
+    def test_pagos_concurrentes_de_la_misma_deuda_suman_los_dos(self):
+        self.crear_deuda_compartida()
+        self.mostrador.registrar_pago(self.deuda(self.mostrador, "Embrague")[0], 30.0, "Efectivo")
+        self.oficina.registrar_pago(self.deuda(self.oficina, "Embrague")[0], 50.0, "Transferencia")
+
+        self.sincronizar()
+        for db in (self.mostrador, self.oficina):
+            self.assertEqual(self.deuda(db, "Embrague")[1:], (100.0, 80.0, 'PARCIAL'))
+            self.assertEqual(self.cantidad_pagos(db, "Embrague"), 2)
+
+        # Sincronizar otra vez no cambia nada (ni duplica lo pagado)
+        self.sincronizar()
+        for db in (self.mostrador, self.oficina):
+            self.assertEqual(self.deuda(db, "Embrague")[1:], (100.0, 80.0, 'PARCIAL'))
+
+    def test_pagos_concurrentes_que_saldan_la_deuda(self):
+        self.crear_deuda_compartida()
+        self.mostrador.registrar_pago(self.deuda(self.mostrador, "Embrague")[0], 60.0, "Efectivo")
+        self.oficina.registrar_pago(self.deuda(self.oficina, "Embrague")[0], 40.0, "Efectivo")
+
+        self.sincronizar()
+        for db in (self.mostrador, self.oficina):
+            self.assertEqual(self.deuda(db, "Embrague")[1:], (100.0, 100.0, 'PAGADA'))
+
+    def test_paquete_perdido_se_vuelve_a_exportar(self):
+        self.crear_deuda_compartida()
+        self.mostrador.registrar_pago(self.deuda(self.mostrador, "Embrague")[0], 25.0, "Efectivo")
+
+        # El pendrive se pierde: el paquete nunca llega a la oficina
+        exportar_cambios(self.mostrador.conn, self.paquete("perdido.json.gz"))
+        exportar_cambios(self.mostrador.conn, self.paquete("otra_vez.json.gz"))
+        importar_cambios(self.oficina.conn, self.paquete("otra_vez.json.gz"))
+        self.assertEqual(self.deuda(self.oficina, "Embrague")[1:], (100.0, 25.0, 'PARCIAL'))
+
+    def test_el_acuse_evita_reenviar_lo_ya_recibido(self):
+        self.crear_deuda_compartida()
+        # Una vuelta más: cada lado ya recibió el acuse de lo que mandó
+        self.sincronizar()
+        cantidad, _ = exportar_cambios(self.mostrador.conn, self.paquete("vacio.json.gz"))
+        self.assertEqual(cantidad, 0)
+
+    def test_importar_dos_veces_no_tiene_efecto(self):
+        self.crear_deuda_compartida()
+        self.mostrador.registrar_pago(self.deuda(self.mostrador, "Embrague")[0], 10.0, "Efectivo")
+        exportar_cambios(self.mostrador.conn, self.paquete("p.json.gz"))
+        importar_cambios(self.oficina.conn, self.paquete("p.json.gz"))
+        resumen = importar_cambios(self.oficina.conn, self.paquete("p.json.gz"))
+        self.assertEqual(resumen['aplicados'], 0)
+        self.assertEqual(self.deuda(self.oficina, "Embrague")[1:], (100.0, 10.0, 'PARCIAL'))
+        self.assertEqual(self.cantidad_pagos(self.oficina, "Embrague"), 1)
+
+    def test_se_conserva_el_traspaso_de_saldo_a_favor(self):
+        # Una boleta pagada de más y otra pendiente; el saldo se usa en el mostrador
+        self.mostrador.agregar_cliente("30111222", "Gómez Juan", "Centro")
+        cliente_id = self.mostrador.conn.execute("SELECT id FROM clientes").fetchone()[0]
+        self.mostrador.agregar_deuda(cliente_id, 100.0, "Frenos")
+        self.mostrador.agregar_deuda(cliente_id, 100.0, "Aceite")
+        self.mostrador.registrar_pago(self.deuda(self.mostrador, "Frenos")[0], 150.0, "Efectivo")
+        self.sincronizar()
+
+        self.mostrador.usar_saldo_manual(cliente_id, self.deuda(self.mostrador, "Aceite")[0])
+        self.oficina.registrar_pago(self.deuda(self.oficina, "Aceite")[0], 20.0, "Efectivo")
+        self.sincronizar()
+        for db in (self.mostrador, self.oficina):
+            self.assertEqual(self.deuda(db, "Frenos")[2], 100.0)
+            self.assertEqual(self.deuda(db, "Aceite")[1:], (100.0, 70.0, 'PARCIAL'))
+
+    def test_cambio_sobre_deuda_archivada_no_la_duplica(self):
+        # Una deuda vieja ya saldada de un cliente cargado dos veces
+        for dni, nombre in (("30111222", "Gómez Juan"), ("30111223", "Gomez J.")):
+            self.mostrador.agregar_cliente(dni, nombre, "Centro")
+        duplicado = self.mostrador.conn.execute("SELECT id FROM clientes WHERE dni = '30111223'").fetchone()[0]
+        self.mostrador.agregar_deuda(duplicado, 100.0, "Cubiertas", "2020-03-01 10:00")
+        self.mostrador.registrar_pago(self.deuda(self.mostrador, "Cubiertas")[0], 100.0, "Efectivo")
+        with self.mostrador.conn:
+            self.mostrador.conn.execute("UPDATE deudas SET fecha_pago = '2020-03-15 10:00'")
+            self.mostrador.conn.execute("UPDATE pagos_detalle SET fecha = '2020-03-15 10:00'")
+        self.sincronizar()
+
+        # El mostrador la archiva y la oficina fusiona los dos clientes
+        self.assertEqual(self.mostrador.archivar_deudas_saldadas(), 1)
+        ids = dict(self.oficina.conn.execute("SELECT dni, id FROM clientes").fetchall())
+        self.oficina.fusionar_clientes(ids["30111222"], [ids["30111223"]])
+        self.sincronizar()
+
+        for db in (self.mostrador, self.oficina):
+            deudas = db.conn.execute("""
+                SELECT c.dni, d.monto_pagado, d.estado FROM deudas d JOIN clientes c ON c.id = d.cliente_id
+                UNION ALL
+                SELECT c.dni, d.monto_pagado, d.estado FROM archivo.deudas d JOIN clientes c ON c.id = d.cliente_id
+            """).fetchall()
+            self.assertEqual(deudas, [("30111222", 100.0, 'PAGADA')])
+            self.assertEqual(db.conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0], 1)
+            self.assertEqual(db.conn.execute("SELECT COALESCE(SUM(monto), 0) FROM pagos_detalle").fetchone()[0] +
+                             db.conn.execute("SELECT COALESCE(SUM(monto), 0) FROM archivo.pagos_detalle").fetchone()[0],
+                             100.0)
+            self.assertEqual(list(db.verificar_libro()), [])
+
+    def nodo(self, db):
+        return db.conn.execute("SELECT valor FROM replica_meta WHERE clave = 'nodo'").fetchone()[0]
+
+    def test_la_copia_de_la_base_toma_otro_nodo(self):
+        # Instalación de la segunda PC: se copia el archivo del mostrador
+        self.crear_deuda_compartida()
+        os.makedirs(self.paquete("pendrive"))
+        copia = BaseDeDatos(shutil.copy(self.mostrador.db_name, self.paquete("pendrive")), tamanio_cache=0)
+        try:
+            self.assertNotEqual(self.nodo(copia), self.nodo(self.mostrador))
+            # La original conserva su nodo al reabrirse
+            reabierta = BaseDeDatos(self.mostrador.db_name, tamanio_cache=0)
+            self.assertEqual(self.nodo(reabierta), self.nodo(self.mostrador))
+            reabierta.conn.close()
+
+            copia.registrar_pago(self.deuda(copia, "Embrague")[0], 40.0, "Efectivo")
+            sincronizar(self.mostrador.conn, copia.conn, self.carpeta)
+            self.assertEqual(self.deuda(self.mostrador, "Embrague")[1:], (100.0, 40.0, 'PARCIAL'))
+            # Los acuses avanzan: el siguiente paquete de la copia viene vacío
+            sincronizar(self.mostrador.conn, copia.conn, self.carpeta)
+            self.assertEqual(exportar_cambios(copia.conn, self.paquete("vacio.json.gz"))[0], 0)
+        finally:
+            copia.conn.close()
+
+    def test_no_importa_un_paquete_del_mismo_nodo(self):
+        self.crear_deuda_compartida()
+        exportar_cambios(self.mostrador.conn, self.paquete("propio.json.gz"))
+        with self.assertRaises(ValueError):
+            importar_cambios(self.mostrador.conn, self.paquete("propio.json.gz"))
+        anterior = self.nodo(self.mostrador)
+        self.assertNotEqual(renovar_nodo(self.mostrador.conn), anterior)
+        importar_cambios(self.mostrador.conn, self.paquete("propio.json.gz"))
+
+
+if __name__ == "__main__":
+    unittest.main()